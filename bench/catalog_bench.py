@@ -0,0 +1,182 @@
+"""
+Comic lookups from the mmapped catalog snapshot (catalog.py) against Mongo
+and against a per-worker in-memory cache, and the memory each costs across
+a set of worker processes.
+
+Latency is measured in this process. Memory is measured on `--workers`
+child processes that each look up every comic once and then stay alive
+while their RSS, PSS (shared pages divided among the processes mapping
+them) and private memory are read from /proc. Summed RSS counts the shared
+snapshot once per worker, PSS counts it once.
+
+Mongo lookups and the build from a collection are measured only with
+--mongo-uri; mongomock copies and scans every document, which says nothing
+about a real server. Without it the snapshot is written straight from the
+generated comics.
+
+    python bench/catalog_bench.py --comics 100000 --workers 8
+    python bench/catalog_bench.py --comics 100000 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+sys.path.append(harness.ROOT)
+
+import catalog  # noqa: E402
+
+GENRES = ["Action", "Adventure", "Comedy", "Crime", "Drama", "Fantasy",
+          "Horror", "Mystery", "Romance", "Sci-Fi", "Superhero", "Thriller"]
+WORDS = "the of a dark knight returns city night war last first new world secret hero".split()
+
+
+def comics(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    for n in range(count):
+        slug = f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{n}"
+        yield {
+            "slug": slug,
+            "url": f"https://readallcomics.com/category/{slug}/",
+            "title": slug.replace("-", " ").title(),
+            "publisher": rng.choice(["DC", "Marvel", "Image", "Dark Horse", "IDW"]),
+            "image": f"https://readallcomics.com/wp-content/uploads/{slug}.jpg",
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))),
+            "genres": rng.sample(GENRES, rng.randint(1, 4)),
+        }
+
+
+def percentiles(samples) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1] * 1e6, 1),
+    }
+
+
+def timed(lookup, slugs) -> dict:
+    samples = []
+    for slug in slugs:
+        started = time.perf_counter()
+        lookup(slug)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def memory(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def worker(args):
+    """Looks up every comic once through `args.worker`, then waits to be measured"""
+    slugs = [item["slug"] for item in comics(args.comics)]
+    if args.worker == "snapshot":
+        snapshot = catalog.Snapshot(args.path)
+        lookup = snapshot.get
+    elif args.worker == "dict":
+        # what a per-worker cache filled from Mongo ends up holding
+        snapshot = catalog.Snapshot(args.path)
+        cache = {slug: snapshot.get(slug) for slug in slugs}
+        del snapshot
+        lookup = cache.get
+    else:
+        def lookup(slug):
+            return None
+    for slug in slugs:
+        lookup(slug)
+    print("ready", flush=True)
+    sys.stdin.read()
+
+
+def measure_workers(mode: str, path: str, args) -> dict:
+    command = [sys.executable, __file__, "--worker", mode, "--path", path, "--comics", str(args.comics)]
+    processes = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(args.workers)]
+    try:
+        for process in processes:
+            assert process.stdout.readline().strip() == "ready"
+        totals = {"rss": 0, "pss": 0, "private": 0}
+        for process in processes:
+            for name, value in memory(process.pid).items():
+                totals[name] += value
+        return {f"{name}_mb": round(value / 1024, 1) for name, value in totals.items()}
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comics", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="comixie-catalog-")
+    path = os.path.join(workdir, "catalog.snapshot")
+    report = {"comics": args.comics, "workers": args.workers}
+    try:
+        started = time.perf_counter()
+        catalog.write(path, comics(args.comics))
+        report["write"] = {"seconds": round(time.perf_counter() - started, 2),
+                           "size_mb": round(os.path.getsize(path) / 2 ** 20, 1)}
+
+        rng = random.Random(2)
+        slugs = [item["slug"] for item in comics(args.comics)]
+        snapshot = catalog.Snapshot(path)
+        cache = {slug: snapshot.get(slug) for slug in slugs}
+        report["latency"] = {
+            "snapshot_hit": timed(snapshot.get, rng.choices(slugs, k=args.lookups)),
+            "snapshot_miss": timed(snapshot.get, [f"missing-{n}" for n in range(args.lookups)]),
+            "dict_cache_hit": timed(cache.get, rng.choices(slugs, k=args.lookups)),
+        }
+
+        if args.mongo_uri:
+            database = harness.connect_mongo(args.mongo_uri)
+            generated = comics(args.comics)
+            while batch := [item for _, item in zip(range(5000), generated)]:
+                database.comics.insert_many(batch)
+            database.comics.create_index("slug")
+            started = time.perf_counter()
+            catalog.build(database, path)
+            report["build_from_mongo_s"] = round(time.perf_counter() - started, 2)
+            report["latency"]["mongo"] = timed(lambda slug: database.comics.find_one({"slug": slug}),
+                                               rng.choices(slugs, k=args.lookups))
+        del cache
+        print(report, file=sys.stderr)
+
+        report["memory"] = {mode: measure_workers(mode, path, args) for mode in ("none", "snapshot", "dict")}
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Throughput of the cover placeholder job (covers.py) and what placeholders
+add to listing responses.
+
+Covers are served by the local stand-in with `--latency` per request, like
+an upstream image host, and rendered up front as gradients with shapes on
+them, so placeholders are about as large as those of real artwork (the
+stand-in's own covers are flat colours). The job processes the whole
+catalog once per `--concurrency` level; the listing payload of /api/home
+and /api/genre/<genre>/comics pages is then compared with and without the
+placeholder fields, raw and compressed as responses.py sends them.
+
+    python bench/covers_bench.py --comics 2000 --latency 0.05 --concurrency 1,8,16
+    python bench/covers_bench.py --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import gzip
+import io
+import json
+import random
+import sys
+
+import requests
+
+import harness
+
+import covers  # noqa: E402  (harness puts the repo root on sys.path)
+import db  # noqa: E402
+import responses  # noqa: E402
+
+
+def render_cover(rng: random.Random, size=(400, 600)) -> bytes:
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", [gradient.point(lambda v, scale=rng.randint(60, 255), shift=rng.randint(0, 255):
+                                               (v * scale // 255 + shift) % 256) for _ in range(3)])
+    draw = ImageDraw.Draw(image)
+    for _ in range(25):
+        x, y, radius = rng.randint(0, width), rng.randint(0, height), rng.randint(10, 150)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def sizes(items: list, keep_fields: bool) -> dict:
+    if not keep_fields:
+        items = [{name: value for name, value in item.items() if name not in covers.FIELDS} for item in items]
+    body = json.dumps(items, separators=(",", ":")).encode()
+    result = {"identity": len(body), "gzip": len(gzip.compress(body, compresslevel=responses.GZIP_LEVEL))}
+    if responses.brotli:
+        result["br"] = len(responses.compress(body, "br"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comics", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in latency per cover")
+    parser.add_argument("--concurrency", default="1,8,16")
+    parser.add_argument("--batch", type=int, default=covers.COVER_BATCH)
+    parser.add_argument("--mongo-uri")
+    args = parser.parse_args()
+
+    site = harness.Site(comics=args.comics, chapters=1, pages=1, latency=args.latency)
+    rng = random.Random(1)
+    for comic in site.comics:
+        site._images[f"/images/{comic['slug']}/cover.jpg"] = render_cover(rng)
+    server = harness.serve(site)
+    database = harness.connect_mongo(args.mongo_uri)
+    harness.seed(database, site, fraction=1.0, with_images=False)
+    main_module = harness.load_app(site, database, harness.connect_redis())
+    db.comics.ensure_indexes()
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=64))
+
+    def fetch(url: str) -> bytes:
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    report = {"comics": args.comics, "latency": args.latency, "runs": []}
+    try:
+        for concurrency in (int(value) for value in args.concurrency.split(",")):
+            database.comics.update_many({}, {"$unset": dict.fromkeys(covers.FIELDS, "")})
+            result = covers.CoverPipeline(db.comics, fetch, args.batch, concurrency).run()
+            report["runs"].append({"concurrency": concurrency, **result})
+            print(report["runs"][-1], file=sys.stderr)
+
+        placeholders = [item["image_placeholder"] for item in database.comics.find({}, {"image_placeholder": 1})]
+        report["placeholder_bytes"] = {
+            "mean": round(sum(len(value) for value in placeholders) / len(placeholders)),
+            "max": max(len(value) for value in placeholders),
+        }
+
+        client = main_module.app.test_client()
+        genre = site.comics[0]["genres"][0]
+        listings = {
+            "/api/home": client.get("/api/home?page=1").json["comics"],
+            "/api/genre/<genre>/comics": client.get(f"/api/genre/{genre}/comics?per_page=24").json["results"],
+        }
+        report["listings"] = {}
+        for route, items in listings.items():
+            before, after = sizes(items, False), sizes(items, True)
+            report["listings"][route] = {
+                "entries": len(items),
+                "with_placeholder": sum(1 for item in items if item.get("image_placeholder")),
+                "before": before,
+                "after": after,
+                "added": {encoding: after[encoding] - before[encoding] for encoding in before},
+            }
+    finally:
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Crawler throughput and resume correctness against the local stand-in.
+
+Runs one uninterrupted crawl, then a crawl that is killed part way through
+(no final checkpoint, as with SIGKILL) and resumed from its state file, and
+checks both leave identical comics and chapters in Mongo.
+
+    python bench/crawl_bench.py --comics 300 --concurrency 8 --latency 0.02
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import requests
+
+import harness
+from standin import Site, serve
+
+sys.path.append(harness.ROOT)
+
+from crawler import CrawlState, Crawler  # noqa: E402
+
+
+def snapshot(database) -> tuple:
+    comics = {doc["slug"]: {k: v for k, v in doc.items() if k != "_id"} for doc in database.comics.find()}
+    chapters = {doc["slug"]: {k: v for k, v in doc.items() if k != "_id"} for doc in database.chapters.find()}
+    return comics, chapters
+
+
+def crawl(site: Site, database, state_path: str, args, stop_after=None):
+    crawler = Crawler(requests.Session(), database, CrawlState(state_path), base_url=site.base_url,
+                      concurrency=args.concurrency, rate=args.rate, batch_size=args.batch_size,
+                      stop_after=stop_after)
+    try:
+        return crawler.run()
+    except KeyboardInterrupt:
+        # simulated kill: whatever was not checkpointed is lost
+        return {"killed_after_pages": crawler.pages_fetched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comics", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="requests per second, 0 for unlimited")
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.02, help="artificial upstream latency in seconds")
+    parser.add_argument("--kill-at", type=float, default=0.4, help="fraction of comics crawled before the kill")
+    args = parser.parse_args()
+
+    site = Site(comics=args.comics, chapters=8, latency=args.latency)
+    server = serve(site)
+    workdir = tempfile.mkdtemp(prefix="comixie-crawl-")
+    try:
+        reference = harness.connect_mongo()
+        full = crawl(site, reference, os.path.join(workdir, "full.json"), args)
+
+        resumed_db = harness.connect_mongo()
+        state_path = os.path.join(workdir, "resumed.json")
+        killed = crawl(site, resumed_db, state_path, args, stop_after=int(args.comics * args.kill_at))
+        resumed = crawl(site, resumed_db, state_path, args)
+    finally:
+        server.shutdown()
+
+    expected, got = snapshot(reference), snapshot(resumed_db)
+    refetched = killed["killed_after_pages"] + resumed["pages_fetched"] - full["pages_fetched"]
+    report = {
+        "full_run": full,
+        "killed_run": killed,
+        "resumed_run": resumed,
+        "resume": {
+            "comics_match": expected[0] == got[0],
+            "chapters_match": expected[1] == got[1],
+            "comics": len(got[0]),
+            "chapters": len(got[1]),
+            "pages_refetched_after_kill": refetched,
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if not (report["resume"]["comics_match"] and report["resume"]["chapters_match"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline benchmark for every route in main.py.
+
+Runs the Flask app in-process against the local upstream stand-in, a seeded
+Mongo double and a Redis double, and reports p50/p95/p99 latency and
+throughput per scenario. Results can be saved as a baseline and later runs
+compared against it.
+
+    python bench/endpoints.py --save bench/baseline.json
+    python bench/endpoints.py --compare bench/baseline.json --tolerance 0.25
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def scenarios(main, site, known):
+    known_slugs = [comic["slug"] for comic in known]
+    unknown_slugs = [comic["slug"] for comic in site.comics if comic not in known]
+    read_chapters = [slug for comic in known for slug in comic["chapters"][0::2]]
+    scrape_chapters = [slug for comic in known for slug in comic["chapters"][1::2]]
+    genres = sorted({genre for comic in site.comics for genre in comic["genres"]})
+
+    def cycle(values):
+        iterator = itertools.cycle(values)
+        return lambda: next(iterator)
+
+    def fresh(values):
+        iterator = iter(values)
+        return lambda: next(iterator)
+
+    def flush_home(page):
+        main.responses.invalidate(f"home:{page}")
+        return page
+
+    next_known, next_unknown = cycle(known_slugs), fresh(unknown_slugs)
+    next_read, next_scrape = cycle(read_chapters), fresh(scrape_chapters)
+    next_genre, next_page = cycle(genres), cycle(range(1, 6))
+
+    return {
+        "GET /api/health": lambda: ("GET", "/api/health"),
+        "GET /api/search": lambda: ("GET", f"/api/search?q=comic+000{next_page()}"),
+        "GET /api/genres": lambda: ("GET", "/api/genres"),
+        "GET /api/genre/<genre>/comics": lambda: ("GET", f"/api/genre/{next_genre()}/comics?page=1&per_page=10"),
+        "GET /api/details (mongo)": lambda: ("GET", f"/api/details/{next_known()}"),
+        "GET /api/details (scrape)": lambda: ("GET", f"/api/details/{next_unknown()}"),
+        "GET /api/read (mongo)": lambda: ("GET", f"/api/read/{next_read()}"),
+        "GET /api/read (scrape)": lambda: ("GET", f"/api/read/{next_scrape()}"),
+        "GET /api/home (redis)": lambda: ("GET", f"/api/home?page={next_page()}"),
+        "GET /api/home (scrape)": lambda: ("GET", f"/api/home?page={flush_home(next_page())}"),
+        "POST /api/export-pdf": lambda: ("POST", f"/api/export-pdf/{next_read()}"),
+    }, {
+        # scenarios that consume a finite pool of cold keys
+        "GET /api/details (scrape)": len(unknown_slugs),
+        "GET /api/read (scrape)": len(scrape_chapters),
+    }
+
+
+def run_scenario(client_factory, make_request, count: int, concurrency: int) -> dict:
+    def one(_):
+        method, path = make_request()
+        client = client_factory()
+        started = time.perf_counter()
+        response = client.open(path, method=method)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(count)))
+    else:
+        results = [one(i) for i in range(count)]
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        "requests": count,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "throughput_rps": round(count / elapsed, 2),
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in report["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--export-requests", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--comics", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial upstream latency in seconds")
+    parser.add_argument("--mongo-uri", help="use a local mongod instead of mongomock")
+    parser.add_argument("--redis-url", help="use a local redis instead of fakeredis")
+    parser.add_argument("--only", help="run only scenarios containing this string")
+    parser.add_argument("--save", help="write the report to this file as the new baseline")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    main_module, site, server, known = harness.start(
+        comics=args.comics, latency=args.latency, mongo_uri=args.mongo_uri, redis_url=args.redis_url)
+    # background read-ahead would warm the cold chapters the scrape scenarios rely on
+    main_module.prefetcher.enabled = False
+    app = main_module.app
+    routes, limits = scenarios(main_module, site, known)
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "comics": args.comics,
+            "upstream_latency": args.latency,
+            "mongo": "local" if args.mongo_uri else "mongomock",
+            "redis": "local" if args.redis_url else "fakeredis",
+            "python": sys.version.split()[0],
+        },
+        "routes": {},
+    }
+    try:
+        # warm the home page cache and the upstream cache once
+        for page in range(1, 6):
+            app.test_client().get(f"/api/home?page={page}")
+
+        for name, make_request in routes.items():
+            if args.only and args.only not in name:
+                continue
+            count = args.export_requests if "export" in name else args.requests
+            count = min(count, limits.get(name, count))
+            report["routes"][name] = run_scenario(app.test_client, make_request, count, args.concurrency)
+            print(f"{name:34s} {report['routes'][name]}", file=sys.stderr)
+    finally:
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Throughput and memory of range exports (/api/export) against exporting the
+same chapters one /api/export-pdf request at a time.
+
+The stand-in site runs in this process; every export runs in a child process
+that seeds its own mongomock catalog, so its peak RSS is its own. Half of the
+chapters already have their image lists stored, the others are scraped
+during the export, as in the endpoint benchmarks.
+
+    python bench/export_bench.py --chapters 50 --pages 20 --latency 0.02 --concurrency 1,4,8
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import harness
+from standin import Site, serve
+
+
+def site_for(args) -> Site:
+    # two comics so that seed() stores image lists for half of the first one's chapters
+    return Site(comics=2, chapters=args.chapters, pages=args.pages, latency=args.latency,
+                image_size=(args.width, args.width * 3 // 2))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def child(args) -> dict:
+    site = site_for(args)
+    site._base_url = args.upstream
+    database = harness.connect_mongo()
+    harness.seed(database, site, fraction=0.5)
+    main = harness.load_app(site, database, harness.connect_redis())
+    main.prefetcher.enabled = False
+    client = main.app.test_client()
+    comic = site.comics[0]
+
+    baseline = rss_mb()
+    started = time.perf_counter()
+    size = first_byte = 0
+    if args.mode == "per-chapter":
+        for slug in comic["chapters"]:
+            response = client.post(f"/api/export-pdf/{slug}")
+            assert response.status_code == 200, response.data[:200]
+            size += len(response.data)
+            first_byte = first_byte or time.perf_counter() - started
+    else:
+        response = client.get(f"/api/export/{comic['slug']}?format={args.mode}", buffered=False)
+        assert response.status_code == 200, response.data[:200]
+        for chunk in response.iter_encoded():
+            first_byte = first_byte or time.perf_counter() - started
+            size += len(chunk)
+        response.close()
+    elapsed = time.perf_counter() - started
+    pages = args.chapters * args.pages
+    return {
+        "seconds": round(elapsed, 2),
+        "first_byte_s": round(first_byte, 3),
+        "pages_per_second": round(pages / elapsed, 1),
+        "output_mb": round(size / 2 ** 20, 1),
+        "mb_per_second": round(size / 2 ** 20 / elapsed, 1),
+        "rss_before_mb": round(baseline, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run(mode: str, concurrency: int, upstream: str, args) -> dict:
+    command = [sys.executable, __file__, "--child", "--mode", mode, "--upstream", upstream,
+               "--chapters", str(args.chapters),
+               "--pages", str(args.pages), "--width", str(args.width), "--latency", str(args.latency)]
+    env = {**os.environ, "EXPORT_CONCURRENCY": str(concurrency)}
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["peak_growth_mb"] = round(result["peak_rss_mb"] - result["rss_before_mb"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=20, help="pages per chapter")
+    parser.add_argument("--width", type=int, default=800, help="page width in pixels")
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in latency per request")
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--modes", default="cbz,pdf,per-chapter")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--upstream", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        result = child(args)
+        sys.stdout = stdout
+        print(json.dumps(result))
+        return
+
+    site = site_for(args)
+    # render every page up front so no run pays for the stand-in's image generation
+    for slug in site.comics[0]["chapters"]:
+        for n in range(1, args.pages + 1):
+            site.render_image(f"/images/{slug}/{n:03d}.jpg")
+    server = serve(site)
+    report = {"pages": args.chapters * args.pages, "runs": []}
+    try:
+        for mode in args.modes.split(","):
+            # the single-chapter export has no concurrency of its own
+            levels = [1] if mode == "per-chapter" else [int(c) for c in args.concurrency.split(",")]
+            for concurrency in levels:
+                result = {"mode": mode, "concurrency": concurrency, **run(mode, concurrency, site.base_url, args)}
+                print(result, file=sys.stderr)
+                report["runs"].append(result)
+    finally:
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
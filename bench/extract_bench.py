@@ -0,0 +1,63 @@
+"""
+Parse-time benchmark for extract.py against the html.parser scrapers it
+replaced, over the fixtures of every page type. These are synthetic pages
+in the upstream's markup (see test_extract.py), timings on live pages vary
+with their size.
+
+    python bench/extract_bench.py --rounds 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import extract  # noqa: E402
+import legacy_extract  # noqa: E402
+
+PAGES = {
+    "home": "home.html",
+    "category": "category.html",
+    "chapter": "chapter.html",
+    "search": "search.txt",
+}
+
+
+def measure(function, content: bytes, rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function(content)
+        timings.append(time.perf_counter() - started)
+    return {
+        "mean_ms": round(statistics.mean(timings) * 1000, 4),
+        "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1000, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="extract.py parse-time benchmark")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    report = {}
+    for page, name in PAGES.items():
+        with open(os.path.join(ROOT, "fixtures", name), "rb") as f:
+            content = f.read()
+        before = measure(getattr(legacy_extract, page), content, args.rounds)
+        after = measure(getattr(extract, page), content, args.rounds)
+        report[page] = {
+            "bytes": len(content),
+            "html.parser": before,
+            "lxml": after,
+            "speedup": round(before["mean_ms"] / max(after["mean_ms"], 1e-9), 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+/api/genres cost as the catalog grows.
+
+Compares what the genre listing used to take (the genre names plus one
+count_documents per genre) with the materialized genre_stats served through
+GenreCatalog (`/api/genres?stats=1`), for full responses and ETag
+revalidations (304).
+
+    python bench/genres_bench.py --comics 1000,10000,50000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import harness
+
+import genre_stats  # noqa: E402  (harness puts the repo root on sys.path)
+from standin import GENRES  # noqa: E402
+
+
+def timed(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comics", default="1000,10000,50000", help="comma separated catalog sizes")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--mongo-uri")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    report = []
+    for size in (int(value) for value in args.comics.split(",")):
+        database = harness.connect_mongo(args.mongo_uri)
+        database.genres.insert_many([{"name": name} for name in GENRES])
+        database.comics.insert_many([{
+            "slug": f"comic-{i}", "genres": rng.sample(GENRES, rng.randint(1, 3)), "image": f"/covers/{i}.jpg"
+        } for i in range(size)])
+        database.comics.create_index("genres")
+
+        def legacy():
+            names = [genre["name"] for genre in database.genres.find().limit(20)]
+            return {name: database.comics.count_documents({"genres": name}) for name in names}
+
+        started = time.perf_counter()
+        genre_stats.rebuild(database)
+        rebuild_ms = (time.perf_counter() - started) * 1000
+
+        main_module = harness.load_app(harness.Site(comics=1), database, harness.connect_redis())
+        client = main_module.app.test_client()
+        path = "/api/genres?stats=1"
+        etag = client.get(path).headers["ETag"]
+
+        report.append({
+            "comics": size,
+            "legacy_ms": round(timed(legacy, max(1, args.repeat // 20)), 3),
+            "rebuild_ms": round(rebuild_ms, 1),
+            "catalog_get_ms": round(timed(lambda: main_module.genre_catalog.get(stats=True), args.repeat), 4),
+            "endpoint_200_ms": round(timed(lambda: client.get(path), args.repeat), 3),
+            "endpoint_304_ms": round(timed(lambda: client.get(path, headers={"If-None-Match": etag}),
+                                           args.repeat), 3),
+            "response_bytes": len(client.get(path).data),
+        })
+        print(report[-1], file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Wires main.py to local stand-ins: the generated upstream site from
+standin.py, an in-memory (mongomock) or throwaway local Mongo database and
+an in-memory (fakeredis) or local Redis. Shared by the benchmark scripts.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from standin import Site, serve  # noqa: E402
+
+BENCH_DATABASE = "comixie_bench"
+
+
+def connect_mongo(mongo_uri=None, fresh=True):
+    if mongo_uri:
+        from pymongo import MongoClient
+
+        client = MongoClient(mongo_uri)
+        if fresh:
+            client.drop_database(BENCH_DATABASE)
+        return client[BENCH_DATABASE]
+
+    import mongomock
+
+    patch_mongomock()
+    return mongomock.MongoClient()[BENCH_DATABASE]
+
+
+def patch_mongomock():
+    """Lets mongomock's bulk builder accept the `sort` option newer pymongo passes"""
+    from mongomock.collection import BulkOperationBuilder
+
+    if getattr(BulkOperationBuilder, "_accepts_sort", False):
+        return
+    add_update, add_replace = BulkOperationBuilder.add_update, BulkOperationBuilder.add_replace
+    BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs)
+    BulkOperationBuilder.add_replace = lambda self, *args, sort=None, **kwargs: add_replace(self, *args, **kwargs)
+    BulkOperationBuilder._accepts_sort = True
+
+
+def connect_redis(redis_url=None, fresh=True):
+    if redis_url:
+        import redis
+
+        client = redis.Redis.from_url(redis_url)
+        if fresh:
+            client.flushdb()
+        return client
+
+    import fakeredis
+
+    return fakeredis.FakeRedis()
+
+
+def seed(database, site: Site, fraction: float = 0.5, with_images: bool = True):
+    """
+    Stores the first `fraction` of the stand-in catalog the way sql2mongo.py
+    does, leaving the rest to be scraped on demand.
+    """
+    known = site.comics[:int(len(site.comics) * fraction)]
+    genres = sorted({genre for comic in site.comics for genre in comic["genres"]})
+
+    database.genres.insert_many([{"name": name} for name in genres])
+    database.comics.insert_many([{
+        "slug": comic["slug"],
+        "url": site.url(f"/category/{comic['slug']}/"),
+        "title": comic["title"],
+        "genres": comic["genres"],
+        "publisher": comic["publisher"],
+        "description": f"{comic['title']} collects the run.",
+        "image": site.url(f"/images/{comic['slug']}/cover.jpg"),
+    } for comic in known])
+
+    chapters = []
+    for comic in site.comics:
+        # in category-page order, newest first, like the scraped rows sql2mongo.py imports
+        for n, slug in reversed(list(enumerate(comic["chapters"]))):
+            chapter = {
+                "slug": slug,
+                "comic_slug": comic["slug"],
+                "name": f"{comic['title']} #{slug[-3:]}",
+                "url": site.url(f"/{slug}/"),
+                "index": n,
+            }
+            # chapters of known comics that were already read once
+            if with_images and comic in known and n % 2 == 0:
+                chapter["images"] = [site.url(f"/images/{slug}/{p:03d}.jpg") for p in range(1, site.pages + 1)]
+            chapters.append(chapter)
+    database.chapters.insert_many(chapters)
+    database.comics.create_index("slug")
+    database.chapters.create_index("slug")
+    database.chapters.create_index("comic_slug")
+    database.chapters.create_index([("comic_slug", 1), ("index", -1)])
+    return known
+
+
+def load_app(site: Site, database, cache, limits: bool = False):
+    """
+    Imports main.py against `site` with the given doubles as its Mongo
+    database and Redis. Quotas stay off unless `limits` is set, benchmarks
+    drive far more traffic from one address than any client should.
+    """
+    os.environ["UPSTREAM_URL"] = site.base_url
+
+    import clients
+    import db
+    import main
+    from upstream import UpstreamCache
+
+    clients.override(database=database, redis=cache)
+    # the snapshot file is shared by the whole host, leave it to benchmarks that ask for it
+    db.catalog_snapshot.enabled = False
+    main.limiter.enabled = limits
+    # fresh fetch statistics for every run
+    main.upstream = UpstreamCache(main.scraper, main.r)
+    main.UPSTREAM_URL = site.base_url
+    return main
+
+
+def start(comics=60, chapters=6, pages=6, latency=0.0, image_size=(400, 600),
+          mongo_uri=None, redis_url=None, fraction=0.5):
+    site = Site(comics=comics, chapters=chapters, pages=pages, latency=latency, image_size=image_size)
+    server = serve(site)
+    database = connect_mongo(mongo_uri)
+    known = seed(database, site, fraction)
+    main = load_app(site, database, connect_redis(redis_url))
+    return main, site, server, known
@@ -0,0 +1,116 @@
+"""
+The BeautifulSoup/html.parser extraction main.py and scripts.py used before
+extract.py, kept as the reference for parity tests and parse benchmarks.
+"""
+import re
+
+from bs4 import BeautifulSoup as BS
+
+
+def home(content: bytes) -> list:
+    soup = BS(content, "html.parser")
+    divs = soup.find_all('div', {'id': lambda x: x and x.startswith('post-'), 'class': lambda x: x and 'post-' in x}) # type: ignore
+
+    comics = []
+    for div in divs:
+        try:
+            comic_url = div.select_one("a").get("href") # type: ignore
+            image = div.select_one("img").get("src") # type: ignore
+            name_element = div.find("a", attrs={"class": "front-link"}) # type: ignore
+            date = div.select_one("center span").text # type: ignore
+
+            slug = comic_url.split('/')[-2] if comic_url.endswith('/') else comic_url.split('/')[-1] # type: ignore
+
+            comics.append({
+                'url': comic_url,
+                'slug': slug,
+                'image': image,
+                'name': name_element.text if name_element else '',
+                'date': date
+            })
+        except Exception:
+            continue
+    return comics
+
+
+def category(content: bytes) -> dict:
+    soup = BS(content, "html.parser")
+
+    chapters = []
+    title = genres = publisher = description = image = None
+
+    title_element = soup.select_one("center div h1 b")
+    description_element = str(soup.select_one("div.b"))
+    image_element = soup.select_one("center p img")
+    info = soup.select_one("center div div p")
+    chapters_element = soup.find(attrs={"class": "list-story"})
+
+    if chapters_element:
+        links = chapters_element.find_all("a") # type: ignore
+        for link in links:
+            name = link.get_text(strip=True)
+            chapter_url = link["href"] # type: ignore
+            chapter_slug = chapter_url.split('/')[-2] if chapter_url.endswith('/') else chapter_url.split('/')[-1] # type: ignore
+            chapters.append({
+                "url": chapter_url,
+                "name": name,
+                "slug": chapter_slug
+            })
+
+    if info:
+        genres_element = info.find_next("strong")
+        if genres_element:
+            publisher_element = genres_element.find_next("strong")
+            if genres_element:
+                genres = genres_element.text.split(", ")
+            if publisher_element:
+                publisher = publisher_element.text
+
+    if title_element:
+        title = title_element.text
+
+    if image_element:
+        image = str(image_element.get("src"))
+
+    match = re.search(r'</span><br/>(.*?)<br/>', description_element, re.DOTALL)
+    if match:
+        description = match.group(1).strip()
+
+    return {
+        "title": title,
+        "genres": genres,
+        "publisher": publisher,
+        "description": description,
+        "image": image,
+        "chapters": chapters
+    }
+
+
+def chapter(content: bytes) -> list:
+    soup = BS(content, "html.parser")
+    pages = soup.select("center p img")
+
+    urls = []
+    for page in pages:
+        source = page["src"]
+        if isinstance(source, list):
+            raise AttributeError("Image can't have more than one source")
+        urls.append(source)
+    return urls
+
+
+def search(content: bytes) -> list:
+    html_content = content.decode("utf-8", "replace").strip('"').replace("\\", "")
+    link_pattern = r'<a href="([^"]*)"[^>]*>([^<]*)</a>'
+    matches = re.findall(link_pattern, html_content)
+
+    results = []
+    for url, title in matches:
+        clean_title = title.strip()
+        if "/category" in url:
+            results.append({
+                'title': clean_title,
+                'url': url,
+                'slug': url.split('/')[-2] if url.endswith('/') else url.split('/')[-1]
+            })
+    return results
@@ -0,0 +1,160 @@
+"""
+Cheap-endpoint latency while one client abuses the PDF export, with quotas
+and admission control (limits.py) off and on.
+
+Polite clients, each with its own API key, browse cached listings with a
+short think time. The abusive client loops over /api/export-pdf from several
+connections under one key, waiting out Retry-After when it is throttled or,
+with --ignore-retry-after, retrying at once. The app runs under
+gunicorn gthread with a shared fakeredis server, as in load.py. Three
+phases: polite traffic alone, with the abuser, and with the abuser while
+limits are enforced.
+
+    python bench/limits_bench.py --duration 20 --clients 8 --abusers 4 --workers 2 --threads 4
+    python bench/limits_bench.py --ignore-retry-after
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import harness
+from load import BENCH, free_port, wait_ready
+from standin import Site, serve
+
+
+def percentile(latencies, q: float) -> float:
+    latencies = sorted(latencies)
+    return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else None
+
+
+def drive(base_url: str, site: Site, args, abusers: int) -> dict:
+    deadline = time.perf_counter() + args.duration
+    genres = sorted({genre for comic in site.comics for genre in comic["genres"]})
+    known = site.comics[:len(site.comics) // 2]
+    exported = [slug for comic in known for slug in comic["chapters"][0::2]]
+    polite, abusive, lock = [], [], threading.Lock()
+
+    def polite_client(n: int):
+        rng, session, local = random.Random(n), requests.Session(), []
+        session.headers["X-API-Key"] = f"reader-{n}"
+        while time.perf_counter() < deadline:
+            path = rng.choice([f"/api/home?page={rng.randint(1, 3)}", "/api/genres",
+                               f"/api/genre/{rng.choice(genres)}/comics"])
+            started = time.perf_counter()
+            status = session.get(base_url + path, timeout=120).status_code
+            local.append((time.perf_counter() - started, status))
+            time.sleep(args.think)
+        with lock:
+            polite.extend(local)
+
+    def abusive_client(n: int):
+        rng, session, local = random.Random(1000 + n), requests.Session(), []
+        session.headers["X-API-Key"] = "abuser"
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = session.post(f"{base_url}/api/export-pdf/{rng.choice(exported)}", timeout=120)
+            local.append((time.perf_counter() - started, response.status_code))
+            if response.status_code == 429 and not args.ignore_retry_after:
+                time.sleep(min(float(response.headers["Retry-After"]), max(0.0, deadline - time.perf_counter())))
+        with lock:
+            abusive.extend(local)
+
+    threads = [threading.Thread(target=polite_client, args=(n,)) for n in range(args.clients)]
+    threads += [threading.Thread(target=abusive_client, args=(n,)) for n in range(abusers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = [latency for latency, status in polite if status == 200]
+    return {
+        "polite": {
+            "requests": len(polite),
+            "non_200": sum(1 for _, status in polite if status != 200),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        },
+        "abuser": {
+            "requests": len(abusive),
+            "exported": sum(1 for _, status in abusive if status == 200),
+            "limited": sum(1 for _, status in abusive if status == 429),
+            "other": sum(1 for _, status in abusive if status not in (200, 429)),
+        },
+    }
+
+
+def run_phase(name: str, abusers: int, limited: bool, site: Site, env: dict, args) -> dict:
+    harness.connect_redis(env["BENCH_REDIS_URL"]).flushdb()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-k", "gthread",
+               "--threads", str(args.threads), "--timeout", "120", "-b", f"127.0.0.1:{port}", "wsgi:app"]
+    process = subprocess.Popen(command, cwd=BENCH, env={**env, "BENCH_LIMITS": "1" if limited else "0"},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if not wait_ready(base_url, process):
+            raise RuntimeError(process.stderr.read().decode()[-2000:] if process.poll() is not None else "timeout")
+        # fill the listing caches, so polite traffic measures cached responses only
+        for page in range(1, 4):
+            requests.get(f"{base_url}/api/home?page={page}", headers={"X-API-Key": "warmup"})
+        result = drive(base_url, site, args, abusers)
+        print(name, result, file=sys.stderr)
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--clients", type=int, default=8, help="polite clients")
+    parser.add_argument("--think", type=float, default=0.25, help="polite clients' pause between requests")
+    parser.add_argument("--abusers", type=int, default=4, help="connections of the abusive client")
+    parser.add_argument("--ignore-retry-after", action="store_true", help="the abuser retries throttled requests at once")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--comics", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in latency per request")
+    args = parser.parse_args()
+
+    site = Site(comics=args.comics, chapters=6, pages=6, latency=args.latency, image_size=(400, 600))
+    upstream = serve(site)
+
+    import fakeredis
+
+    redis_server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+    env = {
+        **os.environ,
+        "BENCH_UPSTREAM_URL": site.base_url,
+        "BENCH_COMICS": str(args.comics),
+        "BENCH_REDIS_URL": f"redis://127.0.0.1:{redis_server.server_address[1]}/0",
+        # every client comes from 127.0.0.1, so they are told apart by known keys
+        "QUOTA_API_KEYS": ",".join([f"reader-{n}" for n in range(args.clients)] + ["abuser", "warmup"]),
+    }
+
+    report = {"config": vars(args)}
+    try:
+        report["quiet"] = run_phase("quiet", 0, False, site, env, args)
+        report["abuse"] = run_phase("abuse", args.abusers, False, site, env, args)
+        report["abuse_limited"] = run_phase("abuse_limited", args.abusers, True, site, env, args)
+    finally:
+        upstream.shutdown()
+        redis_server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
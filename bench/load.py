@@ -0,0 +1,298 @@
+"""
+Concurrent load test comparing deployment models.
+
+Drives a configurable mix of browse, read and export traffic at the app
+running under each server/worker model, with the upstream stand-in, a
+shared Redis double (fakeredis TCP server) and Mongo (mongomock per worker,
+or a local mongod) all local. Reports throughput, latency percentiles, error
+rate and per-process memory for each model.
+
+    python bench/load.py --duration 30 --clients 32 --mix browse=70,read=25,export=5
+    python bench/load.py --modes gunicorn-sync,gunicorn-gthread --workers 4 --output report.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import harness
+from standin import Site, serve
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+
+MODES = {
+    "threaded": ([], lambda a, port: [sys.executable, "wsgi.py", "--port", str(port)]),
+    "gunicorn-sync": (["gunicorn"], lambda a, port: [
+        sys.executable, "-m", "gunicorn", "-w", str(a.workers), "-k", "sync",
+        "--timeout", "120", "-b", f"127.0.0.1:{port}", "wsgi:app"]),
+    "gunicorn-gthread": (["gunicorn"], lambda a, port: [
+        sys.executable, "-m", "gunicorn", "-w", str(a.workers), "-k", "gthread", "--threads", str(a.threads),
+        "--timeout", "120", "-b", f"127.0.0.1:{port}", "wsgi:app"]),
+    "gunicorn-gevent": (["gunicorn", "gevent"], lambda a, port: [
+        sys.executable, "-m", "gunicorn", "-w", str(a.workers), "-k", "gevent", "--worker-connections", "200",
+        "--timeout", "120", "-b", f"127.0.0.1:{port}", "wsgi:app"]),
+    "asgi": (["uvicorn", "asgiref"], lambda a, port: [
+        sys.executable, "-m", "uvicorn", "--workers", str(a.workers), "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "wsgi:asgi_app"]),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid: int) -> list:
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"browse", "read", "export"}
+    if unknown:
+        raise SystemExit(f"unknown traffic classes: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Traffic:
+    def __init__(self, site: Site, mix: dict, seed: int):
+        self.rng = random.Random(seed)
+        self.classes = list(mix)
+        self.weights = [mix[name] for name in self.classes]
+        known = site.comics[:len(site.comics) // 2]
+        self.known = [comic["slug"] for comic in known]
+        self.read_chapters = [slug for comic in known for slug in comic["chapters"][0::2]]
+        self.chapters = [slug for comic in site.comics for slug in comic["chapters"]]
+        self.genres = sorted({genre for comic in site.comics for genre in comic["genres"]})
+
+    def next(self):
+        kind = self.rng.choices(self.classes, self.weights)[0]
+        if kind == "export":
+            return kind, "POST", f"/api/export-pdf/{self.rng.choice(self.read_chapters)}"
+        if kind == "read":
+            return kind, "GET", f"/api/read/{self.rng.choice(self.chapters)}"
+        return kind, "GET", self.rng.choice([
+            f"/api/home?page={self.rng.randint(1, 5)}",
+            "/api/genres",
+            f"/api/genre/{self.rng.choice(self.genres)}/comics",
+            f"/api/details/{self.rng.choice(self.known)}",
+            f"/api/search?q=comic+{self.rng.randint(0, 9)}",
+        ])
+
+
+def drive(base_url: str, site: Site, args) -> dict:
+    mix = parse_mix(args.mix)
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client(n: int):
+        session = requests.Session()
+        traffic = Traffic(site, mix, seed=n)
+        local = []
+        while time.perf_counter() < deadline:
+            kind, method, path = traffic.next()
+            started = time.perf_counter()
+            try:
+                status = session.request(method, base_url + path, timeout=120).status_code
+            except requests.RequestException:
+                status = 599
+            local.append((kind, time.perf_counter() - started, status))
+        with lock:
+            results.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def summarize(rows):
+        if not rows:
+            return {"requests": 0}
+        latencies = sorted(latency for _, latency, _ in rows)
+        errors = sum(1 for _, _, status in rows if status >= 500 or status == 429)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+        return {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2),
+            "error_rate": round(errors / len(rows), 4),
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        }
+
+    report = {"overall": summarize(results)}
+    for kind in mix:
+        report[kind] = summarize([row for row in results if row[0] == kind])
+    return report
+
+
+def wait_ready(base_url: str, process, timeout: float = 60) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(base_url + "/api/health", timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def run_mode(name: str, args, site: Site, env: dict) -> dict:
+    needs, command = MODES[name]
+    missing = [module for module in needs if importlib.util.find_spec(module) is None]
+    if missing:
+        return {"skipped": f"missing {', '.join(missing)}"}
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(command(args, port), cwd=BENCH, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if not wait_ready(base_url, process):
+            return {"skipped": "server did not start: " + process.stderr.read().decode()[-500:] if process.poll() is not None else "timeout"}
+
+        booted_rss = {pid: rss_mb(pid) for pid in process_tree(process.pid)}
+        peak_rss = dict(booted_rss)
+        sampling = threading.Event()
+
+        def sample():
+            while not sampling.wait(0.5):
+                for pid in process_tree(process.pid):
+                    peak_rss[pid] = max(peak_rss.get(pid, 0.0), rss_mb(pid))
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+
+        if args.warmup:
+            warm = argparse.Namespace(**{**vars(args), "duration": args.warmup})
+            drive(base_url, site, warm)
+        report = drive(base_url, site, args)
+        sampling.set()
+        sampler.join()
+
+        report["memory_mb"] = {
+            "processes": len(peak_rss),
+            "per_process_peak": sorted(round(value, 1) for value in peak_rss.values()),
+            "total_peak": round(sum(peak_rss.values()), 1),
+            "total_at_boot": round(sum(booted_rss.values()), 1),
+        }
+        return report
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_table(report: dict):
+    print(f"\n{'mode':18s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'errors':>7s} {'mem MB':>8s}")
+    for name, result in report["modes"].items():
+        if "skipped" in result:
+            print(f"{name:18s} skipped ({result['skipped'][:60]})")
+            continue
+        overall = result["overall"]
+        print(f"{name:18s} {overall.get('throughput_rps', 0):8.1f} {overall.get('p50_ms', 0):8.1f} "
+              f"{overall.get('p95_ms', 0):8.1f} {overall.get('p99_ms', 0):8.1f} "
+              f"{overall.get('error_rate', 0):7.2%} {result['memory_mb']['total_peak']:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--mix", default="browse=70,read=25,export=5")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--comics", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="artificial upstream latency in seconds")
+    parser.add_argument("--mongo-uri", help="local mongod shared by all workers; mongomock per worker when unset")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    site = Site(comics=args.comics, chapters=6, pages=6, latency=args.latency, image_size=(400, 600))
+    upstream = serve(site)
+
+    import fakeredis
+
+    redis_server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+
+    env = {
+        **os.environ,
+        "BENCH_UPSTREAM_URL": site.base_url,
+        "BENCH_COMICS": str(args.comics),
+        "BENCH_REDIS_URL": f"redis://127.0.0.1:{redis_server.server_address[1]}/0",
+    }
+    if args.mongo_uri:
+        env["BENCH_MONGO_URI"] = args.mongo_uri
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "modes": {}}
+    try:
+        for name in args.modes.split(","):
+            if args.mongo_uri:
+                harness.seed(harness.connect_mongo(args.mongo_uri), site)
+            harness.connect_redis(env["BENCH_REDIS_URL"]).flushdb()
+            print(f"running {name}...", file=sys.stderr)
+            report["modes"][name] = run_mode(name, args, site, env)
+    finally:
+        upstream.shutdown()
+        redis_server.shutdown()
+
+    print_table(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
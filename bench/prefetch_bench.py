@@ -0,0 +1,94 @@
+"""
+Next-chapter latency with read-ahead prefetching on and off.
+
+Simulated readers open a comic and read its chapters in order, pausing
+between chapters, against a stand-in upstream with added latency. Half of
+the comics are read with prefetching disabled and half with it enabled; the
+first chapter of every comic is always cold and is reported separately.
+
+    python bench/prefetch_bench.py --readers 20 --chapters 4 --latency 0.2 --think 2
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+from endpoints import percentile
+
+
+def read(client, slugs: list, think: float) -> list:
+    timings = []
+    for slug in slugs:
+        started = time.perf_counter()
+        response = client.get(f"/api/read/{slug}")
+        response.get_data()
+        timings.append((time.perf_counter() - started, response.status_code))
+        time.sleep(think)
+    return timings
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.mean(values) * 1000, 1),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=20, help="concurrent readers per mode, one comic each")
+    parser.add_argument("--chapters", type=int, default=4, help="chapters read per comic")
+    parser.add_argument("--latency", type=float, default=0.2, help="added upstream latency in seconds")
+    parser.add_argument("--think", type=float, default=2.0, help="seconds spent reading a chapter")
+    parser.add_argument("--max-active", type=int, help="override PREFETCH_MAX_ACTIVE, requests in flight above "
+                                                           "which prefetching waits")
+    parser.add_argument("--workers", type=int, help="override PREFETCH_WORKERS")
+    parser.add_argument("--pages", type=int, default=0, help="page images to warm per prefetched chapter")
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+
+    main_module, site, server, known = harness.start(
+        comics=args.readers * 2, chapters=args.chapters, latency=args.latency,
+        mongo_uri=args.mongo_uri, redis_url=args.redis_url, fraction=1.0)
+    # start from a catalog where no chapter was read yet
+    main_module.db.db.chapters.update_many({}, {"$unset": {"images": ""}})
+    prefetcher = main_module.prefetcher
+    prefetcher.pages = args.pages
+    if args.workers is not None:
+        prefetcher.workers = args.workers
+    if args.max_active is not None:
+        prefetcher.max_active = args.max_active
+
+    report = {}
+    for mode, comics in (("off", known[:args.readers]), ("on", known[args.readers:])):
+        prefetcher.enabled = mode == "on"
+        site.reset_counters()
+        with ThreadPoolExecutor(args.readers) as pool:
+            results = list(pool.map(
+                lambda comic: read(main_module.app.test_client(), comic["chapters"], args.think), comics))
+        prefetcher.join()
+
+        first = [timings[0][0] for timings in results]
+        following = [seconds for timings in results for seconds, _ in timings[1:]]
+        report[mode] = {
+            "first_chapter": summarize(first),
+            "next_chapter": summarize(following),
+            "errors": sum(status != 200 for timings in results for _, status in timings),
+            "upstream_requests": site.requests,
+        }
+        print(mode, report[mode], file=sys.stderr)
+
+    report["prefetch"] = prefetcher.snapshot()
+    report["max_active"] = prefetcher.max_active
+    server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
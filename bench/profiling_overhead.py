@@ -0,0 +1,99 @@
+"""
+Measures what profiling.py costs per request: the app with the profiling
+hooks removed, installed but off (the production default), and profiling
+every request. Exits non-zero when "off" adds more than --max-overhead-us.
+
+    python bench/profiling_overhead.py --requests 2000
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+import harness
+
+
+def hooks(app):
+    return {
+        registry: [f for f in funcs.get(None, []) if getattr(f, "__module__", "") == "profiling"]
+        for registry, funcs in (("before", app.before_request_funcs), ("after", app.after_request_funcs))
+    }
+
+
+def set_hooks(app, installed: dict, enabled: bool):
+    for registry, funcs in (("before", app.before_request_funcs), ("after", app.after_request_funcs)):
+        current = [f for f in funcs.get(None, []) if getattr(f, "__module__", "") != "profiling"]
+        funcs[None] = current + installed[registry] if enabled else current
+
+
+def timed(client, path: str) -> float:
+    started = time.perf_counter()
+    client.get(path).get_data()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per route and configuration")
+    parser.add_argument("--max-overhead-us", type=float, default=50.0)
+    args = parser.parse_args()
+
+    main_module, site, server, known = harness.start(comics=40)
+    import profiling
+
+    app = main_module.app
+    client = app.test_client()
+    installed = hooks(app)
+    profiling.PROFILE_DIR = tempfile.mkdtemp(prefix="comixie-profiles-")
+    profiling.PROFILE_SLOW_MS = float("inf")
+
+    routes = {
+        "health": "/api/health",
+        "details (mongo)": f"/api/details/{known[0]['slug']}",
+        "read (mongo)": f"/api/read/{known[0]['chapters'][0]}",
+    }
+    configs = {
+        "uninstrumented": (False, 0.0),
+        "off": (True, 0.0),
+        "profiled": (True, 1.0),
+    }
+
+    report = {}
+    try:
+        for route, path in routes.items():
+            samples = {name: [] for name in configs}
+            for _ in range(50):
+                timed(client, path)
+            # interleave configurations, rotating their order, so drift and
+            # the after-effects of a profiled request hit all of them alike
+            names = list(configs)
+            for i in range(args.requests):
+                for name in names[i % 3:] + names[:i % 3]:
+                    enabled, rate = configs[name]
+                    set_hooks(app, installed, enabled)
+                    profiling.PROFILE_SAMPLE_RATE = rate
+                    samples[name].append(timed(client, path))
+            set_hooks(app, installed, True)
+            profiling.PROFILE_SAMPLE_RATE = 0.0
+
+            medians = {name: statistics.median(values) * 1e6 for name, values in samples.items()}
+            report[route] = {
+                **{f"{name}_median_us": round(value, 1) for name, value in medians.items()},
+                "off_overhead_us": round(medians["off"] - medians["uninstrumented"], 1),
+                "off_overhead_pct": round((medians["off"] / medians["uninstrumented"] - 1) * 100, 2),
+                "profiled_overhead_pct": round((medians["profiled"] / medians["uninstrumented"] - 1) * 100, 2),
+            }
+    finally:
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    worst = max(result["off_overhead_us"] for result in report.values())
+    if worst > args.max_overhead_us:
+        print(f"profiling hooks add {worst}us per request when off (limit {args.max_overhead_us}us)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
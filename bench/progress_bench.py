@@ -0,0 +1,181 @@
+"""
+Sustained reading-progress writes and the Mongo write rate they cause.
+
+Simulated readers turn pages for --duration seconds. In write-behind mode
+every turn goes through db.progress (Redis) and the background flusher
+writes to Mongo every --flush-interval seconds; in direct mode every turn is
+an update_one against Mongo, which is what progress tracking would cost
+without the Redis layer. After the run a final flush must leave Mongo equal
+to what the readers last wrote.
+
+Without --mongo-uri, Mongo is a keyed in-memory double and Redis is
+fakeredis running in this process, so the write rates are lower bounds; the
+Mongo documents per progress write is the figure the design controls.
+
+    python bench/progress_bench.py --users 1000 --threads 8 --duration 10
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from pymongo import DeleteOne
+from pymongo.errors import DuplicateKeyError
+
+import harness
+
+import db  # noqa: E402  (harness puts the repo root on sys.path)
+
+
+class KeyedCollection:
+    """
+    Just enough of a collection for upserts and deletes keyed on the filter.
+    mongomock scans every document per upsert, which would make the flusher,
+    not the design, the bottleneck; pass --mongo-uri for a real mongod.
+    """
+
+    def __init__(self):
+        self.documents = {}
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def update_one(self, query, update, upsert=False):
+        key = tuple(sorted(query.items()))
+        if key in self.documents or upsert:
+            self.documents.setdefault(key, dict(query)).update(update["$set"])
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            document = operation._doc
+            if isinstance(operation, DeleteOne):
+                self.documents.pop(tuple(sorted(operation._filter.items())), None)
+            else:
+                self.update_one(operation._filter, document, upsert=True)
+
+    def find(self, query=None, projection=None):
+        return iter([dict(document) for document in self.documents.values()])
+
+
+class KeyedDatabase:
+    def __init__(self):
+        self.reading_progress = KeyedCollection()
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+class CountingDatabase:
+    """Counts write calls and documents written through the wrapped database"""
+
+    def __init__(self, database):
+        self._database = database
+        self.calls = 0
+        self.documents = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+    def __getitem__(self, name):
+        collection = self._database[name]
+        owner = self
+
+        class Collection:
+            def __getattr__(self, attribute):
+                return getattr(collection, attribute)
+
+            def bulk_write(self, operations, **kwargs):
+                owner.count(len(operations))
+                return collection.bulk_write(operations, **kwargs)
+
+            def update_one(self, *args, **kwargs):
+                owner.count(1)
+                return collection.update_one(*args, **kwargs)
+        return Collection()
+
+    def count(self, documents: int):
+        with self._lock:
+            self.calls += 1
+            self.documents += documents
+
+
+def run(mode: str, args, database, cache) -> dict:
+    counting = CountingDatabase(database)
+    db.db, db.cache = counting, cache
+    db.PROGRESS_FLUSH_INTERVAL = args.flush_interval
+    db.progress.flusher.pid = None
+    db.progress.ensure_indexes()
+
+    stop = time.perf_counter() + args.duration
+    latest, turns = {}, [0] * args.threads
+
+    def reader(n: int):
+        rng = random.Random(n)
+        while time.perf_counter() < stop:
+            # every reader owns its users, so the last write per document is well defined
+            user = f"user-{rng.randrange(n, args.users, args.threads)}"
+            comic = f"comic-{rng.randrange(args.comics_per_user)}"
+            page = rng.randrange(40)
+            if mode == "direct":
+                try:
+                    counting["reading_progress"].update_one(
+                        {"user": user, "comic_slug": comic},
+                        {"$set": {"chapter_slug": f"{comic}-001", "page": page, "updated_at": time.time()}},
+                        upsert=True)
+                except DuplicateKeyError:
+                    # two first writes raced on the unique index, the other one won
+                    continue
+            else:
+                db.progress.set(db.Progress(user, comic, f"{comic}-001", page))
+            latest[(user, comic)] = page
+            turns[n] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    db.progress.flush(wait=True)
+    drained = time.perf_counter() - started
+    stored = {(item["user"], item["comic_slug"]): item["page"] for item in database.reading_progress.find()}
+    return {
+        "mode": mode,
+        "progress_writes": sum(turns),
+        "progress_writes_per_second": round(sum(turns) / elapsed),
+        "documents": len(latest),
+        # counted until the final flush landed, so nothing is left in Redis
+        "mongo_write_calls": counting.calls,
+        "mongo_documents_written": counting.documents,
+        "mongo_documents_per_second": round(counting.documents / drained, 1),
+        "mongo_documents_per_progress_write": round(counting.documents / max(sum(turns), 1), 4),
+        "mongo_matches_latest": stored == latest,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--comics-per-user", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+
+    report = []
+    for mode in ("direct", "write-behind"):
+        database = harness.connect_mongo(args.mongo_uri) if args.mongo_uri else KeyedDatabase()
+        report.append(run(mode, args, database, harness.connect_redis(args.redis_url)))
+        print(report[-1], file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Bytes on the wire and server CPU per request for the JSON routes served
+through the response cache (responses.py), against how they were served
+before.
+
+`before` serializes every response with jsonify and sends it uncompressed;
+/api/home kept its JSON in Redis and decoded and re-encoded it per request.
+`before+gzip` is the same with each response gzipped on the way out, what
+a compressing middleware costs. `after` is the response cache, for clients
+accepting gzip, brotli and none, and for revalidations that come back 304.
+
+CPU is this process's CPU time per request through the Flask test client,
+once every cache is warm. With mongomock the Mongo-backed routes' `before`
+figures include mongomock's query work; use --mongo-uri for a real server.
+
+    python bench/responses_bench.py --requests 2000
+    python bench/responses_bench.py --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from itertools import cycle
+
+from flask import current_app, jsonify, request
+
+import harness
+
+import responses  # noqa: E402  (harness puts the repo root on sys.path)
+
+
+class Before:
+    """The routes' previous behaviour, optionally gzipping every response"""
+
+    def __init__(self, store, compress: bool = False):
+        self.store = store
+        self.compress = compress
+
+    def respond(self, key, build, ttl=None):
+        if ttl:  # /api/home, the only route that had a cache
+            cached = self.store.get(f"bench-before:{key}")
+            if cached:
+                data = json.loads(cached)
+            else:
+                data = build()
+                self.store.set(f"bench-before:{key}", json.dumps(data), ex=ttl)
+        else:
+            data = build()
+        response = current_app.make_response(jsonify(data) if isinstance(data, (dict, list)) else data)
+        if self.compress and "gzip" in request.headers.get("Accept-Encoding", ""):
+            response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+            response.headers["Content-Encoding"] = "gzip"
+        return response
+
+    def invalidate(self, *keys):
+        pass
+
+
+def wire_bytes(response) -> int:
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+    return len(response.data) + headers + len("HTTP/1.1 200 OK\r\n\r\n")
+
+
+def measure(client, paths, count: int, headers: dict, revalidate: bool = False) -> dict:
+    etags = {}
+    for path in paths:  # warm every cache, remember the validators a client would hold
+        etags[path] = client.get(path, headers=headers).headers.get("ETag")
+
+    total, statuses, next_path = 0, {}, cycle(paths)
+    started = time.process_time()
+    for _ in range(count):
+        path = next(next_path)
+        request_headers = {**headers, "If-None-Match": etags[path]} if revalidate and etags[path] else headers
+        response = client.get(path, headers=request_headers)
+        total += wire_bytes(response)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    cpu = time.process_time() - started
+    return {"bytes_per_request": round(total / count), "cpu_us_per_request": round(cpu / count * 1e6),
+            "statuses": statuses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comics", type=int, default=40)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=22)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route and mode")
+    parser.add_argument("--mongo-uri")
+    args = parser.parse_args()
+
+    main_module, site, server, known = harness.start(comics=args.comics, chapters=args.chapters,
+                                                     pages=args.pages, mongo_uri=args.mongo_uri)
+    read = [chapter for comic in known for chapter in comic["chapters"][0::2]]
+    genres = sorted({genre for comic in site.comics for genre in comic["genres"]})
+    routes = {
+        "/api/home": [f"/api/home?page={page}" for page in range(1, 4)],
+        "/api/details": [f"/api/details/{comic['slug']}" for comic in known],
+        "/api/read": [f"/api/read/{slug}" for slug in read],
+        "/api/genre/<genre>/comics": [f"/api/genre/{genre}/comics?per_page=20" for genre in genres],
+    }
+    # reading a chapter schedules read-ahead, which is not what is measured here
+    main_module.prefetcher.schedule = lambda slug: None
+    client = main_module.app.test_client()
+    cache = main_module.responses
+
+    modes = {
+        "before": (Before(main_module.r), {}, False),
+        "before+gzip": (Before(main_module.r, compress=True), {"Accept-Encoding": "gzip"}, False),
+        "after identity": (cache, {}, False),
+        "after gzip": (cache, {"Accept-Encoding": "gzip"}, False),
+        "after br": (cache, {"Accept-Encoding": "gzip, deflate, br"}, False),
+        "after 304": (cache, {"Accept-Encoding": "gzip, deflate, br"}, True),
+    }
+    report = {"config": vars(args), "encodings": list(responses.ENCODINGS), "routes": {}}
+    try:
+        for route, paths in routes.items():
+            report["routes"][route] = {}
+            for mode, (implementation, headers, revalidate) in modes.items():
+                main_module.responses = implementation
+                result = measure(client, paths, args.requests, headers, revalidate)
+                report["routes"][route][mode] = result
+                print(route, mode, result, file=sys.stderr)
+    finally:
+        main_module.responses = cache
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
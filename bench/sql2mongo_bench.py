@@ -0,0 +1,173 @@
+"""
+Throughput and peak memory of sql2mongo.py on generated SQLite catalogs.
+
+Each migration runs in a child process so its peak RSS can be read on its
+own. Writes go to a counting sink by default, which isolates the pipeline
+from the database; pass --mongo-uri to write to a real mongod instead.
+--verify checks on a small catalog that a second run changes nothing.
+
+    python bench/sql2mongo_bench.py --chapters 100000,1000000 --workers 1,4
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+
+sys.path.append(harness.ROOT)
+
+import sql2mongo  # noqa: E402
+
+GENRES = ["Action", "Adventure", "Comedy", "Crime", "Drama", "Fantasy",
+          "Horror", "Mystery", "Romance", "Sci-Fi", "Superhero", "Thriller"]
+
+
+def generate(path: str, chapters: int, chapters_per_comic: int = 50, seed: int = 1):
+    rng = random.Random(seed)
+    comics = max(1, chapters // chapters_per_comic)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE genres (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE comics (id INTEGER PRIMARY KEY, slug TEXT, title TEXT, url TEXT,
+                             description TEXT, publisher TEXT, image TEXT);
+        CREATE TABLE comic_genres (comic_id INTEGER, genre_id INTEGER);
+        CREATE TABLE chapters (id INTEGER PRIMARY KEY, comic_id INTEGER, slug TEXT, name TEXT, url TEXT);
+        CREATE INDEX comic_genres_comic ON comic_genres (comic_id);
+    """)
+    conn.executemany("INSERT INTO genres VALUES (?, ?)", enumerate(GENRES, 1))
+    conn.executemany("INSERT INTO comics VALUES (?, ?, ?, ?, ?, ?, ?)", (
+        (i, f"comic-{i}", f"Comic {i}", f"https://readallcomics.com/category/comic-{i}/",
+         f"Comic {i} collects the whole run. " * 6, rng.choice(["Marvel", "DC Comics", "Image"]),
+         f"https://readallcomics.com/images/comic-{i}.jpg")
+        for i in range(1, comics + 1)))
+    conn.executemany("INSERT INTO comic_genres VALUES (?, ?)", (
+        (i, genre) for i in range(1, comics + 1) for genre in rng.sample(range(1, len(GENRES) + 1), 2)))
+    conn.executemany("INSERT INTO chapters VALUES (?, ?, ?, ?, ?)", (
+        (n, (n - 1) // chapters_per_comic + 1, f"comic-{(n - 1) // chapters_per_comic + 1}-{n}",
+         f"Comic {(n - 1) // chapters_per_comic + 1} #{n}", f"https://readallcomics.com/comic-{n}/")
+        for n in range(1, chapters + 1)))
+    conn.commit()
+    conn.close()
+
+
+class Result:
+    def __init__(self, operations):
+        self.upserted_count = len(operations)
+        self.modified_count = 0
+
+
+class CountingCollection:
+    def __init__(self):
+        self.operations = 0
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def aggregate(self, pipeline, **kwargs):
+        return iter(())
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations += len(operations)
+        return Result(operations)
+
+
+class CountingDatabase:
+    def __init__(self):
+        self.genres, self.comics, self.chapters = CountingCollection(), CountingCollection(), CountingCollection()
+
+
+def child(args):
+    conn = sqlite3.connect(args.child)
+    if args.mongo_uri:
+        database = harness.connect_mongo(args.mongo_uri)
+    else:
+        database = CountingDatabase()
+    started = time.perf_counter()
+    stats = sql2mongo.migrate(conn, database, workers=args.child_workers, batch_size=args.batch_size,
+                              progress_every=10 ** 9)
+    elapsed = time.perf_counter() - started
+    rows = sum(table["rows"] for table in stats.values())
+    return {"rows": rows, "seconds": round(elapsed, 2), "rows_per_second": round(rows / elapsed)}
+
+
+def run(path: str, workers: int, args) -> dict:
+    command = [sys.executable, __file__, "--child", path, "--child-workers", str(workers),
+               "--batch-size", str(args.batch_size)]
+    if args.mongo_uri:
+        command += ["--mongo-uri", args.mongo_uri]
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result = json.loads(output.strip().splitlines()[-1])
+    # ru_maxrss of children is the max over all of them, so only a new peak is attributable
+    result["peak_rss_mb"] = round(peak / 1024, 1) if peak > before else f"<= {round(before / 1024, 1)}"
+    return result
+
+
+def verify(workdir: str) -> dict:
+    path = os.path.join(workdir, "verify.db")
+    generate(path, 2000, chapters_per_comic=20)
+    database = harness.connect_mongo()
+    conn = sqlite3.connect(path)
+    first = sql2mongo.migrate(conn, database, workers=2, batch_size=250)
+    counts = {name: database[name].count_documents({}) for name in ("genres", "comics", "chapters")}
+    second = sql2mongo.migrate(conn, database, workers=2, batch_size=250)
+    recounts = {name: database[name].count_documents({}) for name in ("genres", "comics", "chapters")}
+    return {
+        "first_run": first,
+        "second_run": second,
+        "counts_unchanged": counts == recounts,
+        "second_run_noop": all(t["upserted"] == 0 and t["modified"] == 0 for t in second.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", default="1000000", help="comma separated catalog sizes")
+    parser.add_argument("--workers", default="1,4", help="comma separated writer thread counts")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--verify", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-workers", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # keep the migration's own progress lines out of the result
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                result = child(args)
+            finally:
+                sys.stdout = stdout
+        print(json.dumps(result))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="comixie-sql2mongo-")
+    report = {"runs": []}
+    if args.verify:
+        report["verify"] = verify(workdir)
+
+    for size in (int(value) for value in args.chapters.split(",")):
+        path = os.path.join(workdir, f"catalog-{size}.db")
+        started = time.perf_counter()
+        generate(path, size)
+        print(f"generated {size} chapters in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for workers in (int(value) for value in args.workers.split(",")):
+            result = run(path, workers, args)
+            report["runs"].append({"chapters": size, "workers": workers, **result})
+            print(report["runs"][-1], file=sys.stderr)
+        os.remove(path)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
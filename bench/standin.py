@@ -0,0 +1,245 @@
+"""
+Local stand-in for readallcomics.com.
+
+Serves a deterministic, generated catalog with the same markup the scrapers
+in main.py expect: listing pages, category pages, chapter pages, the search
+POST and page images. Every HTML response carries an ETag and Last-Modified
+header and honours conditional requests, so cache behaviour can be measured
+without touching the real site.
+"""
+import hashlib
+import io
+import logging
+import random
+import threading
+import time
+from email.utils import formatdate
+from typing import Dict, Optional
+
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+GENRES = ["Action", "Adventure", "Comedy", "Crime", "Drama", "Fantasy",
+          "Horror", "Mystery", "Romance", "Sci-Fi", "Superhero", "Thriller"]
+PUBLISHERS = ["Marvel", "DC Comics", "Image", "Dark Horse", "IDW", "Boom! Studios"]
+POSTS_PER_PAGE = 24
+FILLER = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4
+
+
+def page_layout(title: str, body: str) -> str:
+    nav = "".join(f'<li class="menu-item"><a href="/category/genre-{g.lower()}/">{g}</a></li>' for g in GENRES)
+    widgets = "".join(f'<div class="widget"><h3>Recent {i}</h3><p>{FILLER}</p></div>' for i in range(6))
+    return (
+        '<!DOCTYPE html><html lang="en-US"><head><meta charset="UTF-8"/>'
+        f'<title>{title} | Read All Comics Online</title>'
+        '<link rel="stylesheet" href="/wp-content/themes/style.css" type="text/css" media="all"/>'
+        '<script type="text/javascript">var ajaxurl = "/wp-admin/admin-ajax.php";</script>'
+        '</head><body class="home blog"><div id="wrapper">'
+        f'<div id="header"><a href="/"><img src="/logo.png" alt="logo"/></a><ul class="menu">{nav}</ul></div>'
+        f'<div id="content">{body}</div>'
+        f'<div id="sidebar">{widgets}</div>'
+        '<div id="footer"><p>&copy; Read All Comics</p></div>'
+        '</div></body></html>'
+    )
+
+
+class Site:
+    def __init__(self, comics: int = 200, chapters: int = 12, pages: int = 20,
+                 seed: int = 1, latency: float = 0.0, image_size=(800, 1200)):
+        self.latency = latency
+        self.image_size = image_size
+        self.pages = pages
+        self.versions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._images: Dict[str, bytes] = {}
+
+        rng = random.Random(seed)
+        self.comics = []
+        for i in range(comics):
+            slug = f"comic-{i:05d}"
+            self.comics.append({
+                "slug": slug,
+                "title": f"Comic {i:05d}",
+                "genres": rng.sample(GENRES, rng.randint(1, 3)),
+                "publisher": rng.choice(PUBLISHERS),
+                "chapters": [f"{slug}-{n:03d}" for n in range(1, chapters + 1)],
+            })
+        self.by_slug = {comic["slug"]: comic for comic in self.comics}
+        self.chapter_owner = {chapter: comic for comic in self.comics for chapter in comic["chapters"]}
+
+        # newest first, like the real front page
+        self.posts = [(comic, chapter) for n in range(chapters) for comic in self.comics
+                      for chapter in [comic["chapters"][n]]][::-1]
+
+    @property
+    def base_url(self) -> str:
+        return getattr(self, "_base_url", "")
+
+    def touch(self, path: str):
+        """Change the body served at `path`, as if the page was edited upstream."""
+        with self.lock:
+            self.versions[path] = self.versions.get(path, 0) + 1
+
+    def add_chapter(self, slug: str) -> str:
+        comic = self.by_slug[slug]
+        chapter = f"{slug}-{len(comic['chapters']) + 1:03d}"
+        comic["chapters"].append(chapter)
+        self.chapter_owner[chapter] = comic
+        self.posts.insert(0, (comic, chapter))
+        self.touch(f"/category/{slug}/")
+        return chapter
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = self.not_modified = self.bytes_sent = 0
+
+    # rendering
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def render_home(self, page: int) -> Optional[str]:
+        posts = self.posts[(page - 1) * POSTS_PER_PAGE:page * POSTS_PER_PAGE]
+        if not posts:
+            return None
+        items = []
+        for n, (comic, chapter) in enumerate(posts):
+            post_id = 100000 - (page - 1) * POSTS_PER_PAGE - n
+            items.append(
+                f'<div id="post-{post_id}" class="post-{post_id} post type-post status-publish '
+                f'format-standard hentry category-{comic["slug"]}">'
+                f'<center><a href="{self.url("/" + chapter + "/")}">'
+                f'<img src="{self.url("/images/" + comic["slug"] + "/cover.jpg")}" width="140" height="210"/></a><br/>'
+                f'<a class="front-link" href="{self.url("/" + chapter + "/")}">{comic["title"]} #{chapter[-3:]}</a><br/>'
+                f'<span>July {1 + n % 28}, 2025</span></center></div>'
+            )
+        last = (len(self.posts) + POSTS_PER_PAGE - 1) // POSTS_PER_PAGE
+        shown = sorted({p for p in (1, page - 1, page, page + 1, last) if 1 <= p <= last})
+        numbers = "".join(f'<a class="page-numbers" href="{self.url(f"/page/{p}/")}">{p}</a>'
+                          for p in shown)
+        return page_layout("Home", f'<div id="post-area">{"".join(items)}</div>'
+                                   f'<div class="pagination">{numbers}</div>')
+
+    def render_category(self, slug: str) -> Optional[str]:
+        comic = self.by_slug.get(slug)
+        if not comic:
+            return None
+        chapters = "".join(f'<li><a href="{self.url("/" + c + "/")}">{comic["title"]} #{c[-3:]}</a></li>'
+                           for c in reversed(comic["chapters"]))
+        return page_layout(comic["title"], (
+            f'<center><div class="description-archive"><h1><b>{comic["title"]}</b></h1>'
+            f'<div><p>Genres: <strong>{", ".join(comic["genres"])}</strong><br/>'
+            f'Publisher: <strong>{comic["publisher"]}</strong></p></div></div>'
+            f'<p><img src="{self.url("/images/" + slug + "/cover.jpg")}" width="200" height="300"/></p></center>'
+            f'<div class="b"><span>Description</span><br/>{comic["title"]} collects the run. {FILLER}<br/></div>'
+            f'<ul class="list-story">{chapters}</ul>'
+        ))
+
+    def render_chapter(self, slug: str) -> Optional[str]:
+        comic = self.chapter_owner.get(slug)
+        if not comic:
+            return None
+        images = "".join(f'<p><img src="{self.url(f"/images/{slug}/{n:03d}.jpg")}" width="1000" height="1500"/></p>'
+                         for n in range(1, self.pages + 1))
+        return page_layout(slug, (
+            f'<div class="breadcrumb"><a href="{self.url("/category/" + comic["slug"] + "/")}">{comic["title"]}</a></div>'
+            f'<center>{images}</center>'
+        ))
+
+    def render_search(self, query: str) -> str:
+        hits = [c for c in self.comics if query.lower() in c["title"].lower()][:20]
+        links = "".join(f'<li><a href=\\"{self.url("/category/" + c["slug"] + "/")}\\">{c["title"]}</a></li>' for c in hits)
+        return f'"<ul class=\\"list-story\\">{links}</ul>"'
+
+    def render_image(self, path: str) -> bytes:
+        if path not in self._images:
+            from PIL import Image
+
+            digest = hashlib.md5(path.encode()).digest()
+            img = Image.new("RGB", self.image_size, tuple(digest[:3]))
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=80)
+            self._images[path] = buffer.getvalue()
+        return self._images[path]
+
+    # wsgi
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        if self.latency:
+            time.sleep(self.latency)
+        response = self.dispatch(request)
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += len(response.get_data())
+            if response.status_code == 304:
+                self.not_modified += 1
+        return response(environ, start_response)
+
+    def dispatch(self, request: Request) -> Response:
+        path = request.path
+        if path.startswith("/images/"):
+            return Response(self.render_image(path), mimetype="image/jpeg")
+
+        if path == "/" and request.args.get("story") is not None:
+            return Response(self.render_search(request.args["story"]), mimetype="text/html")
+
+        parts = [p for p in path.split("/") if p]
+        body = None
+        if not parts:
+            body = self.render_home(1)
+        elif parts[0] == "page" and len(parts) == 2 and parts[1].isdigit():
+            body = self.render_home(int(parts[1]))
+        elif parts[0] == "category" and len(parts) == 2:
+            body = self.render_category(parts[1])
+        elif len(parts) == 1:
+            body = self.render_chapter(parts[0])
+
+        if body is None:
+            return Response("<html><body>Not Found</body></html>", status=404, mimetype="text/html")
+
+        version = self.versions.get(path, 0)
+        if version:
+            body = body.replace("</body>", f"<!-- revision {version} --></body>")
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+        last_modified = formatdate(1700000000 + version * 3600, usegmt=True)
+
+        if request.headers.get("If-None-Match") == etag:
+            response = Response(status=304)
+        elif not request.headers.get("If-None-Match") and request.headers.get("If-Modified-Since") == last_modified:
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype="text/html")
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = last_modified
+        return response
+
+
+def serve(site: Site, host: str = "127.0.0.1", port: int = 0):
+    """Start `site` on a background thread, returns the server; call shutdown() to stop."""
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, port, site, threaded=True)
+    site._base_url = f"http://{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the readallcomics stand-in")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--comics", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = serve(Site(comics=args.comics, latency=args.latency), port=args.port)
+    print(f"Stand-in running on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
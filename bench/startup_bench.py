@@ -0,0 +1,124 @@
+"""
+Import time of main.py and gunicorn worker boot time.
+
+Import time is measured in fresh interpreters, both as wall time and as the
+cumulative `-X importtime` figure for the heaviest modules. Boot time is the
+time from launching gunicorn until every worker has finished loading the app
+and the first /api/health answers, with and without --preload. No Mongo or
+Redis has to be reachable: none of this should talk to them.
+
+    python bench/startup_bench.py --repeat 5 --workers 4
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV = {**os.environ, "REDIS_HOST": "127.0.0.1", "MONGO_HOST": "127.0.0.1",
+       "PYTHONDONTWRITEBYTECODE": "1"}
+HEAVY = ("reportlab", "PIL", "cloudscraper", "pymongo", "redis", "prometheus_client", "lxml", "flask")
+
+
+def import_time() -> float:
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=ENV, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def heaviest_imports() -> dict:
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=ENV,
+                            check=True, capture_output=True, text=True).stderr
+    totals = dict.fromkeys(HEAVY, 0)
+    for line in stderr.splitlines():
+        # self time of every module, summed per top-level package
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)", line)
+        if match and match.group(2).split(".")[0] in totals:
+            totals[match.group(2).split(".")[0]] += int(match.group(1))
+    return {name: round(total / 1000, 1) for name, total in totals.items()}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def boot_time(workers: int, preload: bool) -> dict:
+    workdir = tempfile.mkdtemp(prefix="comixie-boot-")
+    marker = os.path.join(workdir, "ready")
+    config = os.path.join(workdir, "gunicorn.conf.py")
+    with open(config, "w") as f:
+        f.write(f"exec(open({os.path.join(ROOT, 'gunicorn.conf.py')!r}).read())\n"
+                "import time\n"
+                "def post_worker_init(worker):\n"
+                f"    with open({marker!r}, 'a') as f:\n"
+                "        f.write(f'{time.time()}\\n')\n")
+
+    port = free_port()
+    env = {**ENV, "BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": str(workers),
+           "PROMETHEUS_MULTIPROC_DIR": os.path.join(workdir, "metrics")}
+    command = [sys.executable, "-m", "gunicorn", "-c", config] + (["--preload"] if preload else []) + ["main:app"]
+    started = time.time()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    first_response = None
+    try:
+        deadline = started + 60
+        while time.time() < deadline:
+            if first_response is None:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                        if response.status == 200:
+                            first_response = time.time() - started
+                except OSError:
+                    pass
+            ready = open(marker).read().split() if os.path.exists(marker) else []
+            if first_response is not None and len(ready) >= workers:
+                return {
+                    "first_response_s": round(first_response, 3),
+                    "all_workers_ready_s": round(max(float(t) for t in ready) - started, 3),
+                }
+            if server.poll() is not None:
+                raise RuntimeError(server.stderr.read().decode()[-2000:])
+            time.sleep(0.02)
+        raise RuntimeError("gunicorn did not come up within 60s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.repeat)]
+    report = {
+        "import_main_s": {"median": round(statistics.median(imports), 3), "min": round(min(imports), 3)},
+        "import_ms_by_package": heaviest_imports(),
+    }
+    for preload in (False, True):
+        runs = [boot_time(args.workers, preload) for _ in range(args.repeat)]
+        report["boot_preload" if preload else "boot"] = {
+            name: round(statistics.median(run[name] for run in runs), 3) for name in runs[0]
+        }
+        print(report, file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cost of an updates.py poll against catalogs of growing size.
+
+Every chapter of the stand-in catalog is seeded into Mongo, then a few new
+chapters are posted upstream and one poll picks them up. The upstream
+requests and time per poll should follow the number of new chapters and
+stay flat as the catalog grows. mongomock has no real indexes, so poll
+time against it grows with the catalog; the Mongo call count is the figure
+to compare, or pass --mongo-uri for real timings.
+
+    python bench/updates_bench.py --comics 200,2000,10000 --new 0,10,100
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import requests
+
+import harness
+from harness import Site, serve
+
+import updates  # noqa: E402  (harness puts the repo root on sys.path)
+from upstream import UpstreamCache  # noqa: E402
+
+
+class Counting:
+    """Counts calls made through a database's collections"""
+
+    def __init__(self, database):
+        self._database = database
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return CountingCollection(self, getattr(self._database, name))
+
+
+class CountingCollection:
+    def __init__(self, owner: Counting, collection):
+        self._owner = owner
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self._owner.calls += 1
+            return attribute(*args, **kwargs)
+        return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comics", default="200,2000,10000", help="comma separated catalog sizes")
+    parser.add_argument("--chapters", type=int, default=12, help="chapters per comic")
+    parser.add_argument("--new", default="0,10,100", help="comma separated new chapter counts per poll")
+    parser.add_argument("--mongo-uri")
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    report = []
+    for size in (int(value) for value in args.comics.split(",")):
+        site = Site(comics=size, chapters=args.chapters)
+        server = serve(site)
+        database = harness.connect_mongo(args.mongo_uri)
+        harness.seed(database, site, fraction=1.0, with_images=False)
+        counting = Counting(database)
+        detector = updates.UpdateDetector(UpstreamCache(requests.Session(), harness.connect_redis(args.redis_url)),
+                                          counting, site.base_url)
+        detector.ensure_indexes()
+        detector.poll()  # warms the conditional-fetch cache for page 1
+
+        for new in (int(value) for value in args.new.split(",")):
+            for comic in rng.sample(site.comics, new):
+                site.add_chapter(comic["slug"])
+            site.reset_counters()
+            counting.calls = 0
+            result = detector.poll()
+
+            started = time.perf_counter()
+            feed = updates.feed(database, since=0, comics=[c["slug"] for c in site.comics[:50]])
+            report.append({
+                "catalog_chapters": size * args.chapters,
+                "posted": new,
+                "detected": result["new_chapters"],
+                "listing_pages": result["pages"],
+                "upstream_requests": site.requests,
+                "not_modified": site.not_modified,
+                "mongo_calls": counting.calls,
+                "poll_ms": round(result["seconds"] * 1000, 1),
+                "feed_ms": round((time.perf_counter() - started) * 1000, 2),
+                "feed_items": len(feed["updates"]),
+            })
+            print(report[-1], file=sys.stderr)
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
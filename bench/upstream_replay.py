@@ -0,0 +1,125 @@
+"""
+Replays a traffic log of upstream fetches against the local stand-in, once
+with plain fetch-and-parse (what main.py did before the upstream cache) and
+once through UpstreamCache, and reports bytes transferred and parse CPU.
+
+    python bench/upstream_replay.py --requests 2000 --change-rate 0.05
+    python bench/upstream_replay.py --log traffic.log
+
+A log is one "<path>" per line, optionally prefixed with "touch " to mark the
+point where the page changed upstream.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import fakeredis
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract  # noqa: E402
+from standin import Site, serve  # noqa: E402
+from upstream import UpstreamCache  # noqa: E402
+
+
+def parser_for(path: str):
+    if path.startswith("/page/"):
+        return extract.home
+    if path.startswith("/category/"):
+        return extract.category
+    return extract.chapter
+
+
+def generate_log(site: Site, count: int, change_rate: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    paths = [f"/page/{p}/" for p in range(1, 6)]
+    paths += [f"/category/{c['slug']}/" for c in site.comics]
+    paths += [f"/{ch}/" for c in site.comics for ch in c["chapters"]]
+
+    log = []
+    for _ in range(count):
+        # a rough zipf: a few listing pages and popular comics dominate
+        path = paths[min(int(rng.paretovariate(1.2)) - 1, len(paths) - 1)] if rng.random() < 0.7 \
+            else rng.choice(paths)
+        if rng.random() < change_rate:
+            log.append(f"touch {path}")
+        log.append(path)
+    return log
+
+
+def replay(site: Site, log: list, cached: bool) -> dict:
+    session = requests.Session()
+    cache = UpstreamCache(session, fakeredis.FakeRedis()) if cached else None
+    site.versions.clear()
+    site.reset_counters()
+
+    parse_seconds = 0.0
+    started = time.perf_counter()
+    for line in log:
+        if line.startswith("touch "):
+            site.touch(line[6:])
+            continue
+        url = site.url(line)
+        parse = parser_for(line)
+        if cache:
+            cache.fetch(url, parse)
+        else:
+            response = session.get(url)
+            t = time.process_time()
+            parse(response.content)
+            parse_seconds += time.process_time() - t
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": site.requests,
+        "upstream_not_modified": site.not_modified,
+        "bytes_transferred": site.bytes_sent,
+        "parse_cpu_seconds": round(parse_seconds, 4),
+        "wall_seconds": round(elapsed, 3),
+    }
+    if cache:
+        stats = cache.snapshot()
+        result["parse_cpu_seconds"] = round(stats["parse_seconds"], 4)
+        result["parse_cpu_seconds_saved"] = round(stats["parse_seconds_saved"], 4)
+        result["bytes_saved"] = stats["bytes_saved"]
+        result["parse_skipped"] = stats["not_modified"] + stats["same_hash"]
+    return result
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="traffic log to replay, generated when omitted")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--change-rate", type=float, default=0.05)
+    parser.add_argument("--comics", type=int, default=100)
+    args = parser.parse_args()
+
+    site = Site(comics=args.comics)
+    server = serve(site)
+    try:
+        if args.log:
+            with open(args.log) as f:
+                log = [line.strip() for line in f if line.strip()]
+        else:
+            log = generate_log(site, args.requests, args.change_rate)
+
+        before = replay(site, log, cached=False)
+        after = replay(site, log, cached=True)
+    finally:
+        server.shutdown()
+
+    print(json.dumps({
+        "log_entries": len(log),
+        "uncached": before,
+        "cached": after,
+        "bytes_reduction": round(1 - after["bytes_transferred"] / max(before["bytes_transferred"], 1), 3),
+        "parse_cpu_reduction": round(1 - after["parse_cpu_seconds"] / max(before["parse_cpu_seconds"], 1e-9), 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,43 @@
+"""
+Entry point for load tests: main.app wired to the stand-ins named in the
+environment. Started by bench/load.py under each server model.
+
+    BENCH_UPSTREAM_URL  base URL of a running standin.py
+    BENCH_COMICS        size of the stand-in catalog (must match the stand-in)
+    BENCH_REDIS_URL     redis (or fakeredis TCP server) shared by all workers
+    BENCH_MONGO_URI     local mongod seeded by load.py; mongomock per worker when unset
+    BENCH_LIMITS        1 to enforce quotas and admission control (limits.py)
+"""
+import os
+
+import harness
+from standin import Site
+
+site = Site(comics=int(os.getenv("BENCH_COMICS", "200")), chapters=int(os.getenv("BENCH_CHAPTERS", "6")),
+            pages=int(os.getenv("BENCH_PAGES", "6")))
+site._base_url = os.environ["BENCH_UPSTREAM_URL"]
+
+mongo_uri = os.getenv("BENCH_MONGO_URI")
+database = harness.connect_mongo(mongo_uri, fresh=False)
+if not mongo_uri:
+    harness.seed(database, site)
+
+main = harness.load_app(site, database, harness.connect_redis(os.getenv("BENCH_REDIS_URL"), fresh=False),
+                        limits=os.getenv("BENCH_LIMITS") == "1")
+app = main.app
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+
+    asgi_app = WsgiToAsgi(app)
+except ImportError:
+    asgi_app = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the threaded development server")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    app.run(host="127.0.0.1", port=args.port, threaded=True)
@@ -0,0 +1,246 @@
+"""
+Read-only snapshot of the comics collection, shared by every worker.
+
+The snapshot is a single file that all server processes mmap, so the kernel
+keeps one copy of its pages however many workers read it. It holds one
+length-prefixed record per comic and an open-addressing hash table from a
+64-bit hash of the slug to the record's offset, so a lookup touches one or
+two index slots and the record itself:
+
+    header   magic, comic count, index slots, genre count, section offsets, build time
+    records  slug, _id, url, title, publisher, image, description,
+             image_placeholder as u32 length + UTF-8 (0xffffffff for None),
+             then u16 genre count and u16 genre ids, then u32 image width
+             and height (0 for None)
+    genres   u16 length + UTF-8 per genre id
+    index    (u64 slug hash, u64 record offset) per slot, offset 0 is empty
+
+One worker at a time (a Redis lock) rebuilds the file every
+CATALOG_REBUILD_INTERVAL seconds into a temporary file that is renamed over
+the old one; the others notice the new file and map it, while lookups in
+flight finish on the old mapping. Comics that are not in the snapshot yet
+are read from Mongo by ComicManager.get.
+
+    python catalog.py    # build the snapshot once, e.g. before starting the server
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Iterable, Optional
+
+import clients
+import metrics
+
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "/tmp/comixie-catalog.snapshot")
+CATALOG_REBUILD_INTERVAL = int(os.getenv("CATALOG_REBUILD_INTERVAL", "600"))
+CATALOG_CHECK_INTERVAL = 5
+
+MAGIC = b"CMXCAT02"
+HEADER = struct.Struct("<8sIIIQQQd")  # magic, count, slots, genres, records_at, genres_at, index_at, built_at
+SLOT = struct.Struct("<QQ")
+LENGTH = struct.Struct("<I")
+SHORT = struct.Struct("<H")
+NONE = 0xFFFFFFFF
+FIELDS = ("slug", "_id", "url", "title", "publisher", "image", "description", "image_placeholder")
+SIZE = struct.Struct("<II")
+
+
+def slug_hash(slug: str) -> int:
+    return int.from_bytes(hashlib.blake2b(slug.encode(), digest_size=8).digest(), "little")
+
+
+def write(path: str, comics: Iterable[dict]) -> int:
+    """Writes a snapshot of `comics` to `path` atomically, returns the number of comics"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    genre_ids, hashes, offsets = {}, array("Q"), array("Q")
+    try:
+        with open(temporary, "wb") as f:
+            f.write(bytes(HEADER.size))
+            records_at = position = HEADER.size
+            for comic in comics:
+                record = bytearray()
+                for name in FIELDS:
+                    value = comic.get(name)
+                    if value is None:
+                        record += LENGTH.pack(NONE)
+                    else:
+                        encoded = str(value).encode()
+                        record += LENGTH.pack(len(encoded)) + encoded
+                genres = [genre_ids.setdefault(genre, len(genre_ids)) for genre in comic.get("genres") or []]
+                record += SHORT.pack(len(genres)) + struct.pack(f"<{len(genres)}H", *genres)
+                record += SIZE.pack(comic.get("image_width") or 0, comic.get("image_height") or 0)
+                hashes.append(slug_hash(comic["slug"]))
+                offsets.append(position)
+                f.write(record)
+                position += len(record)
+
+            genres_at = position
+            for genre in genre_ids:
+                encoded = genre.encode()
+                f.write(SHORT.pack(len(encoded)) + encoded)
+                position += SHORT.size + len(encoded)
+
+            # a power of two at least twice the count keeps probe chains short
+            slots = 1 << max(len(hashes) * 2, 1).bit_length()
+            index = bytearray(slots * SLOT.size)
+            for slug_id, offset in zip(hashes, offsets):
+                slot = slug_id & (slots - 1)
+                while SLOT.unpack_from(index, slot * SLOT.size)[1]:
+                    slot = (slot + 1) & (slots - 1)
+                SLOT.pack_into(index, slot * SLOT.size, slug_id, offset)
+            f.write(index)
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, len(hashes), slots, len(genre_ids), records_at, genres_at, position,
+                                time.time()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return len(hashes)
+
+
+def build(database, path: str = CATALOG_SNAPSHOT_PATH) -> int:
+    projection = {name: 1 for name in FIELDS + ("genres", "image_width", "image_height")}
+    return write(path, database.comics.find({}, projection).batch_size(2000))
+
+
+class Snapshot:
+    """One mapped snapshot file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno()).st_ino
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.count, self.slots, genre_count, self.records_at, genres_at, self.index_at,
+         self.built_at) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+
+        self.genres = []
+        position = genres_at
+        for _ in range(genre_count):
+            (length,) = SHORT.unpack_from(self.map, position)
+            self.genres.append(self.map[position + SHORT.size:position + SHORT.size + length].decode())
+            position += SHORT.size + length
+
+    def get(self, slug: str) -> Optional[dict]:
+        slug_id = slug_hash(slug)
+        mask = self.slots - 1
+        slot = slug_id & mask
+        while True:
+            stored, offset = SLOT.unpack_from(self.map, self.index_at + slot * SLOT.size)
+            if not offset:
+                return None
+            if stored == slug_id:
+                comic = self.record(offset)
+                if comic["slug"] == slug:
+                    return comic
+            slot = (slot + 1) & mask
+
+    def record(self, offset: int) -> dict:
+        comic = {}
+        for name in FIELDS:
+            (length,) = LENGTH.unpack_from(self.map, offset)
+            offset += LENGTH.size
+            if length == NONE:
+                comic[name] = None
+            else:
+                comic[name] = self.map[offset:offset + length].decode()
+                offset += length
+        (count,) = SHORT.unpack_from(self.map, offset)
+        ids = struct.unpack_from(f"<{count}H", self.map, offset + SHORT.size)
+        comic["genres"] = [self.genres[genre_id] for genre_id in ids] if count else None
+        width, height = SIZE.unpack_from(self.map, offset + SHORT.size * (count + 1))
+        comic["image_width"], comic["image_height"] = width or None, height or None
+        return comic
+
+
+class CatalogSnapshot:
+    """
+    The current snapshot of this process. Lookups never block on a rebuild:
+    a background thread, started lazily in every process, maps new files as
+    they appear and rebuilds the file once it is `interval` seconds old.
+    """
+
+    def __init__(self, database, store, path: str = CATALOG_SNAPSHOT_PATH,
+                 interval: int = CATALOG_REBUILD_INTERVAL, enabled: bool = bool(CATALOG_SNAPSHOT_PATH)):
+        self.database = database
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self.enabled = enabled
+        self.current: Optional[Snapshot] = None
+        self._refresher = clients.PerProcess(self._start_refresher)
+
+    def get(self, slug: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        self._refresher.ensure()
+        current = self.current
+        comic = current.get(slug) if current else None
+        metrics.CATALOG_LOOKUPS.labels("hit" if comic else "miss").inc()
+        return comic
+
+    def load(self) -> bool:
+        """Maps the file at `path` if it is not the one already mapped, returns whether it changed"""
+        try:
+            identity = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+        if self.current and self.current.identity == identity:
+            return False
+        # readers holding the previous snapshot keep using it until they are done
+        self.current = Snapshot(self.path)
+        return True
+
+    def refresh(self) -> bool:
+        """Rebuilds the file if it is missing or older than `interval` and no other process is at it"""
+        try:
+            age = time.time() - os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            age = None
+        if age is not None and age < self.interval:
+            return False
+
+        lock = f"catalog:rebuild-lock:{self.path}"
+        token = f"{os.getpid()}-{threading.get_ident()}-{time.time()}"
+        if not self.store.set(lock, token, nx=True, ex=max(self.interval, 300)):
+            return False
+        try:
+            build(self.database, self.path)
+        finally:
+            if self.store.get(lock) == token.encode():
+                self.store.delete(lock)
+        return True
+
+    def _start_refresher(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"[catalog] could not map {self.path}: {e}")
+        threading.Thread(target=self._refresh_periodically, daemon=True).start()
+
+    def _refresh_periodically(self):
+        while True:
+            try:
+                self.refresh()
+                self.load()
+            except Exception as e:
+                print(f"[catalog] refresh failed: {e}")
+            time.sleep(CATALOG_CHECK_INTERVAL)
+
+
+if __name__ == "__main__":
+    import db
+
+    started = time.perf_counter()
+    count = build(db.db)
+    print(f"Wrote {count} comics to {CATALOG_SNAPSHOT_PATH} "
+          f"({os.path.getsize(CATALOG_SNAPSHOT_PATH) / 2 ** 20:.1f} MB) in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,142 @@
+"""
+Per-process Mongo, Redis and scraper clients, created on first use.
+
+Nothing here connects or even imports a driver at import time. Clients are
+built the first time they are needed in a process and forgotten in a forked
+child, so a MongoClient created in the gunicorn master under --preload is
+never shared with workers; gunicorn.conf.py creates fresh ones in post_fork.
+
+Modules keep a `Lazy` stand-in as their global (`db.db`, `db.cache`,
+`main.r`, `main.scraper`), which resolves the current process's client on
+every attribute access. Tests and benchmarks swap in doubles with
+override(). Background threads are started the same way, through
+PerProcess, so each process runs its own.
+"""
+import os
+import threading
+from typing import Callable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_lock = threading.RLock()
+_clients = {}
+_overrides = {}
+
+
+def _mongo():
+    from pymongo import MongoClient
+
+    import metrics
+
+    return MongoClient(
+        host=os.getenv("MONGO_HOST"),
+        port=int(os.getenv("MONGO_PORT", "27017")),
+        event_listeners=[metrics.MongoCommandListener()]
+    )
+
+
+def _database():
+    return get("mongo").comixie
+
+
+def _redis():
+    import redis
+
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", ""),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=0
+    )
+
+
+def _scraper():
+    import cloudscraper
+
+    return cloudscraper.create_scraper()
+
+
+FACTORIES = {
+    "mongo": _mongo,
+    "database": _database,
+    "redis": _redis,
+    "scraper": _scraper,
+}
+
+
+def get(name: str):
+    # pymongo's Database and Collection refuse to be truth-tested
+    client = _overrides[name] if name in _overrides else _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = FACTORIES[name]()
+    return client
+
+
+def override(**clients):
+    """Use the given objects instead of real clients, e.g. override(database=mongomock_db)"""
+    _overrides.update(clients)
+
+
+def reset():
+    """Forget this process's clients, the next use creates new ones"""
+    global _lock
+    _lock = threading.RLock()
+    _clients.clear()
+
+
+def init_process():
+    """Post-fork setup: drop anything inherited and create this worker's own clients"""
+    reset()
+    get("database")
+    get("redis")
+
+
+# a forked child must never use its parent's sockets or monitor threads
+os.register_at_fork(after_in_child=reset)
+
+
+class Lazy:
+    """Stands in for a per-process client, resolving it on every attribute access"""
+
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attribute):
+        return getattr(get(self._name), attribute)
+
+    def __getitem__(self, key):
+        return get(self._name)[key]
+
+    def __repr__(self):
+        return f"<lazy {self._name} client>"
+
+
+class PerProcess:
+    """
+    Calls `start` (typically starting a background thread) the first time
+    ensure() is called in each process, so every forked server process gets
+    its own threads rather than its parent's, which don't survive the fork.
+    """
+
+    def __init__(self, start: Callable[[], None]):
+        self.start = start
+        self.pid = None
+
+    @property
+    def started(self) -> bool:
+        return self.pid == os.getpid()
+
+    def ensure(self):
+        if self.started:
+            return
+        # the module lock, which a forked child gets a fresh copy of
+        with _lock:
+            if not self.started:
+                self.pid = os.getpid()
+                self.start()
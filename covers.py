@@ -0,0 +1,121 @@
+"""
+Tiny placeholders for comic covers.
+
+Listing screens show a grid of upstream covers and stay blank until they
+load. For every comic with an `image`, this fetches the cover once, records
+its width and height and shrinks it to PLACEHOLDER_SIZE pixels on the long
+side, stored as a WebP data URI of about 200 bytes that clients draw
+stretched and blurred while the real cover loads. The fields
+(image_placeholder, image_width, image_height) are stored on the comic
+through ComicManager.set_covers, so listings read them with the comic at no
+extra cost per request.
+
+A run walks the comics that have not been processed yet in _id order, in
+batches whose covers are fetched and shrunk with bounded concurrency, so
+running it again only picks up comics added since. A comic whose cover
+can't be fetched or decoded is stored without a placeholder and is not
+tried again unless asked to.
+
+    python covers.py                  # the whole catalog, e.g. after an import
+    python covers.py --interval 300   # and then new comics as they come
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+COVER_BATCH = int(os.getenv("COVER_BATCH", "200"))
+COVER_CONCURRENCY = int(os.getenv("COVER_CONCURRENCY", "8"))
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+FIELDS = ("image_placeholder", "image_width", "image_height")
+
+
+def placeholder(content: bytes, size: int = PLACEHOLDER_SIZE) -> dict:
+    """The cover's size and its placeholder as a data URI"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(content)) as image:
+        width, height = image.size
+        # JPEGs are decoded at 1/2 to 1/8 scale right away, which is most of the work saved
+        image.draft("RGB", (size * 4, size * 4))
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", quality=PLACEHOLDER_QUALITY, method=6)
+    return {
+        "image_placeholder": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode(),
+        "image_width": width,
+        "image_height": height,
+    }
+
+
+class CoverPipeline:
+    def __init__(self, comics, fetch: Callable[[str], bytes], batch_size: int = COVER_BATCH,
+                 concurrency: int = COVER_CONCURRENCY):
+        self.comics = comics
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def cover(self, comic: dict) -> dict:
+        try:
+            return placeholder(self.fetch(comic["image"]))
+        except Exception as e:
+            print(f"[covers] {comic['slug']}: {e}")
+            return dict.fromkeys(FIELDS)
+
+    def run(self, retry_failed: bool = False, limit: Optional[int] = None) -> dict:
+        started = time.perf_counter()
+        processed = failed = 0
+        after = None
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            while limit is None or processed < limit:
+                size = self.batch_size if limit is None else min(self.batch_size, limit - processed)
+                batch = self.comics.without_covers(size, after=after, retry_failed=retry_failed)
+                if not batch:
+                    break
+                covers = dict(zip((comic["slug"] for comic in batch), pool.map(self.cover, batch)))
+                self.comics.set_covers(covers)
+                processed += len(batch)
+                failed += sum(1 for fields in covers.values() if fields["image_placeholder"] is None)
+                after = batch[-1]["_id"]
+        seconds = time.perf_counter() - started
+        return {
+            "processed": processed,
+            "failed": failed,
+            "seconds": round(seconds, 2),
+            "per_second": round(processed / seconds, 1) if seconds else None,
+        }
+
+
+if __name__ == "__main__":
+    import clients
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=float, default=0, help="seconds between runs, 0 runs once")
+    parser.add_argument("--batch", type=int, default=COVER_BATCH)
+    parser.add_argument("--concurrency", type=int, default=COVER_CONCURRENCY)
+    parser.add_argument("--retry-failed", action="store_true", help="try covers that failed before again")
+    args = parser.parse_args()
+
+    def fetch(url: str) -> bytes:
+        response = clients.get("scraper").get(url, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    db.comics.ensure_indexes()
+    pipeline = CoverPipeline(db.comics, fetch, args.batch, args.concurrency)
+    retry_failed = args.retry_failed
+    while True:
+        print(json.dumps(pipeline.run(retry_failed=retry_failed)))
+        retry_failed = False
+        if not args.interval:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,248 @@
+"""
+Crawls the upstream catalog into Mongo.
+
+Walks the listing pages (/page/N/) to discover comics, fetches their
+category pages with bounded concurrency under a global rate limit and
+upserts comics and chapters in bulk. Progress is checkpointed to a state
+file after every bulk write, so a killed run picks up where it stopped.
+
+    python crawler.py --concurrency 8 --rate 4
+    python crawler.py --max-listing-pages 50 --state /var/lib/comixie/crawl.json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+import extract
+import genre_stats
+
+UPSTREAM_URL = (os.getenv("UPSTREAM_URL") or "https://readallcomics.com").rstrip("/")
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CrawlState:
+    def __init__(self, path: str):
+        self.path = path
+        self.listing_page = 0
+        self.listing_total = 0
+        self.pending = {}
+        self.done = set()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.listing_page = data["listing_page"]
+            self.listing_total = data["listing_total"]
+            self.pending = dict.fromkeys(data["pending"])
+            self.done = set(data["done"])
+
+    def save(self):
+        data = {
+            "listing_page": self.listing_page,
+            "listing_total": self.listing_total,
+            "pending": list(self.pending),
+            "done": sorted(self.done),
+        }
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class Crawler:
+    def __init__(self, session, database, state: CrawlState, base_url: str = UPSTREAM_URL,
+                 concurrency: int = 4, rate: float = 2.0, batch_size: int = 50,
+                 max_listing_pages: Optional[int] = None, stop_after: Optional[int] = None):
+        self.session = session
+        self.database = database
+        self.state = state
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.batch_size = batch_size
+        self.max_listing_pages = max_listing_pages
+        self.stop_after = stop_after
+
+        self.pages_fetched = 0
+        self._fetched_lock = threading.Lock()
+        self.comics_upserted = 0
+        self.chapters_upserted = 0
+        self.failed = []
+        self._queued = set(state.pending) | state.done
+        self._queue = deque(state.pending)
+        self._batch = []
+
+    def get(self, url: str) -> bytes:
+        self.limiter.acquire()
+        response = self.session.get(url, timeout=30)
+        with self._fetched_lock:
+            self.pages_fetched += 1
+        response.raise_for_status()
+        return response.content
+
+    def discover(self):
+        """Yields listing pages not yet walked, queueing the comics found on them"""
+        if not self.state.listing_total:
+            self.state.listing_total = extract.page_count(self.get(f"{self.base_url}/"))
+        last = self.state.listing_total
+        if self.max_listing_pages:
+            last = min(last, self.max_listing_pages)
+
+        while self.state.listing_page < last:
+            page = self.state.listing_page + 1
+            for entry in extract.home(self.get(f"{self.base_url}/page/{page}/")):
+                slug = entry["comic_slug"]
+                if slug and slug not in self._queued:
+                    self._queued.add(slug)
+                    self._queue.append(slug)
+                    self.state.pending[slug] = None
+            self.state.listing_page = page
+            yield page
+
+    def fetch_comic(self, slug: str):
+        url = f"{self.base_url}/category/{slug}/"
+        return slug, url, extract.category(self.get(url))
+
+    def add(self, slug: str, url: str, details: dict):
+        self._batch.append((slug, url, details))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            comics, chapters = [], []
+            for slug, url, details in self._batch:
+                comics.append(UpdateOne({"slug": slug}, {"$set": {
+                    "slug": slug,
+                    "url": url,
+                    "title": details["title"],
+                    "genres": details["genres"],
+                    "publisher": details["publisher"],
+                    "description": details["description"],
+                    "image": details["image"],
+                }}, upsert=True))
+
+                # the category page lists newest first, index counts from the first issue
+                listed = details["chapters"]
+                for position, chapter in enumerate(listed):
+                    chapters.append(UpdateOne({"slug": chapter["slug"]}, {"$set": {
+                        "comic_slug": slug,
+                        "name": chapter["name"],
+                        "url": chapter["url"],
+                        "index": len(listed) - 1 - position,
+                    }}, upsert=True))
+
+            self.database.comics.bulk_write(comics, ordered=False)
+            if chapters:
+                self.database.chapters.bulk_write(chapters, ordered=False)
+            self.comics_upserted += len(comics)
+            self.chapters_upserted += len(chapters)
+
+            for slug, _, _ in self._batch:
+                self.state.done.add(slug)
+                self.state.pending.pop(slug, None)
+            self._batch = []
+        self.state.save()
+
+    def run(self):
+        self.database.comics.create_index("slug")
+        self.database.chapters.create_index("slug")
+        self.database.chapters.create_index("comic_slug")
+        self.database.chapters.create_index([("comic_slug", ASCENDING), ("index", DESCENDING)])
+
+        started = time.perf_counter()
+        listing = self.discover()
+        in_flight = {}
+        processed = 0
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            while True:
+                # keep the pool busy, walking more listing pages when the queue runs dry
+                while not self._queue and len(in_flight) < self.concurrency:
+                    if next(listing, None) is None:
+                        break
+
+                while self._queue and len(in_flight) < self.concurrency * 2:
+                    slug = self._queue.popleft()
+                    in_flight[pool.submit(self.fetch_comic, slug)] = slug
+
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    slug = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.failed.append(slug)
+                        print(f"[FAILED] {slug}: {e}")
+                    else:
+                        self.add(*result)
+                    processed += 1
+                    if self.stop_after and processed >= self.stop_after:
+                        raise KeyboardInterrupt(f"stopped after {processed} comics")
+
+        self.flush()
+        genre_stats.rebuild(self.database)
+        elapsed = time.perf_counter() - started
+        return {
+            "listing_pages": self.state.listing_page,
+            "pages_fetched": self.pages_fetched,
+            "comics_upserted": self.comics_upserted,
+            "chapters_upserted": self.chapters_upserted,
+            "failed": len(self.failed),
+            "seconds": round(elapsed, 2),
+            "pages_per_second": round(self.pages_fetched / elapsed, 2) if elapsed else 0,
+        }
+
+
+if __name__ == "__main__":
+    import cloudscraper
+
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="upstream requests per second")
+    parser.add_argument("--batch-size", type=int, default=50, help="comics per bulk write and checkpoint")
+    parser.add_argument("--max-listing-pages", type=int)
+    parser.add_argument("--state", default="crawl-state.json", help="checkpoint file")
+    parser.add_argument("--reset", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.state):
+        os.remove(args.state)
+
+    crawler = Crawler(cloudscraper.create_scraper(), db.db, CrawlState(args.state),
+                      concurrency=args.concurrency, rate=args.rate, batch_size=args.batch_size,
+                      max_listing_pages=args.max_listing_pages)
+    try:
+        print(json.dumps(crawler.run(), indent=2))
+    except KeyboardInterrupt:
+        crawler.state.save()
+        print(f"Interrupted, progress saved to {args.state}")
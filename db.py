@@ -1,18 +1,28 @@
+import atexit
+import json
 import os
+import threading
+import time
 from dataclasses import asdict, dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from bson import ObjectId
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import ASCENDING, DeleteOne, UpdateOne
+
+import catalog
+import clients
+import covers
+import genre_stats
 
 load_dotenv()
 
-client = MongoClient(
-    host=os.getenv("MONGO_HOST"),
-    port=int(os.getenv("MONGO_PORT", "27017"))
-)
-db = client.comixie
+# resolved per process on first use, see clients.py
+db = clients.Lazy("database")
+cache = clients.Lazy("redis")
+
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "5"))
+PROGRESS_TTL = 30 * 24 * 3600  # idle users' hashes fall back to Mongo after a month
 
 @dataclass
 class Comic:
@@ -24,6 +34,10 @@ class Comic:
     publisher: Optional[str] = None
     description: Optional[str] = None
     image: Optional[str] = None
+    # filled in by covers.py
+    image_placeholder: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
 
 
 @dataclass
@@ -34,6 +48,26 @@ class Chapter:
     url: str
     _id: Optional[str|ObjectId] = None
     images: Optional[List] = None
+    index: Optional[int] = None
+
+
+@dataclass
+class Progress:
+    user: str
+    comic_slug: str
+    chapter_slug: str
+    page: int = 0
+    updated_at: Optional[float] = None
+
+
+@dataclass
+class Bookmark:
+    user: str
+    chapter_slug: str
+    page: int
+    comic_slug: Optional[str] = None
+    note: Optional[str] = None
+    created_at: Optional[float] = None
 
 
 class ComicManager:
@@ -41,7 +75,7 @@ class ComicManager:
         pass
 
     def get(self, slug: str) -> Optional[Comic]:
-        item = db.comics.find_one({"slug": slug})
+        item = catalog_snapshot.get(slug) or db.comics.find_one({"slug": slug})
         if item:
             item = Comic(**item)
             item._id = str(item._id)
@@ -51,9 +85,41 @@ class ComicManager:
     def create(self, comic: Comic):
         data = asdict(comic)
         data.pop("_id")
+        # covers.py looks for comics without these
+        for name in covers.FIELDS:
+            if data[name] is None:
+                data.pop(name)
         item = db.comics.insert_one(data)
+        genre_stats.add(db, comic.genres, comic.image)
         return item
 
+    def covers(self, slugs: List[str]) -> Dict[str, dict]:
+        """Cover image, placeholder and size by comic slug, for the comics of a listing"""
+        projection = {"_id": 0, "slug": 1, "image": 1, **{name: 1 for name in covers.FIELDS}}
+        return {item["slug"]: item for item in db.comics.find({"slug": {"$in": slugs}}, projection)}
+
+    def without_covers(self, limit: int, after=None, retry_failed: bool = False) -> List[dict]:
+        """The next `limit` comics after the `_id` `after` that have an image but no placeholder yet"""
+        query = {"image": {"$nin": [None, ""]}}
+        if retry_failed:
+            query["image_placeholder"] = None
+        else:
+            query["image_width"] = {"$exists": False}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        return list(db.comics.find(query, {"slug": 1, "image": 1}).sort("_id", ASCENDING).limit(limit))
+
+    def set_covers(self, items: Dict[str, dict]):
+        """Stores placeholders and sizes from covers.placeholder() by comic slug"""
+        if items:
+            db.comics.bulk_write([UpdateOne({"slug": slug}, {"$set": fields}) for slug, fields in items.items()],
+                                 ordered=False)
+
+    def ensure_indexes(self):
+        db.comics.create_index("slug")
+        # comics that were never processed have no image_width at all
+        db.comics.create_index([("image_width", ASCENDING), ("_id", ASCENDING)])
+
 
 class ChapterManager:
     def __init__(self):
@@ -67,16 +133,204 @@ class ChapterManager:
             return item
         return None
 
+    def next(self, chapter: Chapter) -> Optional[Chapter]:
+        """The chapter after `chapter` in reading order, None when its order isn't known"""
+        # chapters are inserted newest first, only `index` says which one comes next
+        if chapter.index is None:
+            return None
+        item = db.chapters.find_one({"comic_slug": chapter.comic_slug, "index": chapter.index + 1})
+        if item:
+            item = Chapter(**item)
+            item._id = str(item._id)
+            return item
+        return None
+
+    def list(self, comic_slug: str) -> List[Chapter]:
+        """All chapters of a comic in reading order by index, any without one last"""
+        items = []
+        sort = [("index", ASCENDING), ("_id", ASCENDING)]
+        for item in db.chapters.find({"comic_slug": comic_slug}).sort(sort):
+            item = Chapter(**item)
+            item._id = str(item._id)
+            items.append(item)
+        return sorted(items, key=lambda chapter: (chapter.index is None, chapter.index or 0))
+
     def create(self, chapter: Chapter):
         data = asdict(chapter)
         data.pop("_id")
         item = db.chapters.insert_one(data)
         return item
 
-    def update(self, slug: str, images: list):
-        db.chapters.update_one({'slug': slug}, {'$set': {'images': images}})
-        return True
+    def update(self, slug: str, images: list) -> Optional[str]:
+        """Stores the chapter's images, returns its comic's slug or None if there is no such chapter"""
+        item = db.chapters.find_one_and_update({'slug': slug}, {'$set': {'images': images}},
+                                               projection={'comic_slug': 1})
+        return item and item.get('comic_slug')
+
+class WriteBehindManager:
+    """
+    Per-user documents written to Redis and flushed to Mongo in batches.
+
+    Every user has a Redis hash of `field -> JSON document`; writes overwrite
+    the field and add it to a dirty set, so repeated updates to the same
+    document coalesce into one Mongo write. flush() moves the dirty set aside
+    in one transaction, upserts the latest values with bulk_write and only
+    then forgets them, so a crash mid-flush leaves the work for the next one.
+    Reads merge the user's Mongo documents into the hash on first access.
+    """
+    name = ""
+    key_fields = ()
+
+    def __init__(self):
+        self.flusher = clients.PerProcess(self._start_flusher)
 
+    def key(self, user: str) -> str:
+        return f"{self.name}:{user}"
+
+    def field(self, data: dict) -> str:
+        return "/".join(str(data[name]) for name in self.key_fields)
+
+    def _write(self, user: str, data: dict):
+        field = self.field(data)
+        pipe = cache.pipeline()
+        pipe.hset(self.key(user), field, json.dumps(data))
+        pipe.expire(self.key(user), PROGRESS_TTL)
+        pipe.sadd(f"{self.name}:dirty", json.dumps([user, field]))
+        pipe.execute()
+        self.flusher.ensure()
+
+    def _read(self, user: str) -> List[dict]:
+        key = self.key(user)
+        if not cache.hexists(key, "_loaded"):
+            pipe = cache.pipeline()
+            for item in db[self.name].find({"user": user}, {"_id": 0}):
+                # anything already in Redis is newer than what was flushed
+                pipe.hsetnx(key, self.field(item), json.dumps(item))
+            pipe.hset(key, "_loaded", 1)
+            pipe.expire(key, PROGRESS_TTL)
+            pipe.execute()
+        return [item for item in (json.loads(value) for field, value in cache.hgetall(key).items()
+                                  if field != b"_loaded")
+                if not item.get("deleted")]
+
+    def flush(self, batch_size: int = 500, wait: bool = False) -> int:
+        """
+        Write every dirty document to Mongo, returns how many were written.
+        Only one flush runs at a time; with `wait` this waits for a running
+        one to finish instead of leaving the work to it.
+        """
+        dirty, flushing, lock = f"{self.name}:dirty", f"{self.name}:flushing", f"{self.name}:flush-lock"
+        token = f"{os.getpid()}-{threading.get_ident()}-{time.time()}"
+        deadline = time.monotonic() + 60
+        while not cache.set(lock, token, nx=True, ex=60):
+            if not wait or time.monotonic() > deadline:
+                return 0
+            time.sleep(0.05)
+        written = 0
+        try:
+            # leftovers of a flush that died are picked up together with the new entries
+            pipe = cache.pipeline()
+            pipe.sunionstore(flushing, [flushing, dirty])
+            pipe.delete(dirty)
+            pipe.execute()
+
+            while True:
+                members = cache.srandmember(flushing, batch_size)
+                if not members:
+                    break
+                entries = [json.loads(member) for member in members]
+                pipe = cache.pipeline()
+                for user, field in entries:
+                    pipe.hget(self.key(user), field)
+                values = pipe.execute()
+
+                operations = []
+                for (user, _), value in zip(entries, values):
+                    if value is None:  # expired from Redis, nothing newer to write
+                        continue
+                    data = json.loads(value)
+                    query = {"user": user, **{name: data[name] for name in self.key_fields}}
+                    if data.get("deleted"):
+                        operations.append(DeleteOne(query))
+                    else:
+                        operations.append(UpdateOne(query, {"$set": data}, upsert=True))
+                if operations:
+                    db[self.name].bulk_write(operations, ordered=False)
+                cache.srem(flushing, *members)
+                written += len(operations)
+                cache.expire(lock, 60)
+        finally:
+            if cache.get(lock) == token.encode():
+                cache.delete(lock)
+        return written
+
+    def _start_flusher(self):
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(PROGRESS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[{self.name}] flush failed: {e}")
+
+    def ensure_indexes(self):
+        db[self.name].create_index([("user", ASCENDING)] + [(name, ASCENDING) for name in self.key_fields],
+                                   unique=True)
+
+
+class ProgressManager(WriteBehindManager):
+    name = "reading_progress"
+    key_fields = ("comic_slug",)
+
+    def set(self, progress: Progress) -> Progress:
+        progress.updated_at = progress.updated_at or time.time()
+        self._write(progress.user, asdict(progress))
+        return progress
+
+    def get(self, user: str, comic_slug: str) -> Optional[Progress]:
+        for item in self._read(user):
+            if item["comic_slug"] == comic_slug:
+                return Progress(**item)
+        return None
+
+    def history(self, user: str) -> List[Progress]:
+        items = sorted(self._read(user), key=lambda item: item["updated_at"] or 0, reverse=True)
+        return [Progress(**item) for item in items]
+
+
+class BookmarkManager(WriteBehindManager):
+    name = "bookmarks"
+    key_fields = ("chapter_slug", "page")
+
+    def add(self, bookmark: Bookmark) -> Bookmark:
+        bookmark.created_at = bookmark.created_at or time.time()
+        self._write(bookmark.user, asdict(bookmark))
+        return bookmark
+
+    def remove(self, user: str, chapter_slug: str, page: int):
+        self._write(user, {"user": user, "chapter_slug": chapter_slug, "page": page, "deleted": True})
+
+    def list(self, user: str) -> List[Bookmark]:
+        items = sorted(self._read(user), key=lambda item: item["created_at"] or 0)
+        return [Bookmark(**item) for item in items]
+
+
+def flush_all():
+    for manager in (progress, bookmarks):
+        if not manager.flusher.started:  # nothing written from this process
+            continue
+        try:
+            manager.flush(wait=True)
+        except Exception as e:
+            print(f"[{manager.name}] flush on shutdown failed, left in Redis: {e}")
+
+
+catalog_snapshot = catalog.CatalogSnapshot(db, cache)
 comics = ComicManager()
 chapters = ChapterManager()
-genres = db.genres
+progress = ProgressManager()
+bookmarks = BookmarkManager()
+
+atexit.register(flush_all)
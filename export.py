@@ -0,0 +1,245 @@
+"""
+Export of a range of chapters as one streamed CBZ or PDF.
+
+Pages are fetched by a small thread pool in reading order. Fetching runs at
+most EXPORT_WINDOW pages ahead of what has been written, and every page goes
+out to the client as soon as it is next in line, so memory holds a window of
+images however long the export is. Image lists of chapters that were never
+read are scraped through the same pool, a few chapters ahead.
+
+A CBZ is a ZIP of the original page bytes, stored without compression. The
+PDF embeds JPEG pages as they are and converts only other formats, on the
+200x300 layout of /api/export-pdf. Neither needs to seek, so both are written
+straight into the response.
+"""
+import io
+import itertools
+import os
+import re
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import metrics
+from db import Chapter
+from profiling import span
+
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+EXPORT_WINDOW = int(os.getenv("EXPORT_WINDOW", "16"))
+EXPORT_MAX_CHAPTERS = int(os.getenv("EXPORT_MAX_CHAPTERS", "100"))
+
+PAGE_SIZE = (200, 300)
+
+SIGNATURES = ((b"\xff\xd8\xff", ".jpg"), (b"\x89PNG", ".png"), (b"GIF8", ".gif"), (b"RIFF", ".webp"))
+
+
+@dataclass
+class Page:
+    chapter: Chapter
+    chapter_number: int
+    number: int
+    url: str
+    content: Optional[bytes] = None
+
+    @property
+    def name(self) -> str:
+        folder = re.sub(r'[\\/:*?"<>|]+', " ", self.chapter.name).strip() or self.chapter.slug
+        return f"{self.chapter_number:03d} {folder}/{self.number:03d}{extension(self.url, self.content)}"
+
+
+def extension(url: str, content: Optional[bytes]) -> str:
+    for signature, suffix in SIGNATURES:
+        if content and content.startswith(signature):
+            return suffix
+    suffix = os.path.splitext(url.split("?")[0])[1].lower()
+    return suffix if suffix in (".jpg", ".jpeg", ".png", ".gif", ".webp") else ".jpg"
+
+
+def fetch_pages(chapters: List[Chapter], resolve: Callable[[str], list], fetch: Callable[[str], bytes],
+                start: int = 1, concurrency: int = EXPORT_CONCURRENCY,
+                window: int = EXPORT_WINDOW) -> Iterator[Page]:
+    """
+    Yields every page of `chapters` in order with its content, or without it
+    when fetching failed. Chapters without images are resolved with
+    `resolve(slug)` and skipped when that fails.
+    """
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="export")
+    listings, in_flight = deque(), deque()
+
+    def images(chapter):
+        return chapter.images or resolve(chapter.slug) or []
+
+    try:
+        ahead = enumerate(chapters, start)
+        for number, chapter in itertools.islice(ahead, concurrency):
+            listings.append((number, chapter, pool.submit(images, chapter)))
+
+        while listings:
+            number, chapter, listing = listings.popleft()
+            # keep resolving a few chapters ahead while the pages of this one download
+            following = next(ahead, None)
+            if following:
+                listings.append((*following, pool.submit(images, following[1])))
+
+            try:
+                urls = listing.result()
+            except Exception:
+                urls = []
+            for page_number, url in enumerate(urls, 1):
+                in_flight.append((Page(chapter, number, page_number, url), pool.submit(fetch, url)))
+                if len(in_flight) >= window:
+                    yield _finished(*in_flight.popleft())
+
+        while in_flight:
+            yield _finished(*in_flight.popleft())
+    finally:
+        # the client went away or the export is done, drop whatever is still queued
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _finished(page: Page, future) -> Page:
+    try:
+        page.content = future.result()
+    except Exception:
+        page.content = None
+    return page
+
+
+class _Sink:
+    """Write-only file that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        if data:
+            metrics.EXPORT_BYTES.inc(len(data))
+        return data
+
+
+def cbz(pages: Iterable[Page]) -> Iterator[bytes]:
+    sink = _Sink()
+    date_time = time.localtime()[:6]
+    # an unseekable file makes zipfile write sizes after each entry, nothing is rewritten
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for page in pages:
+            if page.content is None:
+                continue
+            archive.writestr(zipfile.ZipInfo(page.name, date_time), page.content)
+            metrics.EXPORT_PAGES.inc()
+            yield sink.drain()
+    yield sink.drain()
+
+
+class PdfWriter:
+    """
+    Writes a PDF one page at a time. Objects are emitted as soon as a page is
+    added; only their offsets are kept for the cross-reference table.
+    """
+
+    def __init__(self, page_size=PAGE_SIZE):
+        self.width, self.height = page_size
+        self.offsets = {}
+        self.position = 0
+        self.kids = []
+        self._next = 3  # 1 is the catalog, 2 the page tree, both written last
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def page(self, content: bytes) -> bytes:
+        from PIL import Image
+
+        with span("image"):
+            img = Image.open(io.BytesIO(content))
+            width, height = img.size
+            if img.format == "JPEG" and img.mode in ("RGB", "L"):
+                data, color_space = content, "/DeviceRGB" if img.mode == "RGB" else "/DeviceGray"
+            else:
+                buffer = io.BytesIO()
+                img.convert("RGB").save(buffer, format="JPEG", quality=90)
+                data, color_space = buffer.getvalue(), "/DeviceRGB"
+
+        aspect_ratio = width / height
+        if aspect_ratio > self.width / self.height:
+            new_width, new_height = self.width, self.width / aspect_ratio
+        else:
+            new_width, new_height = self.height * aspect_ratio, self.height
+        x_offset, y_offset = (self.width - new_width) / 2, (self.height - new_height) / 2
+
+        with span("pdf"):
+            image, contents, page = self._reserve(3)
+            drawing = f"q {new_width:.2f} 0 0 {new_height:.2f} {x_offset:.2f} {y_offset:.2f} cm /Im0 Do Q".encode()
+            self.kids.append(page)
+            return b"".join([
+                self._object(image, f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                                    f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode "
+                                    f"/Length {len(data)} >>".encode(), data),
+                self._object(contents, f"<< /Length {len(drawing)} >>".encode(), drawing),
+                self._object(page, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.width} {self.height}] "
+                                   f"/Resources << /XObject << /Im0 {image} 0 R >> >> "
+                                   f"/Contents {contents} 0 R >>".encode()),
+            ])
+
+    def close(self) -> bytes:
+        kids = " ".join(f"{number} 0 R" for number in self.kids)
+        tail = [
+            self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.kids)} >>".encode()),
+            self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        ]
+        xref_at = self.position
+        entries = "".join(f"{self.offsets[number]:010d} 00000 n \n" for number in range(1, self._next))
+        tail.append(self._emit(
+            f"xref\n0 {self._next}\n0000000000 65535 f \n{entries}"
+            f"trailer\n<< /Size {self._next} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+        ))
+        return b"".join(tail)
+
+    def _reserve(self, count: int) -> range:
+        numbers = range(self._next, self._next + count)
+        self._next += count
+        return numbers
+
+    def _object(self, number: int, dictionary: bytes, stream: Optional[bytes] = None) -> bytes:
+        self.offsets[number] = self.position
+        if stream is None:
+            return self._emit(b"%d 0 obj\n%s\nendobj\n" % (number, dictionary))
+        return self._emit(b"%d 0 obj\n%s\nstream\n" % (number, dictionary) + stream + b"\nendstream\nendobj\n")
+
+    def _emit(self, data: bytes) -> bytes:
+        self.position += len(data)
+        return data
+
+
+def pdf(pages: Iterable[Page]) -> Iterator[bytes]:
+    writer = PdfWriter()
+    yield writer.header()
+    for page in pages:
+        if page.content is None:
+            continue
+        try:
+            data = writer.page(page.content)
+        except Exception:
+            continue
+        metrics.EXPORT_PAGES.inc()
+        yield data
+    yield writer.close()
+    metrics.EXPORT_BYTES.inc(writer.position)
+
+
+FORMATS = {
+    "cbz": (cbz, "application/vnd.comicbook+zip"),
+    "pdf": (pdf, "application/pdf"),
+}
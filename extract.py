@@ -0,0 +1,160 @@
+"""
+Pure extraction functions for readallcomics pages.
+
+Each function takes the raw response body and returns plain, JSON-ready
+data. Parsing is done with lxml and precompiled XPath expressions that only
+visit the parts of the document we need.
+"""
+import re
+from typing import List
+
+from lxml import etree, html
+
+PARSER = html.HTMLParser(encoding="utf-8")
+
+HAS_CLASS = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+
+SEARCH_LINK = re.compile(r'<a href="([^"]*)"[^>]*>([^<]*)</a>')
+DESCRIPTION = re.compile(r'</span><br/>(.*?)<br/>', re.DOTALL)
+CATEGORY_CLASS = re.compile(r'(?:^|\s)category-(\S+)')
+
+# `center p img`: libxml2 closes a <p> where a <div> or <table> starts and leaves it empty
+# in front of that block (`<p><div class="separator"><img>`), html.parser kept it inside
+IN_PARAGRAPH = "ancestor::p or ancestor::*[ancestor::center][preceding-sibling::*[1][self::p][not(node())]]"
+
+HOME_POSTS = etree.XPath("//div[starts-with(@id, 'post-') and contains(@class, 'post-')]")
+POST_LINK = etree.XPath("(.//a)[1]")
+POST_IMAGE = etree.XPath("(.//img)[1]")
+POST_NAME = etree.XPath(f"(.//a[{HAS_CLASS.format('front-link')}])[1]")
+POST_DATE = etree.XPath("(.//center//span)[1]")
+PAGE_NUMBERS = etree.XPath(f"//a[{HAS_CLASS.format('page-numbers')}]")
+
+COMIC_TITLE = etree.XPath("(//center//div//h1//b)[1]")
+COMIC_IMAGE = etree.XPath(f"(//center//img[{IN_PARAGRAPH}])[1]")
+COMIC_INFO = etree.XPath("(//center//div//div//p)[1]")
+COMIC_DESCRIPTION = etree.XPath(f"(//div[{HAS_CLASS.format('b')}])[1]")
+CHAPTER_LIST = etree.XPath(f"(//*[{HAS_CLASS.format('list-story')}])[1]")
+NEXT_STRONG = etree.XPath("(descendant::strong | following::strong)[1]")
+
+CHAPTER_IMAGES = etree.XPath(f"//center//img[{IN_PARAGRAPH}]")
+
+
+def slug_from_url(url: str) -> str:
+    return url.split('/')[-2] if url.endswith('/') else url.split('/')[-1]
+
+
+def parse(content: bytes):
+    if not content or not content.strip():
+        return None
+    return html.document_fromstring(content, parser=PARSER)
+
+
+def first(elements: list):
+    return elements[0] if elements else None
+
+
+def search(content: bytes) -> List[dict]:
+    html_content = content.decode("utf-8", "replace").strip('"').replace("\\", "")
+
+    results = []
+    for url, title in SEARCH_LINK.findall(html_content):
+        if "/category" in url:
+            results.append({
+                'title': title.strip(),
+                'url': url,
+                'slug': slug_from_url(url)
+            })
+    return results
+
+
+def home(content: bytes) -> List[dict]:
+    document = parse(content)
+    if document is None:
+        return []
+
+    comics = []
+    for post in HOME_POSTS(document):
+        link, image, date = first(POST_LINK(post)), first(POST_IMAGE(post)), first(POST_DATE(post))
+        if link is None or image is None or date is None or not link.get("href"):
+            continue
+        name = first(POST_NAME(post))
+        comic_url = link.get("href")
+        category = CATEGORY_CLASS.search(post.get("class", ""))
+
+        comics.append({
+            'url': comic_url,
+            'slug': slug_from_url(comic_url),
+            'comic_slug': category.group(1) if category else None,
+            'image': image.get("src"),
+            'name': name.text_content() if name is not None else '',
+            'date': date.text_content()
+        })
+    return comics
+
+
+def page_count(content: bytes) -> int:
+    document = parse(content)
+    if document is None:
+        return 0
+    numbers = [int(a.text_content()) for a in PAGE_NUMBERS(document) if a.text_content().strip().isdigit()]
+    return max(numbers, default=1)
+
+
+def category(content: bytes) -> dict:
+    details = {
+        "title": None,
+        "genres": None,
+        "publisher": None,
+        "description": None,
+        "image": None,
+        "chapters": []
+    }
+    document = parse(content)
+    if document is None:
+        return details
+
+    title = first(COMIC_TITLE(document))
+    if title is not None:
+        details["title"] = title.text_content()
+
+    image = first(COMIC_IMAGE(document))
+    if image is not None:
+        details["image"] = image.get("src")
+
+    info = first(COMIC_INFO(document))
+    if info is not None:
+        genres = first(NEXT_STRONG(info))
+        if genres is not None:
+            details["genres"] = genres.text_content().split(", ")
+            publisher = first(NEXT_STRONG(genres))
+            if publisher is not None:
+                details["publisher"] = publisher.text_content()
+
+    description = first(COMIC_DESCRIPTION(document))
+    if description is not None:
+        markup = etree.tostring(description, encoding="unicode", method="xml", with_tail=False)
+        match = DESCRIPTION.search(markup)
+        if match:
+            details["description"] = match.group(1).strip()
+
+    chapter_list = first(CHAPTER_LIST(document))
+    if chapter_list is not None:
+        for link in chapter_list.iter("a"):
+            chapter_url = link.get("href")
+            if not chapter_url:
+                continue
+            details["chapters"].append({
+                "url": chapter_url,
+                "name": "".join(text.strip() for text in link.itertext()),
+                "slug": slug_from_url(chapter_url)
+            })
+
+    return details
+
+
+def chapter(content: bytes) -> List[str]:
+    document = parse(content)
+    if document is None:
+        return []
+    return [src for src in (img.get("src") for img in CHAPTER_IMAGES(document)) if src]
+
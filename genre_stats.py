@@ -0,0 +1,119 @@
+"""
+Materialized per-genre statistics.
+
+`genre_stats` holds one document per genre with the number of comics in it
+and a few sample covers. It is rebuilt with a single aggregation over
+comics.genres after bulk imports and kept current by ComicManager.create.
+A marker in `counters` records that it was built; until then new comics
+are not counted, and the first /api/genres builds it from the catalog.
+/api/genres is served from GenreCatalog, an in-process copy of the
+serialized responses and their ETags that is refreshed every CATALOG_TTL
+seconds, so a request costs a dictionary lookup whatever the catalog size.
+It keeps answering with the names of the NAMES_LIMIT most popular genres,
+and with every genre's count and sample covers given `?stats=1`.
+
+    python genre_stats.py    # rebuild from the comics collection
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from pymongo import DESCENDING, UpdateOne
+
+SAMPLE_COVERS = 4
+CATALOG_TTL = int(os.getenv("GENRE_CATALOG_TTL", "60"))
+NAMES_LIMIT = 20
+BUILT_MARKER = "genre_stats"
+
+
+def pipeline() -> List[dict]:
+    return [
+        {"$match": {"genres.0": {"$exists": True}}},
+        # a genre listed twice on one comic still counts that comic once
+        {"$project": {"image": 1, "genres": {"$setUnion": ["$genres", []]}}},
+        {"$unwind": "$genres"},
+        {"$group": {"_id": "$genres", "count": {"$sum": 1}, "covers": {"$push": "$image"}}},
+        {"$project": {"count": 1, "covers": {"$slice": [
+            {"$filter": {"input": "$covers", "cond": {"$ne": ["$$this", None]}}}, SAMPLE_COVERS
+        ]}}},
+        # $out swaps the collection in atomically once the aggregation finished
+        {"$out": "genre_stats"},
+    ]
+
+
+def rebuild(database):
+    database.comics.aggregate(pipeline(), allowDiskUse=True)
+    database.counters.update_one({"_id": BUILT_MARKER}, {"$set": {"built_at": time.time()}}, upsert=True)
+
+
+def built(database) -> bool:
+    return database.counters.find_one({"_id": BUILT_MARKER}, {"_id": 1}) is not None
+
+
+def add(database, genres: Optional[List[str]], image: Optional[str]):
+    """Count a newly inserted comic in each of its genres"""
+    # partial counts would pass for the whole catalog, the first rebuild counts this comic too
+    if not genres or not built(database):
+        return
+    database.genre_stats.bulk_write([
+        UpdateOne({"_id": genre}, {
+            "$inc": {"count": 1},
+            "$push": {"covers": {"$each": [image] if image else [], "$slice": SAMPLE_COVERS}},
+        }, upsert=True)
+        for genre in dict.fromkeys(genres)
+    ], ordered=False)
+
+
+def serialize(data) -> tuple:
+    body = json.dumps(data).encode()
+    return body, hashlib.sha1(body).hexdigest()
+
+
+class GenreCatalog:
+    """The serialized /api/genres responses and their ETags, reloaded after `ttl` seconds"""
+
+    def __init__(self, database, ttl: int = CATALOG_TTL):
+        self.database = database
+        self.ttl = ttl
+        self.names = self.stats = (b"", "")
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, stats: bool = False):
+        """The body and ETag of the genre names, or of every genre's stats"""
+        if time.monotonic() >= self._expires:
+            # one request reloads, the others keep serving the previous copy
+            if self._lock.acquire(blocking=not self.names[0]):
+                try:
+                    if time.monotonic() >= self._expires:
+                        self.load()
+                finally:
+                    self._lock.release()
+        return self.stats if stats else self.names
+
+    def load(self):
+        if not built(self.database):
+            rebuild(self.database)
+        stats = list(self.database.genre_stats.find().sort([("count", DESCENDING), ("_id", 1)]))
+
+        self.names = serialize([item["_id"] for item in stats[:NAMES_LIMIT]])
+        self.stats = serialize([
+            {"name": item["_id"], "count": item["count"], "covers": item.get("covers", [])}
+            for item in stats
+        ])
+        self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self._expires = 0.0
+
+
+if __name__ == "__main__":
+    import db
+
+    started = time.perf_counter()
+    rebuild(db.db)
+    print(f"Rebuilt genre_stats for {db.db.genre_stats.count_documents({})} genres "
+          f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,45 @@
+import os
+import shutil
+
+# workers share their metric samples through this directory, see metrics.py.
+# It has to be set before prometheus_client is first imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/comixie-metrics")
+# --preload imports the app, and so creates metrics, before on_starting runs
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+
+
+def on_starting(server):
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def post_fork(server, worker):
+    # never reuse sockets or pymongo monitor threads from the master under --preload
+    import clients
+
+    clients.init_process()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    import clients
+    import limits
+
+    multiprocess.mark_process_dead(worker.pid)
+    # whatever the worker had admitted when it exited is no longer in flight
+    try:
+        limits.AdmissionController(clients.Lazy("redis")).forget(worker.pid)
+    except Exception as e:
+        server.log.warning(f"could not release admitted work of worker {worker.pid}: {e}")
+
+
+def worker_exit(server, worker):
+    # hand pending reading progress to Mongo before the worker goes away
+    import db
+
+    db.flush_all()
@@ -0,0 +1,234 @@
+"""
+Per-client quotas and admission control.
+
+Every request costs tokens according to the work it can trigger (COSTS, by
+view name): a range export costs far more than reading a chapter, which
+costs more than a cached listing. Each client has a token bucket in Redis
+that refills at QUOTA_RATE tokens per second up to QUOTA_BURST. Clients
+are identified by their QUOTA_CLIENT_HEADER when it holds one of the
+QUOTA_API_KEYS and by their address otherwise, so made-up keys don't buy
+fresh buckets. Behind a reverse proxy, set TRUSTED_PROXIES (see main.py)
+so the address is the client's rather than the proxy's. The bucket is kept
+as a single timestamp (GCRA), updated with WATCH/MULTI so that all workers
+share it without scripting.
+
+On top of that, requests costing at least ADMISSION_MIN_COST (the exports)
+are admitted only while the cost of such requests in flight across all
+workers stays within ADMISSION_MAX_COST. A single request counts for at
+most half of that, so one long range export never holds the whole budget,
+and keeps it until its streamed body has been sent. They wait up to
+ADMISSION_QUEUE_TIMEOUT seconds for room and are shed otherwise. Both
+limits answer 429 with Retry-After. A client that keeps retrying before
+then is turned away without asking Redis again. A request the view turns
+down as invalid (400, e.g. a bad export range) gets back all but
+DEFAULT_COST. Cheap requests are never held back by admission control,
+and when Redis is unavailable requests are let through.
+"""
+import math
+import os
+import socket
+import time
+
+from flask import Flask, g, jsonify, request
+
+import metrics
+import profiling
+
+QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "1") == "1"
+QUOTA_RATE = float(os.getenv("QUOTA_RATE", "5"))  # tokens per second
+QUOTA_BURST = float(os.getenv("QUOTA_BURST", "300"))
+QUOTA_CLIENT_HEADER = os.getenv("QUOTA_CLIENT_HEADER", "X-API-Key")
+QUOTA_API_KEYS = frozenset(key.strip() for key in os.getenv("QUOTA_API_KEYS", "").split(",") if key.strip())
+ADMISSION_MAX_COST = int(os.getenv("ADMISSION_MAX_COST", "100"))
+ADMISSION_MIN_COST = int(os.getenv("ADMISSION_MIN_COST", "10"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0"))
+ADMISSION_RETRY_AFTER = 2
+
+COSTS = {
+    "export_comic": 100,
+    "export_pdf": 30,
+    "search_comics": 5,
+    "get_comic_details": 3,
+    "read_chapter": 3,
+    "health_check": 0,
+    "metrics": 0,
+}
+DEFAULT_COST = 1
+
+
+class TokenBucket:
+    def __init__(self, store, rate: float = QUOTA_RATE, burst: float = QUOTA_BURST, prefix: str = "quota:"):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+
+    def take(self, client: str, cost: float, now: float = None) -> float:
+        """
+        Takes `cost` tokens, returns 0 when allowed or else the seconds until
+        they are available. A negative cost gives tokens back.
+        """
+        from redis.exceptions import WatchError
+
+        key = self.prefix + client
+        interval = 1 / self.rate
+        with self.store.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    stored = pipe.get(key)
+                    current = time.time() if now is None else now
+                    # the bucket is full again at `tat`, every token taken pushes it back
+                    tat = max(float(stored) if stored else 0.0, current)
+                    new_tat = tat + cost * interval
+                    wait = new_tat - current - self.burst * interval
+                    if wait > 0:
+                        pipe.unwatch()
+                        return wait
+                    pipe.multi()
+                    pipe.set(key, repr(new_tat), px=max(1, math.ceil((new_tat - current) * 1000)))
+                    pipe.execute()
+                    return 0.0
+                except WatchError:
+                    continue  # another worker took tokens from this bucket meanwhile
+
+
+class AdmissionController:
+    """Cost of expensive requests in flight, per worker in one Redis hash"""
+
+    def __init__(self, store, max_cost: int = ADMISSION_MAX_COST, key: str = "admission:inflight"):
+        self.store = store
+        self.max_cost = max_cost
+        self.key = key
+
+    def enter(self, cost: int, process: str = None) -> bool:
+        process = process or self.process()
+        pipe = self.store.pipeline()
+        pipe.hincrby(self.key, process, cost)
+        pipe.hvals(self.key)
+        pipe.expire(self.key, 3600)
+        _, values, _ = pipe.execute()
+        if sum(int(value) for value in values) <= self.max_cost:
+            return True
+        self.leave(cost, process)
+        return False
+
+    def leave(self, cost: int, process: str = None):
+        self.store.hincrby(self.key, process or self.process(), -cost)
+
+    def forget(self, pid: int):
+        """Drops what a worker that exited had in flight"""
+        self.store.hdel(self.key, self.process(pid))
+
+    @staticmethod
+    def process(pid: int = None) -> str:
+        return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+class Limiter:
+    def __init__(self, store, enabled: bool = QUOTA_ENABLED, costs: dict = None,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, min_cost: int = ADMISSION_MIN_COST,
+                 api_keys=QUOTA_API_KEYS):
+        self.enabled = enabled
+        self.costs = COSTS if costs is None else costs
+        self.api_keys = frozenset(api_keys)
+        self.buckets = TokenBucket(store)
+        self.admission = AdmissionController(store)
+        self.queue_timeout = queue_timeout
+        self.min_cost = min_cost
+        # (client, cost) -> when its bucket can hold that cost again, see check()
+        self._empty = {}
+
+    def cost(self, endpoint: str) -> int:
+        if not endpoint:
+            return DEFAULT_COST
+        return self.costs.get(endpoint.rsplit(".", 1)[-1], DEFAULT_COST)
+
+    def client(self) -> str:
+        key = request.headers.get(QUOTA_CLIENT_HEADER)
+        if key and key in self.api_keys:
+            return f"key:{key}"
+        return f"addr:{request.remote_addr or 'unknown'}"
+
+    def check(self, endpoint: str):
+        """Admits the current request or returns the 429 response for it"""
+        cost = self.cost(endpoint)
+        if not self.enabled or cost <= 0:
+            return None
+
+        try:
+            client = self.client()
+            # buckets only fill up with time, so a client that was just told to wait
+            # is answered from memory until then, however hard it keeps retrying
+            until = self._empty.get((client, cost))
+            if until and until > time.monotonic():
+                return self.reject("quota", "Quota exceeded, slow down", until - time.monotonic())
+
+            wait = self.buckets.take(client, cost)
+            if wait:
+                if len(self._empty) > 10000:
+                    now = time.monotonic()
+                    self._empty = {key: value for key, value in self._empty.items() if value > now}
+                self._empty[(client, cost)] = time.monotonic() + wait
+                return self.reject("quota", "Quota exceeded, slow down", wait)
+            if cost > DEFAULT_COST:
+                g.quota_charged = (client, cost)
+
+            if cost >= self.min_cost:
+                admitted = min(cost, self.admission.max_cost // 2)
+                deadline = time.monotonic() + self.queue_timeout
+                while not self.admission.enter(admitted):
+                    if time.monotonic() >= deadline:
+                        # shedding is the server's doing, the client keeps its tokens
+                        self.buckets.take(client, -cost)
+                        return self.reject("admission", "Server busy, try again shortly", ADMISSION_RETRY_AFTER)
+                    time.sleep(0.05)
+                g.admitted_cost = admitted
+        except Exception as e:
+            print(f"[limits] check failed, letting the request through: {e}")
+        return None
+
+    def reject(self, reason: str, message: str, wait: float):
+        metrics.LIMITED.labels(reason).inc()
+        retry_after = max(1, math.ceil(wait))
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def init_app(self, app: Flask):
+        @app.before_request
+        def limit_request():
+            return self.check(request.endpoint)
+
+        @app.after_request
+        def release_response(response):
+            charged = g.pop("quota_charged", None)
+            if charged and response.status_code == 400:
+                self.refund(*charged)
+            cost = g.pop("admitted_cost", None)
+            if cost:
+                # a streamed export does its work after teardown, it holds its share until sent
+                profiling.when_sent(response, lambda: self.release(cost))
+            return response
+
+        @app.teardown_request
+        def release_request(error=None):
+            # only left over when the view raised and no response went out
+            cost = g.pop("admitted_cost", None)
+            if cost:
+                self.release(cost)
+
+    def refund(self, client: str, cost: int):
+        """Gives back what a request rejected as invalid was charged beyond a cheap one"""
+        try:
+            self.buckets.take(client, -(cost - DEFAULT_COST))
+            self._empty.pop((client, cost), None)
+        except Exception as e:
+            print(f"[limits] could not refund {client}: {e}")
+
+    def release(self, cost: int):
+        try:
+            self.admission.leave(cost)
+        except Exception as e:
+            print(f"[limits] could not release admitted work: {e}")
@@ -1,38 +1,42 @@
 import io
-import json
 import os
-import re
+import time
 from dataclasses import asdict
 from enum import Enum
-import sqlite3
-import cloudscraper
-import pymongo
-import redis
-from bs4 import BeautifulSoup as BS
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, send_file
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
-from PIL import Image
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+import clients
+import covers
 import db
+import export
+import extract
+import genre_stats
+import limits
+import metrics
+import prefetch
+import profiling
+import updates
+from profiling import span
+from responses import ResponseCache
+from upstream import UpstreamCache
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
+api = Blueprint("api", __name__)
 
-scraper = cloudscraper.create_scraper()
-r = redis.Redis(
-    host=os.getenv("REDIS_HOST", ""),
-    port=int(os.getenv("REDIS_PORT", "6379")),
-    db=0
-)
+# per-process clients, created on first use (see clients.py)
+scraper = clients.Lazy("scraper")
+r = clients.Lazy("redis")
 
-DATABASE_PATH = os.getenv("DATABASE_PATH", "")
-if not DATABASE_PATH:
-    raise Exception("Please set DATABASE_PATH at .env")
+upstream = UpstreamCache(scraper, r)
+responses = ResponseCache(r)
+
+UPSTREAM_URL = (os.getenv("UPSTREAM_URL") or "https://readallcomics.com").rstrip("/")
+# reverse proxies in front of the app whose X-Forwarded-For is trusted, quotas are per client address
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
 
 class Status(Enum):
     DOWNLOADING = "Downloading"
@@ -41,37 +45,59 @@ class Status(Enum):
     EXPORTING = "Exporting PDF"
     COMPLETE = "Complete!"
 
-PDF_H = 300
-PDF_W = 200
+PDF_W, PDF_H = export.PAGE_SIZE
+IMAGE_CACHE_TTL = 3600
+
+
+def scrape_chapter(chapter_slug: str) -> list:
+    fetched = upstream.fetch(f"{UPSTREAM_URL}/{chapter_slug}/", extract.chapter, "chapter")
+    urls = fetched.data or []
+    comic_slug = db.chapters.update(chapter_slug, urls)
+    if comic_slug:
+        # the comic's details list its chapters with their images
+        responses.invalidate(f"details:{comic_slug}")
+    return urls
+
+
+def get_image(url: str) -> bytes:
+    with span("redis"):
+        content = r.get(f"image:{url}")
+    if content:
+        return content
+
+    started = time.perf_counter()
+    with span("upstream"):
+        response = scraper.get(url, timeout=30)
+    metrics.observe_upstream("image", response.status_code, time.perf_counter() - started)
+    response.raise_for_status()
+    return response.content
+
+
+def warm_image(url: str):
+    r.setex(f"image:{url}", IMAGE_CACHE_TTL, get_image(url))
+
+
+genre_catalog = genre_stats.GenreCatalog(db.db)
+
+prefetcher = prefetch.Prefetcher(db.chapters, r, scrape_chapter, warm_image)
 
+limiter = limits.Limiter(r)
 
-@app.route('/api/search', methods=['GET'])
+
+@api.route('/api/search', methods=['GET'])
 def search_comics():
     query = request.args.get('q', '').strip()
 
     if not query:
         return jsonify({'error': 'Query parameter is required'}), 400
 
-    url = f"https://readallcomics.com/?story={query}&s=&type=comic"
+    url = f"{UPSTREAM_URL}/?story={query}&s=&type=comic"
 
     try:
-        response = scraper.post(url, timeout=10)
-        print(response.status_code, response.text)
-        response.raise_for_status()
-
-        html_content = response.text.strip('"').replace("\\", "")
-        link_pattern = r'<a href="([^"]*)"[^>]*>([^<]*)</a>'
-        matches = re.findall(link_pattern, html_content)
-
-        results = []
-        for url, title in matches:
-            clean_title = title.strip()
-            if "/category" in url:
-                results.append({
-                    'title': clean_title,
-                    'url': url,
-                    'slug': url.split('/')[-2] if url.endswith('/') else url.split('/')[-1]
-                })
+        fetched = upstream.fetch(url, extract.search, "search", method="post", timeout=10)
+        if fetched.status_code != 200:
+            raise Exception(f"upstream responded with {fetched.status_code}")
+        results = fetched.data
 
         return jsonify({
             'query': query,
@@ -88,153 +114,128 @@ def search_comics():
         }), 500
 
 
-@app.route('/api/genres', methods=['GET'])
+@api.route('/api/genres', methods=['GET'])
 def get_genres():
-    genres = db.genres.find().limit(20)
-    genres = [genre["name"] for genre in genres]
-    return jsonify(genres)
+    # the plain list of names stays what existing clients get
+    body, etag = genre_catalog.get(stats=request.args.get('stats') == '1')
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 
-@app.route('/api/genre/<string:genre_name>/comics', methods=['GET'])
+@api.route('/api/genre/<string:genre_name>/comics', methods=['GET'])
 def get_comics_by_genre(genre_name):
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     skip = (page - 1) * per_page
 
-    comics_col = db.db.comics
-    query = { 'genres': genre_name }
-
-    total = comics_col.count_documents(query)
-    comics = comics_col.find(query).skip(skip).limit(per_page)
-
-    return jsonify({
-        'page': page,
-        'total_results': total,
-        'results': [
-            {
-                'slug': comic['slug'],
-                'title': comic['title'],
-                'url': comic['url'],
-                'description': comic['description'],
-                'publisher': comic['publisher'],
-                'image': comic['image']
-            } for comic in comics
-        ]
-    })
-
-
-@app.route('/api/details/<path:slug>', methods=['GET'])
-def get_comic_details(slug):
-    item = db.comics.get(slug)
-    if item:
-        chapters = list(db.db.chapters.find({'comic_slug': item.slug}))
-        for chapter in chapters:
-            chapter.pop('_id')
+    def build():
+        comics_col = db.db.comics
+        query = { 'genres': genre_name }
 
-        data = asdict(item)
-        data['chapters'] = chapters
-        return jsonify(data)
+        total = comics_col.count_documents(query)
+        comics = comics_col.find(query).skip(skip).limit(per_page)
 
-    try:
-        url = f"https://readallcomics.com/category/{slug}/"
-        response = scraper.get(url)
-        if response.status_code != 200:
-            return jsonify({"error": "comic not found"}), response.status_code
-        soup = BS(response.content, "html.parser")
-
-        chapters = []
-        title = genres = publisher = description = image = None
-
-        title_element = soup.select_one("center div h1 b")
-        description_element = str(soup.select_one("div.b"))
-        image_element = soup.select_one("center p img")
-        info = soup.select_one("center div div p")
-        chapters_element = soup.find(attrs={"class": "list-story"})
-
-        if chapters_element:
-            links = chapters_element.find_all("a") # type: ignore
-            for link in links:
-                name = link.get_text(strip=True)
-                chapter_url = link["href"] # type: ignore
-                chapter_slug = chapter_url.split('/')[-2] if chapter_url.endswith('/') else chapter_url.split('/')[-1] # type: ignore
-                chapters.append({
-                    "url": chapter_url,
-                    "name": name,
-                    "slug": chapter_slug
-                })
-
-        if info:
-            genres_element = info.find_next("strong")
-            if genres_element:
-                publisher_element = genres_element.find_next("strong")
-                if genres_element:
-                    genres = genres_element.text.split(", ")
-                if publisher_element:
-                    publisher = publisher_element.text
-
-        if title_element:
-            title = title_element.text
-
-        if image_element:
-            image = str(image_element.get("src"))
-
-        match = re.search(r'</span><br/>(.*?)<br/>', description_element, re.DOTALL)
-        if match:
-            description = match.group(1).strip()
-
-        comic = db.Comic(
-            slug=slug,
-            title=title,
-            genres=genres,
-            publisher=publisher,
-            description=description,
-            image=image,
-            url=url
-        )
-        db.comics.create(comic)
-        return jsonify(asdict(comic))
+        return {
+            'page': page,
+            'total_results': total,
+            'results': [
+                {
+                    'slug': comic['slug'],
+                    'title': comic['title'],
+                    'url': comic['url'],
+                    'description': comic['description'],
+                    'publisher': comic['publisher'],
+                    'image': comic['image'],
+                    **{name: comic.get(name) for name in covers.FIELDS}
+                } for comic in comics
+            ]
+        }
+
+    return responses.respond(f"genre:{genre_name}:{page}:{per_page}", build)
 
-    except Exception as e:
-        return jsonify({'error': f'Failed to get details: {str(e)}'}), 500
 
-@app.route('/api/read/<path:chapter_slug>', methods=['GET'])
+@api.route('/api/details/<path:slug>', methods=['GET'])
+def get_comic_details(slug):
+    def build():
+        item = db.comics.get(slug)
+        if item:
+            chapters = list(db.db.chapters.find({'comic_slug': item.slug}))
+            for chapter in chapters:
+                chapter.pop('_id')
+
+            data = asdict(item)
+            data['chapters'] = chapters
+            return data
+
+        try:
+            url = f"{UPSTREAM_URL}/category/{slug}/"
+            fetched = upstream.fetch(url, extract.category, "category")
+            if fetched.status_code != 200:
+                return jsonify({"error": "comic not found"}), fetched.status_code
+            details = fetched.data
+
+            comic = db.Comic(
+                slug=slug,
+                title=details["title"],
+                genres=details["genres"],
+                publisher=details["publisher"],
+                description=details["description"],
+                image=details["image"],
+                url=url
+            )
+            db.comics.create(comic)
+            genre_catalog.invalidate()
+            # not cached, the next request finds the comic in Mongo
+            return jsonify(asdict(comic))
+
+        except Exception as e:
+            return jsonify({'error': f'Failed to get details: {str(e)}'}), 500
+
+    return responses.respond(f"details:{slug}", build)
+
+@api.route('/api/read/<path:chapter_slug>', methods=['GET'])
 def read_chapter(chapter_slug):
-    item = db.chapters.get(chapter_slug)
-    if item and item.images:
-        return jsonify(asdict(item))
+    def build():
+        item = db.chapters.get(chapter_slug)
+        if item and item.images:
+            return asdict(item)
+
+        try:
+            scrape_chapter(chapter_slug)
+            chapter = db.chapters.get(chapter_slug)
+            if chapter and chapter.images:
+                return asdict(chapter)
+            elif chapter:
+                # scraped again on the next request
+                return jsonify(asdict(chapter))
+            else:
+                return jsonify({'error': 'Not Found'}), 404
+
+        except Exception as e:
+            return jsonify({'error': f'Failed to read chapter: {str(e)}'}), 500
+
+    response = responses.respond(f"read:{chapter_slug}", build)
+    if response.status_code in (200, 304):
+        prefetcher.schedule(chapter_slug)
+    return response
+
+@api.route('/api/export-pdf/<path:chapter_slug>', methods=['POST'])
+def export_pdf(chapter_slug):
+    # only the export path needs these, keep them out of worker startup
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
 
     try:
-        chapter_url = f"https://readallcomics.com/{chapter_slug}/"
-        base = scraper.get(chapter_url)
-        soup = BS(base.content, "html.parser")
-        pages = soup.select("center p img")
-
-        urls = []
-        for page in pages:
-            source = page["src"]
-            if isinstance(source, list):
-                raise AttributeError("Image can't have more than one source")
-            urls.append(source)
-
-        db.chapters.update(chapter_slug, urls)
+        # straight from Mongo or upstream, /api/read's response depends on the client's headers
         chapter = db.chapters.get(chapter_slug)
-        if chapter:
-            return jsonify(asdict(chapter))
+        if chapter and chapter.images:
+            image_urls = chapter.images
         else:
-            return jsonify({'error': 'Not Found'}), 404
-
-    except Exception as e:
-        return jsonify({'error': f'Failed to read chapter: {str(e)}'}), 500
-
-@app.route('/api/export-pdf/<path:chapter_slug>', methods=['POST'])
-def export_pdf(chapter_slug):
-    try:
-        chapter_data = read_chapter(chapter_slug)
-        if isinstance(chapter_data, tuple):
-            return chapter_data
-
-        chapter_info = chapter_data.get_json()
-        image_urls = chapter_info['image_urls']
+            image_urls = scrape_chapter(chapter_slug)
+            if not chapter and not db.chapters.get(chapter_slug):
+                return jsonify({'error': 'Not Found'}), 404
 
         if not image_urls:
             return jsonify({'error': 'No images found'}), 400
@@ -244,11 +245,11 @@ def export_pdf(chapter_slug):
 
         for i, img_url in enumerate(image_urls):
             try:
-                img_response = scraper.get(img_url, timeout=30)
-                img_response.raise_for_status()
+                content = get_image(img_url)
 
-                img = Image.open(io.BytesIO(img_response.content))
-                img_width, img_height = img.size
+                with span("image"):
+                    img = Image.open(io.BytesIO(content))
+                    img_width, img_height = img.size
 
                 aspect_ratio = img_width / img_height
                 if aspect_ratio > PDF_W / PDF_H:
@@ -261,21 +262,26 @@ def export_pdf(chapter_slug):
                 x_offset = (PDF_W - new_width) / 2
                 y_offset = (PDF_H - new_height) / 2
 
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
+                with span("image"):
+                    img_buffer = io.BytesIO()
+                    img.save(img_buffer, format='PNG')
+                    img_buffer.seek(0)
 
-                img_reader = ImageReader(img_buffer)
-                pdf_canvas.drawImage(img_reader, x_offset, y_offset,
-                                   width=new_width, height=new_height)
+                with span("pdf"):
+                    img_reader = ImageReader(img_buffer)
+                    pdf_canvas.drawImage(img_reader, x_offset, y_offset,
+                                       width=new_width, height=new_height)
 
+                metrics.EXPORT_PAGES.inc()
                 if i < len(image_urls) - 1:
                     pdf_canvas.showPage()
 
             except Exception:
                 continue
 
-        pdf_canvas.save()
+        with span("pdf"):
+            pdf_canvas.save()
+        metrics.EXPORT_BYTES.inc(pdf_buffer.getbuffer().nbytes)
         pdf_buffer.seek(0)
 
         filename = f"{chapter_slug}.pdf"
@@ -289,62 +295,168 @@ def export_pdf(chapter_slug):
     except Exception as e:
         return jsonify({'error': f'PDF export failed: {str(e)}'}), 500
 
-@app.route('/api/home', methods=['GET'])
+@api.route('/api/export/<path:comic_slug>', methods=['GET', 'POST'])
+def export_comic(comic_slug):
+    kind = request.args.get('format', 'cbz').lower()
+    if kind not in export.FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(export.FORMATS)}'}), 400
+
+    chapters = db.chapters.list(comic_slug)
+    if not chapters:
+        return jsonify({'error': 'No chapters found for this comic'}), 404
+
+    first = request.args.get('from', 1, type=int)
+    last = min(request.args.get('to', len(chapters), type=int), len(chapters))
+    if first < 1 or first > last:
+        return jsonify({'error': f'from and to must select chapters between 1 and {len(chapters)}'}), 400
+    if last - first + 1 > export.EXPORT_MAX_CHAPTERS:
+        return jsonify({'error': f'At most {export.EXPORT_MAX_CHAPTERS} chapters can be exported at once'}), 400
+
+    write, mimetype = export.FORMATS[kind]
+    pages = export.fetch_pages(chapters[first - 1:last], scrape_chapter, get_image, start=first)
+    filename = f"{comic_slug}-{first:03d}-{last:03d}.{kind}"
+    return Response(
+        stream_with_context(write(pages)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@api.route('/api/home', methods=['GET'])
 def home_page():
     page = request.args.get('page', 1, type=int)
-    data = r.get(f"home_{page}")
-    if data:
-        return jsonify(json.loads(data)) # type: ignore
-
-    try:
-        url = f"https://readallcomics.com/page/{page}/"
-        response = scraper.get(url)
-        soup = BS(response.content, "html.parser")
-        divs = soup.find_all('div', {'id': lambda x: x and x.startswith('post-'), 'class': lambda x: x and 'post-' in x}) # type: ignore
 
-        comics = []
-        for div in divs:
+    def build():
+        try:
+            url = f"{UPSTREAM_URL}/page/{page}/"
+            comics = upstream.fetch(url, extract.home, "home").data or []
             try:
-                comic_url = div.select_one("a").get("href") # type: ignore
-                image = div.select_one("img").get("src") # type: ignore
-                name_element = div.find("a", attrs={"class": "front-link"}) # type: ignore
-                date = div.select_one("center span").text # type: ignore
-
-                slug = comic_url.split('/')[-2] if comic_url.endswith('/') else comic_url.split('/')[-1] # type: ignore
-
-                comics.append({
-                    'url': comic_url,
-                    'slug': slug,
-                    'image': image,
-                    'name': name_element.text if name_element else '',
-                    'date': date
-                })
-            except Exception:
-                continue
-
-        data = {
-            'page': page,
-            'total_comics': len(comics),
-            'comics': comics
-        }
-        r.setex(f"home_{page}", 21600, json.dumps(data)) # 21600 seconds = 6 hours cache
-
-        return jsonify(data)
-
-    except Exception as e:
-        return jsonify({'error': f'Failed to get home page: {str(e)}'}), 500
-
-@app.route('/api/health', methods=['GET'])
+                stored = db.comics.covers(list({comic['comic_slug'] for comic in comics if comic['comic_slug']}))
+            except Exception as e:
+                current_app.logger.warning("cover placeholders unavailable: %s", e)
+                stored = {}
+            for comic in comics:
+                cover = stored.get(comic['comic_slug'])
+                # only when the post shows the comic's own cover, else the size would be wrong
+                matches = cover is not None and cover.get('image') == comic['image']
+                comic.update({name: cover.get(name) if matches else None for name in covers.FIELDS})
+
+            return {
+                'page': page,
+                'total_comics': len(comics),
+                'comics': comics
+            }
+
+        except Exception as e:
+            return jsonify({'error': f'Failed to get home page: {str(e)}'}), 500
+
+    return responses.respond(f"home:{page}", build, ttl=21600) # 21600 seconds = 6 hours cache
+
+@api.route('/api/updates', methods=['GET'])
+def get_updates():
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    comics = [slug for slug in request.args.get('comics', '').split(',') if slug]
+    return jsonify(updates.feed(db.db, since, comics, limit))
+
+def page_number(data: dict):
+    """The `page` of a progress or bookmark body, 0 when missing, None when it isn't a page number"""
+    try:
+        page = int(data.get('page', 0))
+    except (TypeError, ValueError):
+        return None
+    return page if page >= 0 else None
+
+@api.route('/api/users/<string:user>/progress', methods=['GET'])
+def get_progress(user):
+    comic_slug = request.args.get('comic')
+    if comic_slug:
+        item = db.progress.get(user, comic_slug)
+        if not item:
+            return jsonify({'error': 'No progress for this comic'}), 404
+        return jsonify(asdict(item))
+    return jsonify([asdict(item) for item in db.progress.history(user)])
+
+
+@api.route('/api/users/<string:user>/progress', methods=['PUT'])
+def set_progress(user):
+    data = request.get_json(silent=True) or {}
+    if not data.get('comic_slug') or not data.get('chapter_slug'):
+        return jsonify({'error': 'comic_slug and chapter_slug are required'}), 400
+    page = page_number(data)
+    if page is None:
+        return jsonify({'error': 'page must be a non-negative integer'}), 400
+
+    item = db.progress.set(db.Progress(
+        user=user,
+        comic_slug=data['comic_slug'],
+        chapter_slug=data['chapter_slug'],
+        page=page
+    ))
+    return jsonify(asdict(item))
+
+
+@api.route('/api/users/<string:user>/bookmarks', methods=['GET'])
+def get_bookmarks(user):
+    return jsonify([asdict(item) for item in db.bookmarks.list(user)])
+
+
+@api.route('/api/users/<string:user>/bookmarks', methods=['POST'])
+def add_bookmark(user):
+    data = request.get_json(silent=True) or {}
+    if not data.get('chapter_slug'):
+        return jsonify({'error': 'chapter_slug is required'}), 400
+    page = page_number(data)
+    if page is None:
+        return jsonify({'error': 'page must be a non-negative integer'}), 400
+
+    item = db.bookmarks.add(db.Bookmark(
+        user=user,
+        chapter_slug=data['chapter_slug'],
+        page=page,
+        comic_slug=data.get('comic_slug'),
+        note=data.get('note')
+    ))
+    return jsonify(asdict(item)), 201
+
+
+@api.route('/api/users/<string:user>/bookmarks/<path:chapter_slug>/<int:page>', methods=['DELETE'])
+def remove_bookmark(user, chapter_slug, page):
+    db.bookmarks.remove(user, chapter_slug, page)
+    return '', 204
+
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'Comic API is running'})
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+def create_app() -> Flask:
+    """
+    Builds the WSGI app without touching Mongo, Redis or upstream; every
+    process creates its own clients when it first needs them. Safe to call in
+    the gunicorn master with --preload.
+    """
+    app = Flask(__name__)
+    if TRUSTED_PROXIES:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+    CORS(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    prefetcher.init_app(app)
+    # last, so rejected requests are still timed and counted by the hooks above
+    limiter.init_app(app)
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
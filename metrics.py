@@ -0,0 +1,116 @@
+"""
+Prometheus instrumentation served at /api/metrics.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(see gunicorn.conf.py) and the endpoint aggregates all of them, so a scrape
+hitting any worker sees totals for the whole server.
+"""
+import os
+import threading
+import time
+
+from flask import Flask, Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from pymongo import monitoring
+
+import profiling
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+REQUEST_LATENCY = Histogram(
+    "comixie_request_duration_seconds", "Time spent handling a request",
+    ["method", "route"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    "comixie_requests_total", "Requests handled",
+    ["method", "route", "status"])
+
+UPSTREAM_LATENCY = Histogram(
+    "comixie_upstream_fetch_duration_seconds", "Time spent fetching an upstream page",
+    ["page_type"], buckets=LATENCY_BUCKETS)
+UPSTREAM_RESPONSES = Counter(
+    "comixie_upstream_responses_total", "Upstream responses by status code",
+    ["page_type", "status"])
+
+RESPONSE_CACHE = Counter(
+    "comixie_response_cache_total", "Lookups of cached JSON responses (home, details, read, genre)",
+    ["name", "result"])
+
+LIMITED = Counter(
+    "comixie_limited_requests_total", "Requests answered with 429, by quota or admission control",
+    ["reason"])
+
+CATALOG_LOOKUPS = Counter(
+    "comixie_catalog_lookups_total", "Comic lookups in the mmapped catalog snapshot",
+    ["result"])
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "comixie_mongo_command_duration_seconds", "Duration of Mongo commands",
+    ["collection", "command", "outcome"], buckets=MONGO_BUCKETS)
+
+EXPORT_PAGES = Counter("comixie_export_pages_total", "Pages written to exported PDFs and CBZs")
+EXPORT_BYTES = Counter("comixie_export_bytes_total", "Bytes of exported PDFs and CBZs")
+
+
+def observe_upstream(page_type: str, status: int, seconds: float):
+    UPSTREAM_LATENCY.labels(page_type).observe(seconds)
+    UPSTREAM_RESPONSES.labels(page_type, str(status)).inc()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command the driver sends, labelled by collection and command name"""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) else event.command.get("collection", "")
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+    def _observe(self, event, outcome: str):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name, outcome).observe(seconds)
+        profiling.record("mongo", seconds)
+
+
+def collect() -> bytes:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def init_app(app: Flask):
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            method, route = request.method, request.url_rule.rule if request.url_rule else "unmatched"
+
+            def observe():
+                REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+                REQUESTS.labels(method, route, str(response.status_code)).inc()
+
+            profiling.when_sent(response, observe)
+        return response
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        return Response(collect(), mimetype=CONTENT_TYPE_LATEST)
@@ -1,7 +1,8 @@
 import sqlite3
 
 import cloudscraper
-from bs4 import BeautifulSoup as BS
+
+import extract
 
 scraper = cloudscraper.create_scraper()
 
@@ -14,14 +15,7 @@ comics = c.fetchall()
 
 def get_comic_image(url):
     response = scraper.get(url)
-    soup = BS(response.content, "html.parser")
-
-    image = None
-    image_element = soup.select_one("center p img")
-    if image_element:
-        image = image_element.get("src")
-
-    return image
+    return extract.category(response.content)["image"]
 
 count = 0
 for comic_id, slug, url in comics:
@@ -36,7 +30,7 @@ for comic_id, slug, url in comics:
         else:
             print("[COULDNT GET IMAGE]", url)
     except Exception as e:
-        print(f"Error on chapter {chap_id}: {e}")
+        print(f"Error on comic {comic_id}: {e}")
 
 conn.commit()
 conn.close()
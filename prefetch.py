@@ -0,0 +1,178 @@
+"""
+Read-ahead for the next chapter.
+
+When a chapter is served, its slug is handed to a background worker that
+resolves the image list of the following chapter and stores it, so the next
+/api/read is answered from Mongo. Optionally the first few page images are
+warmed as well.
+
+Prefetching is strictly best effort and yields to interactive traffic:
+scheduling never blocks and drops work when the queue is full, the worker
+waits while this process is busy serving requests, a Redis key per chapter
+deduplicates across workers and a per-minute budget shared through Redis
+caps upstream requests spent on guesses.
+"""
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+from flask import Flask, g
+
+import clients
+import profiling
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_BUDGET = int(os.getenv("PREFETCH_BUDGET", "60"))  # prefetches per minute across all workers
+PREFETCH_PAGES = int(os.getenv("PREFETCH_PAGES", "0"))
+PREFETCH_MAX_ACTIVE = int(os.getenv("PREFETCH_MAX_ACTIVE", "1"))
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "32"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+DEDUP_TTL = 600
+
+
+@dataclass
+class PrefetchStats:
+    scheduled: int = 0
+    dropped: int = 0
+    duplicate: int = 0
+    over_budget: int = 0
+    prefetched: int = 0
+    pages_warmed: int = 0
+    failed: int = 0
+
+
+class Prefetcher:
+    def __init__(self, chapters, store, resolve: Callable[[str], list],
+                 warm: Optional[Callable[[str], None]] = None, pages: int = PREFETCH_PAGES,
+                 budget: int = PREFETCH_BUDGET, max_active: int = PREFETCH_MAX_ACTIVE,
+                 queue_size: int = PREFETCH_QUEUE_SIZE, workers: int = PREFETCH_WORKERS,
+                 enabled: bool = PREFETCH_ENABLED,
+                 prefix: str = "prefetch:"):
+        self.chapters = chapters
+        self.store = store
+        self.resolve = resolve
+        self.warm = warm
+        self.pages = pages
+        self.budget = budget
+        self.max_active = max_active
+        self.workers = workers
+        self.enabled = enabled
+        self.prefix = prefix
+        self.stats = PrefetchStats()
+        self.active = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._workers = clients.PerProcess(self._start_workers)
+
+    def schedule(self, slug: str):
+        """Queue read-ahead after `slug` was served, never blocks the caller"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if slug in self._queued:
+                self.stats.duplicate += 1
+                return
+            try:
+                self._queue.put_nowait(slug)
+            except queue.Full:
+                self.stats.dropped += 1
+                return
+            self._queued.add(slug)
+            self.stats.scheduled += 1
+        self._workers.ensure()
+
+    def _start_workers(self):
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self):
+        while True:
+            slug = self._queue.get()
+            try:
+                with self._idle:
+                    self._idle.wait_for(lambda: self.active <= self.max_active)
+                self.prefetch_after(slug)
+            except Exception:
+                self._count(failed=1)
+            finally:
+                with self._lock:
+                    self._queued.discard(slug)
+                self._queue.task_done()
+
+    def prefetch_after(self, slug: str):
+        chapter = self.chapters.get(slug)
+        following = self.chapters.next(chapter) if chapter else None
+        if not following or following.images:
+            return
+
+        key = self.prefix + following.slug
+        if not self.store.set(key, 1, nx=True, ex=DEDUP_TTL):
+            self._count(duplicate=1)
+            return
+        if not self._take_budget():
+            self.store.delete(key)
+            self._count(over_budget=1)
+            return
+
+        try:
+            images = self.resolve(following.slug)
+        except Exception:
+            self.store.delete(key)
+            raise
+        self._count(prefetched=1)
+
+        if self.warm:
+            for url in images[:self.pages]:
+                self.warm(url)
+                self._count(pages_warmed=1)
+
+    def _take_budget(self) -> bool:
+        key = f"{self.prefix}budget:{int(time.time() // 60)}"
+        used = self.store.incr(key)
+        if used == 1:
+            self.store.expire(key, 120)
+        return used <= self.budget
+
+    def join(self):
+        """Wait until everything queued so far was handled"""
+        self._queue.join()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return asdict(self.stats)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def init_app(self, app: Flask):
+        """Track requests in flight so prefetching only runs when the worker is idle enough"""
+        @app.before_request
+        def request_started():
+            with self._lock:
+                self.active += 1
+            g.prefetch_counted = True
+
+        @app.after_request
+        def request_sent(response):
+            if g.pop("prefetch_counted", False):
+                profiling.when_sent(response, self._finished)
+            return response
+
+        @app.teardown_request
+        def request_finished(error=None):
+            # only left over when the view raised and no response went out
+            if g.pop("prefetch_counted", False):
+                self._finished()
+
+    def _finished(self):
+        with self._idle:
+            self.active -= 1
+            self._idle.notify_all()
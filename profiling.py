@@ -0,0 +1,210 @@
+"""
+Opt-in request profiling and slow-request capture.
+
+Every request records a cheap breakdown of time spent in named spans
+(upstream fetch, parsing, Mongo, image processing, PDF rendering). A request
+is additionally run under cProfile when it carries `X-Profile: <PROFILE_SECRET>`
+or is picked by PROFILE_SAMPLE_RATE, unless another request in the process
+is being profiled at that moment. Profiled requests and requests slower
+than PROFILE_SLOW_MS are written to a bounded ring of files in PROFILE_DIR
+and can be downloaded from /api/profiles with the same header. Streamed
+responses (exports) are timed and profiled until their body has been sent.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from flask import Flask, abort, g, jsonify, request, send_file
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "2000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/comixie-profiles")
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "100"))
+
+_spans: ContextVar[Optional[dict]] = ContextVar("spans", default=None)
+# since Python 3.12 only one profiler can be active per process, a second enable() raises
+_profiler_lock = threading.Lock()
+
+
+@contextmanager
+def span(name: str):
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def record(name: str, seconds: float):
+    spans = _spans.get()
+    if spans is not None:
+        total = spans.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+
+def when_sent(response, callback: Callable[[], None]):
+    """
+    Runs `callback` once the response is done. A streamed body is produced
+    while it is sent, after the request's teardown, so it waits for that.
+    """
+    if response.is_streamed:
+        response.call_on_close(callback)
+    else:
+        callback()
+
+
+def start_profiler() -> Optional[cProfile.Profile]:
+    """A running profiler, or None while another one is running in this process"""
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # some other profiling tool is active
+        _profiler_lock.release()
+        return None
+    return profiler
+
+
+def stop_profiler(profiler: cProfile.Profile):
+    profiler.disable()
+    _profiler_lock.release()
+
+
+def authorized() -> bool:
+    return bool(PROFILE_SECRET) and request.headers.get("X-Profile") == PROFILE_SECRET
+
+
+def store(entry: dict, profiler: Optional[cProfile.Profile]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, entry["id"])
+
+    if profiler:
+        profiler.dump_stats(path + ".prof")
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        entry["profile"] = summary.getvalue()
+
+    with open(path + ".json.tmp", "w") as f:
+        json.dump(entry, f)
+    os.replace(path + ".json.tmp", path + ".json")
+    prune()
+
+
+def prune():
+    records = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    for name in records[:max(0, len(records) - PROFILE_RING_SIZE)]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-len(".json")] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def init_app(app: Flask):
+    @app.before_request
+    def start_profile():
+        g.profile_started = time.perf_counter()
+        g.profile_token = _spans.set({})
+        g.profiler = None
+        if authorized() or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            g.profiler = start_profiler()
+
+    @app.after_request
+    def finish_profile(response):
+        profiler = g.pop("profiler", None)
+        started = g.pop("profile_started", None)
+        token = g.pop("profile_token", None)
+        if started is None or token is None:
+            if profiler:
+                stop_profiler(profiler)
+            return response
+
+        entry = {
+            "id": f"{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:8]}",
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "route": request.url_rule.rule if request.url_rule else None,
+            "status": response.status_code,
+        }
+        # a streamed body's headers are gone by the time it is done
+        if profiler and response.is_streamed:
+            response.headers["X-Profile-Id"] = entry["id"]
+
+        def finish():
+            if profiler:
+                stop_profiler(profiler)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            spans = _spans.get() or {}
+            try:
+                _spans.reset(token)
+            except ValueError:  # closed from another context than the request's
+                _spans.set(None)
+            if not profiler and elapsed_ms < PROFILE_SLOW_MS:
+                return
+
+            entry.update({
+                "duration_ms": round(elapsed_ms, 3),
+                "spans": {name: {"ms": round(seconds * 1000, 3), "count": count}
+                          for name, (seconds, count) in spans.items()},
+                "slow": elapsed_ms >= PROFILE_SLOW_MS,
+            })
+            try:
+                store(entry, profiler)
+                if not response.is_streamed:
+                    response.headers["X-Profile-Id"] = entry["id"]
+            except OSError as e:
+                app.logger.warning("could not store request profile: %s", e)
+
+        when_sent(response, finish)
+        return response
+
+    @app.teardown_request
+    def drop_profile(error=None):
+        # only left over when no response went out, the next request must be able to profile
+        profiler = g.pop("profiler", None)
+        if profiler:
+            stop_profiler(profiler)
+
+    @app.route('/api/profiles', methods=['GET'])
+    def list_profiles():
+        if not authorized():
+            abort(404)
+        if not os.path.isdir(PROFILE_DIR):
+            return jsonify([])
+
+        profiles = []
+        for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    entry = json.load(f)
+                entry.pop("profile", None)
+                profiles.append(entry)
+        return jsonify(profiles)
+
+    @app.route('/api/profiles/<string:profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        if not authorized():
+            abort(404)
+        name = os.path.basename(profile_id)
+        if not name.endswith(".prof"):
+            name += ".json"
+        path = os.path.join(PROFILE_DIR, name)
+        if not os.path.exists(path):
+            return jsonify({'error': 'Profile not found'}), 404
+        return send_file(path, as_attachment=name.endswith(".prof"))
@@ -0,0 +1,122 @@
+"""
+Cached JSON responses with strong ETags and precompressed bodies.
+
+Comic details, chapters and listings change far less often than they are
+requested. For those routes the serialized body is kept in a Redis hash
+together with its ETag, a hash of the body taken once when it is stored,
+and its gzip and brotli encodings. Serving one then costs a single Redis
+lookup: a client whose If-None-Match holds the tag of the encoding it
+would be sent gets a 304, any other gets that stored encoding as is. The JSON is serialized and
+compressed once per version of the content instead of on every request.
+
+Entries expire after their TTL; writers that know a response changed drop
+it earlier with invalidate().
+"""
+import gzip
+import hashlib
+import os
+from typing import Callable
+
+from flask import Response, current_app, jsonify, request
+
+import metrics
+from profiling import span
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "512"))
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# in order of preference when the client accepts several equally
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def representation_etag(etag: str, encoding: str) -> str:
+    # every encoding is a different byte sequence, so it gets its own strong tag
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+
+class ResponseCache:
+    def __init__(self, store, prefix: str = "response:", ttl: int = RESPONSE_CACHE_TTL):
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def respond(self, key: str, build: Callable, ttl: int = None) -> Response:
+        """
+        The response for `key`, from the cache or else from `build()`. What
+        `build` returns is cached when it is a dict or a list; anything else,
+        such as an error response, is sent as it is without caching.
+        """
+        name = key.split(":", 1)[0]
+        encoding = request.accept_encodings.best_match(ENCODINGS, default="identity")
+        try:
+            with span("redis"):
+                etag, body = self.store.hmget(self.prefix + key, ["etag", encoding])
+        except Exception as e:
+            print(f"[responses] cache lookup failed, serving {key} uncached: {e}")
+            data = build()
+            return current_app.make_response(jsonify(data) if isinstance(data, (dict, list)) else data)
+
+        if etag is None:
+            metrics.RESPONSE_CACHE.labels(name, "miss").inc()
+            data = build()
+            if not isinstance(data, (dict, list)):
+                return current_app.make_response(data)
+            entry = self.put(key, data, ttl)
+            encoding = encoding if encoding in entry else "identity"
+            etag, body = entry["etag"], entry[encoding]
+        else:
+            metrics.RESPONSE_CACHE.labels(name, "hit").inc()
+
+        if body is None:  # too small to be worth compressing
+            encoding = "identity"
+        # a 304 stands for the representation a 200 would have sent, under the same tag
+        tag = representation_etag(etag.decode(), encoding)
+        if request.if_none_match and request.if_none_match.contains(tag):
+            response = Response(status=304)
+        else:
+            if body is None:
+                with span("redis"):
+                    body = self.store.hget(self.prefix + key, "identity")
+                if body is None:  # expired in between
+                    return self.respond(key, build, ttl)
+            response = Response(body, mimetype="application/json")
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(tag)
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def put(self, key: str, data, ttl: int = None) -> dict:
+        """Serializes and compresses `data` once and stores it under `key`"""
+        body = current_app.json.dumps(data, separators=(",", ":")).encode()
+        entry = {"etag": hashlib.blake2b(body, digest_size=16).hexdigest().encode(), "identity": body}
+        if len(body) >= COMPRESS_MIN_SIZE:
+            for encoding in ENCODINGS:
+                entry[encoding] = compress(body, encoding)
+        try:
+            with span("redis"):
+                pipe = self.store.pipeline()
+                pipe.delete(self.prefix + key)
+                pipe.hset(self.prefix + key, mapping=entry)
+                pipe.expire(self.prefix + key, ttl or self.ttl)
+                pipe.execute()
+        except Exception as e:
+            print(f"[responses] could not cache {key}: {e}")
+        return entry
+
+    def invalidate(self, *keys: str):
+        if keys:
+            self.store.delete(*(self.prefix + key for key in keys))
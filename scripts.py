@@ -4,7 +4,8 @@ from enum import Enum
 from typing import Dict
 
 import cloudscraper
-from bs4 import BeautifulSoup as BS
+
+import extract
 
 
 class Status(Enum):
@@ -53,15 +54,7 @@ def get_comic_images(entry: dict) -> dict:
     name = entry.get("name", "").strip()
     base = scraper.get(url)
     base.close()
-    soup = BS(base.content, "html.parser")
-    pages = soup.select("center p img")
-    urls = []
-
-    for page in pages:
-        source = page["src"]
-        if isinstance(source, list):
-            raise AttributeError("Image can't have more than one source")
-        urls.append(source)
+    urls = extract.chapter(base.content)
 
     return {"name": name, "urls": urls}
 
@@ -86,21 +79,10 @@ def search_comics(query: str):
         response = scraper.post(url, timeout=10)
         response.raise_for_status()
 
-        # Parse the HTML response
-        html_content = response.text.strip('"').replace("\\", "")  # Remove surrounding quotes
-        # Extract links and titles using regex
-        link_pattern = r'<a href="([^"]*)"[^>]*>([^<]*)</a>'
-        matches = re.findall(link_pattern, html_content)
-        # Process results
-        results = []
-        for url, title in matches:
-            # Clean up the URL (unescape HTML entities)
-            clean_title = title.strip()
-            if "/category" in url:
-                results.append({
-                    'title': clean_title,
-                    'url': url
-                })
+        results = [
+            {'title': result['title'], 'url': result['url']}
+            for result in extract.search(response.content)
+        ]
 
         return {
             'query': query,
@@ -135,78 +117,29 @@ def print_results(results: Dict) -> None:
 
 def get_comic_details(url):
     response = scraper.get(url)
-    soup = BS(response.content, "html.parser")
-
-    chapters = []
-    genres_element = publisher_element = title = genres = publisher = description = image = None
-
-    title_element = soup.select_one("center div h1 b")
-    image_element = soup.select_one("center p img")
-    description_element = str(soup.select_one("div.b"))
-
-    info = soup.select_one("center div div p")
-    chapters_element = soup.find(attrs={"class": "list-story"})
-
-    if chapters_element:
-        links = chapters_element.find_all("a")
-        for link in links:
-            name = link.get_text(strip=True)
-            url = link["href"]
-            chapters.append({"url": url, "name": name})
-
-    if info:
-        genres_element = info.find_next("strong")
-        if genres_element:
-            publisher_element = genres_element.find_next("strong")
-
-    if title_element:
-        title = title_element.text
-    if genres_element:
-        genres = genres_element.text.split(", ")
-    if publisher_element:
-        publisher = publisher_element.text
-    if image_element:
-        image = image_element.get("src")
-
-    match = re.search(r'</span><br/>(.*?)<br/>', description_element, re.DOTALL)
-    if match:
-        description = match.group(1).strip()
+    details = extract.category(response.content)
 
     return {
-        "title": title,
-        "genres": genres,
-        "publisher": publisher,
-        "desccription": description,
-        "chapters": chapters,
-        "image": image
+        "title": details["title"],
+        "genres": details["genres"],
+        "publisher": details["publisher"],
+        "desccription": details["description"],
+        "chapters": [{"url": chapter["url"], "name": chapter["name"]} for chapter in details["chapters"]],
+        "image": details["image"]
     }
 
 
 def home_page(page=1):
     url = f"https://readallcomics.com/page/{page}/"
     response = scraper.get(url)
-    soup = BS(response.content, "html.parser")
 
-    divs = soup.find_all('div', {'id': lambda x: x and x.startswith('post-'), 'class': lambda x: x and 'post-' in x}) # type: ignore
-    for div in divs:
-        url = div.select_one("a").get("href")
-        image = div.select_one("img").get("src")
-        name = div.find("a", attrs={"class": "front-link"})
-        date = div.select_one("center span").text
-        print(url, image, name.text, date)
+    for comic in extract.home(response.content):
+        print(comic["url"], comic["image"], comic["name"], comic["date"])
 
 def get_page_count():
     url = "https://readallcomics.com/"
     response = scraper.get(url)
-    soup = BS(response.content, "html.parser")
-
-    numbers = soup.find_all('a', {"class": "page-numbers"}) # type: ignore
-    for div in divs:
-        url = div.select_one("a").get("href")
-        image = div.select_one("img").get("src")
-        name = div.find("a", attrs={"class": "front-link"})
-        date = div.select_one("center span").text
-        print(url, image, name.text, date)
+    return extract.page_count(response.content)
 
 
 def get_comic_page(url):
@@ -1,75 +1,256 @@
+"""
+Streams the SQLite catalog into Mongo.
+
+Every table is read in fetchmany batches and written with unordered bulk
+upserts keyed on the natural key (genre name, comic and chapter slug), so
+memory stays flat and re-running the import is a no-op. Batches can be
+written by several threads; the last fully written id per table is kept in a
+checkpoint file so an interrupted import continues where it stopped.
+
+Chapters were scraped from category pages, which list a comic's newest
+chapter first, so each gets its reading-order `index` from its position
+among its comic's rows; running the import again over an existing
+catalog fills it in for chapters imported before it was stored.
+
+    python sql2mongo.py
+    python sql2mongo.py --workers 4 --batch-size 2000 --checkpoint sql2mongo.json
+"""
+import argparse
+import json
 import os
+import queue
 import sqlite3
-from pymongo import MongoClient
+import threading
+import time
+
 from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+
+import genre_stats
 
 load_dotenv()
 
-DATABASE_PATH = os.getenv("DATABASE_PATH")
-if not DATABASE_PATH:
-    raise Exception("Please set DATABASE_PATH at .env to run this script")
+COMIC_FIELDS = ['slug', 'title', 'url', 'description', 'publisher', 'image']
 
-conn = sqlite3.connect(DATABASE_PATH)
-cursor = conn.cursor()
 
-client = MongoClient(
-    host=os.getenv("MONGO_HOST"),
-    port=int(os.getenv("MONGO_PORT", "27017"))
-)
-db = client.comixie
+def batch_generator(cursor, size=1000):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
 
-cursor.execute("SELECT * FROM genres")
+class Checkpoint:
+    """Highest id per table below which every batch has been written"""
 
-for id, name in cursor.fetchall():
-    db.genres.insert_one({'name': name})
+    def __init__(self, path=None):
+        self.path = path
+        self.positions = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.positions = json.load(f)
 
+    def get(self, table: str) -> int:
+        return self.positions.get(table, 0)
 
-# comics
+    def set(self, table: str, last_id: int):
+        with self.lock:
+            self.positions[table] = last_id
+            if self.path:
+                with open(self.path + ".tmp", "w") as f:
+                    json.dump(self.positions, f)
+                os.replace(self.path + ".tmp", self.path)
 
-cursor.execute("SELECT id, name FROM genres")
-genre_map = dict(cursor.fetchall())
 
-cursor.execute("SELECT comic_id, genre_id FROM comic_genres")
-comic_genres = {}
-for comic_id, genre_id in cursor.fetchall():
-    comic_genres.setdefault(comic_id, []).append(genre_map[genre_id])
+class Writer:
+    """
+    Writes batches of upserts on `workers` threads through a bounded queue, so
+    reading never runs more than a few batches ahead of Mongo.
+    """
 
-cursor.execute("SELECT id, slug, title, url, description, publisher, image FROM comics")
-docs = []
-for row in cursor.fetchall():
-    comic_id, *data = row
+    def __init__(self, checkpoint: Checkpoint, workers: int = 1):
+        self.checkpoint = checkpoint
+        self.queue = queue.Queue(maxsize=workers * 2)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.error = None
+        self.stats = {}
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
 
-    doc = dict(zip(['id', 'slug', 'title', 'url', 'description', 'publisher', 'image'], row))
-    doc['genres'] = comic_genres.get(comic_id, [])
-    doc.pop('id')
-    docs.append(doc)
+    def submit(self, table: str, collection, operations: list, first_id: int, last_id: int):
+        if self.error:
+            raise self.error
+        with self.lock:
+            self.pending.setdefault(table, []).append([first_id, last_id, False])
+        self.queue.put((table, collection, operations, first_id))
 
-# Insert in batches
-batch_size = 1000
-for i in range(0, len(docs), batch_size):
-    db.comics.insert_many(docs[i:i + batch_size])
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            table, collection, operations, first_id = item
+            try:
+                result = collection.bulk_write(operations, ordered=False)
+                self._done(table, first_id, len(operations), result)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
 
+    def _done(self, table: str, first_id: int, rows: int, result):
+        with self.lock:
+            stats = self.stats.setdefault(table, {"rows": 0, "upserted": 0, "modified": 0})
+            stats["rows"] += rows
+            stats["upserted"] += result.upserted_count
+            stats["modified"] += result.modified_count
 
-# chapters
-def batch_generator(cursor, size=1000):
-    while True:
-        rows = cursor.fetchmany(size)
-        if not rows:
-            break
-        yield rows
+            batches = self.pending[table]
+            for batch in batches:
+                if batch[0] == first_id:
+                    batch[2] = True
+            # advance the checkpoint over the contiguous run of finished batches
+            last_id = None
+            while batches and batches[0][2]:
+                last_id = batches.pop(0)[1]
+        if last_id is not None:
+            self.checkpoint.set(table, last_id)
+
+    def close(self):
+        self.queue.join()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.error:
+            raise self.error
+
+
+class Progress:
+    def __init__(self, every: int = 50000):
+        self.every = every
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.next_report = every
+
+    def add(self, table: str, rows: int):
+        self.rows += rows
+        if self.rows >= self.next_report:
+            elapsed = time.perf_counter() - self.started
+            print(f"[PROGRESS] {table}: {self.rows} rows, {self.rows / elapsed:.0f} rows/s")
+            self.next_report += self.every
+
+
+def migrate_genres(conn, db, writer, checkpoint, progress, batch_size):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name FROM genres WHERE id > ? ORDER BY id", (checkpoint.get("genres"),))
+    for rows in batch_generator(cursor, batch_size):
+        operations = [UpdateOne({'name': name}, {'$set': {'name': name}}, upsert=True) for _, name in rows]
+        writer.submit("genres", db.genres, operations, rows[0][0], rows[-1][0])
+        progress.add("genres", len(rows))
+
+
+def migrate_comics(conn, db, writer, checkpoint, progress, batch_size):
+    cursor = conn.cursor()
+    genres_cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, slug, title, url, description, publisher, image FROM comics WHERE id > ? ORDER BY id",
+        (checkpoint.get("comics"),)
+    )
+    for rows in batch_generator(cursor, batch_size):
+        ids = [row[0] for row in rows]
+        comic_genres = {}
+        for offset in range(0, len(ids), 500):
+            chunk = ids[offset:offset + 500]
+            genres_cursor.execute(
+                "SELECT cg.comic_id, g.name FROM comic_genres cg JOIN genres g ON g.id = cg.genre_id "
+                f"WHERE cg.comic_id IN ({','.join('?' * len(chunk))}) ORDER BY cg.comic_id, cg.rowid",
+                chunk
+            )
+            for comic_id, name in genres_cursor.fetchall():
+                comic_genres.setdefault(comic_id, []).append(name)
+
+        operations = []
+        for comic_id, *data in rows:
+            doc = dict(zip(COMIC_FIELDS, data))
+            doc['genres'] = comic_genres.get(comic_id, [])
+            operations.append(UpdateOne({'slug': doc['slug']}, {'$set': doc}, upsert=True))
+        writer.submit("comics", db.comics, operations, rows[0][0], rows[-1][0])
+        progress.add("comics", len(rows))
+
+
+def migrate_chapters(conn, db, writer, checkpoint, progress, batch_size):
+    cursor = conn.cursor()
+    # numbered over the whole table, so a resumed import gives the same indexes
+    cursor.execute(
+        "SELECT * FROM (SELECT ch.id, c.slug, ch.slug, ch.name, ch.url, "
+        "ROW_NUMBER() OVER (PARTITION BY ch.comic_id ORDER BY ch.id DESC) - 1 FROM chapters ch "
+        "LEFT JOIN comics c ON c.id = ch.comic_id) WHERE id > ? ORDER BY id",
+        (checkpoint.get("chapters"),)
+    )
+    for rows in batch_generator(cursor, batch_size):
+        operations = [
+            UpdateOne({'slug': slug}, {'$set': {
+                "comic_slug": comic_slug,
+                "slug": slug,
+                "name": name,
+                "url": url,
+                "index": index
+            }}, upsert=True)
+            for _, comic_slug, slug, name, url, index in rows
+        ]
+        writer.submit("chapters", db.chapters, operations, rows[0][0], rows[-1][0])
+        progress.add("chapters", len(rows))
+
+
+def migrate(conn, db, workers=1, batch_size=1000, checkpoint=None, progress_every=50000):
+    checkpoint = checkpoint or Checkpoint()
+    progress = Progress(progress_every)
+    stats = {}
+
+    db.genres.create_index('name')
+    db.comics.create_index('slug')
+    db.chapters.create_index('slug')
+    db.chapters.create_index('comic_slug')
+    db.chapters.create_index([('comic_slug', ASCENDING), ('index', DESCENDING)])
+
+    # genres and comics go first so a resumed run never sees chapters without them
+    for step in (migrate_genres, migrate_comics, migrate_chapters):
+        writer = Writer(checkpoint, workers)
+        try:
+            step(conn, db, writer, checkpoint, progress, batch_size)
+        finally:
+            writer.close()
+        for table, table_stats in writer.stats.items():
+            print(f"[DONE] {table}: {table_stats['rows']} rows, "
+                  f"{table_stats['upserted']} inserted, {table_stats['modified']} updated")
+        stats.update(writer.stats)
+
+    genre_stats.rebuild(db)
+    elapsed = time.perf_counter() - progress.started
+    print(f"Migrated {progress.rows} rows in {elapsed:.1f}s ({progress.rows / max(elapsed, 1e-9):.0f} rows/s)")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.getenv("DATABASE_PATH"), help="SQLite file, defaults to DATABASE_PATH")
+    parser.add_argument("--workers", type=int, default=1, help="parallel writer threads")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", help="file to record progress in, enables resuming")
+    args = parser.parse_args()
 
+    if not args.database:
+        raise Exception("Please set DATABASE_PATH at .env to run this script")
 
-cursor.execute("SELECT id, slug FROM comics")
-comic_slug_map = dict(cursor.fetchall())
-cursor.execute("SELECT id, comic_id, slug, name, url FROM chapters")
-for rows in batch_generator(cursor):
-    docs = []
-    for row in rows:
-        chap_id, comic_id, slug, name, url = row
-        docs.append({
-            "comic_slug": comic_slug_map.get(comic_id),
-            "slug": slug,
-            "name": name,
-            "url": url
-        })
-    db.chapters.insert_many(docs)
+    conn = sqlite3.connect(args.database)
+    client = MongoClient(
+        host=os.getenv("MONGO_HOST"),
+        port=int(os.getenv("MONGO_PORT", "27017"))
+    )
+    migrate(conn, client.comixie, args.workers, args.batch_size, Checkpoint(args.checkpoint))
+    conn.close()
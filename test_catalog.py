@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import catalog
+from testing import harness, needs_harness
+
+
+def comic(n: int, **fields) -> dict:
+    return {
+        "slug": f"comic-{n}",
+        "_id": f"id-{n}",
+        "url": f"https://example.com/category/comic-{n}/",
+        "title": f"Comic {n}",
+        "publisher": "DC",
+        "image": f"https://example.com/{n}.jpg",
+        "description": "Gotham’s finest",
+        "genres": ["Action", "Superhero"] if n % 2 else ["Drama"],
+        "image_placeholder": f"data:image/webp;base64,{n}" if n % 3 else None,
+        "image_width": 200 if n % 3 else None,
+        "image_height": 300 if n % 3 else None,
+        **fields,
+    }
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "catalog.snapshot")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        comics = [comic(n) for n in range(5000)] + [comic(5000, publisher=None, genres=None)]
+        self.assertEqual(catalog.write(self.path, comics), 5001)
+
+        snapshot = catalog.Snapshot(self.path)
+        for item in (comics[0], comics[4321], comics[-1]):
+            self.assertEqual(snapshot.get(item["slug"]), item)
+        self.assertIsNone(snapshot.get("comic-5001"))
+        self.assertEqual(sorted(snapshot.genres), ["Action", "Drama", "Superhero"])
+
+    def test_rebuild_swaps_file_under_readers(self):
+        catalog.write(self.path, [comic(1)])
+        old = catalog.Snapshot(self.path)
+        catalog.write(self.path, [comic(1, title="Renamed"), comic(2)])
+
+        # the old mapping stays readable after the rename
+        self.assertEqual(old.get("comic-1")["title"], "Comic 1")
+        self.assertEqual(catalog.Snapshot(self.path).get("comic-1")["title"], "Renamed")
+        self.assertEqual(os.listdir(self.directory.name), ["catalog.snapshot"])
+
+    @needs_harness
+    def test_refresh_builds_once_and_maps(self):
+        database, store = harness.connect_mongo(), harness.connect_redis()
+        database.comics.insert_many([{k: v for k, v in comic(n).items() if k != "_id"} for n in range(3)])
+        first = catalog.CatalogSnapshot(database, store, path=self.path, interval=600)
+        second = catalog.CatalogSnapshot(database, store, path=self.path, interval=600)
+
+        self.assertIsNone(first.current)
+        self.assertTrue(first.refresh())
+        self.assertFalse(second.refresh())  # fresh enough
+        self.assertTrue(second.load())
+        self.assertFalse(second.load())
+        self.assertEqual(second.current.get("comic-2")["title"], "Comic 2")
+        self.assertEqual(second.current.get("comic-2")["_id"], str(database.comics.find_one({"slug": "comic-2"})["_id"]))
+
+        store.set(f"catalog:rebuild-lock:{self.path}", "another worker")
+        os.utime(self.path, (0, 0))
+        self.assertFalse(first.refresh())
+
+
+if __name__ == '__main__':
+    unittest.main()
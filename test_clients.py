@@ -0,0 +1,64 @@
+import os
+import unittest
+
+import clients
+
+
+class ClientsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+        self.saved = dict(clients.FACTORIES)
+        clients.FACTORIES["widget"] = lambda: self.created.append(object()) or self.created[-1]
+        clients.reset()
+
+    def tearDown(self):
+        clients.FACTORIES.clear()
+        clients.FACTORIES.update(self.saved)
+        clients._overrides.pop("widget", None)
+        clients.reset()
+
+    def test_created_once_on_first_use(self):
+        clients.Lazy("widget")
+        self.assertEqual(self.created, [])
+        self.assertIs(clients.get("widget"), clients.get("widget"))
+        self.assertEqual(len(self.created), 1)
+
+    def test_factory_can_use_other_clients(self):
+        clients.FACTORIES["wrapper"] = lambda: ("wrapped", clients.get("widget"))
+        self.assertIs(clients.get("wrapper")[1], clients.get("widget"))
+
+    def test_override_survives_reset(self):
+        double = {"key": "value"}
+        clients.override(widget=double)
+        clients.reset()
+        self.assertEqual(clients.Lazy("widget")["key"], "value")
+        self.assertEqual(self.created, [])
+
+    def test_override_is_not_truth_tested(self):
+        class Database:  # like pymongo's, which raises on bool()
+            def __bool__(self):
+                raise NotImplementedError
+
+        double = Database()
+        clients.override(widget=double)
+        self.assertIs(clients.get("widget"), double)
+        self.assertEqual(self.created, [])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_forked_child_creates_its_own(self):
+        parent = clients.get("widget")
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            os.write(write, b"1" if clients.get("widget") is not parent else b"0")
+            os._exit(0)
+        os.close(write)
+        with os.fdopen(read, "rb") as f:
+            self.assertEqual(f.read(), b"1")
+        os.waitpid(pid, 0)
+        self.assertIs(clients.get("widget"), parent)
+
+
+if __name__ == '__main__':
+    unittest.main()
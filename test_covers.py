@@ -0,0 +1,72 @@
+import base64
+import io
+import unittest
+
+from PIL import Image
+
+import covers
+import db
+from testing import harness, needs_harness
+
+
+def jpeg(size=(400, 600), color=(200, 30, 30)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class PlaceholderTestCase(unittest.TestCase):
+    def test_tiny_webp_with_cover_size(self):
+        fields = covers.placeholder(jpeg((400, 600)))
+        self.assertEqual((fields["image_width"], fields["image_height"]), (400, 600))
+
+        prefix = "data:image/webp;base64,"
+        self.assertTrue(fields["image_placeholder"].startswith(prefix))
+        self.assertLess(len(fields["image_placeholder"]), 300)
+        with Image.open(io.BytesIO(base64.b64decode(fields["image_placeholder"][len(prefix):]))) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(max(image.size), covers.PLACEHOLDER_SIZE)
+
+
+@needs_harness
+class CoverPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.saved = db.db, db.catalog_snapshot.enabled
+        db.db, db.catalog_snapshot.enabled = harness.connect_mongo(), False
+        db.db.comics.insert_many([{"slug": f"comic-{n}", "url": f"https://example.com/comic-{n}/",
+                                   "image": f"https://example.com/{n}.jpg"} for n in range(7)]
+                                 + [{"slug": "no-cover", "url": "https://example.com/no-cover/", "image": None}])
+        self.covers = {f"https://example.com/{n}.jpg": jpeg() for n in range(7) if n != 3}
+        self.fetched = []
+        self.pipeline = covers.CoverPipeline(db.comics, self.fetch, batch_size=3, concurrency=2)
+
+    def tearDown(self):
+        db.db, db.catalog_snapshot.enabled = self.saved
+
+    def fetch(self, url: str) -> bytes:
+        self.fetched.append(url)
+        if url not in self.covers:
+            raise IOError("404")
+        return self.covers[url]
+
+    def test_processes_catalog_then_only_new_comics(self):
+        self.assertEqual(self.pipeline.run()["processed"], 7)
+        comic = db.comics.get("comic-1")
+        self.assertEqual((comic.image_width, comic.image_height), (400, 600))
+        self.assertIsNotNone(comic.image_placeholder)
+        self.assertIsNone(db.comics.get("comic-3").image_placeholder)
+
+        self.fetched.clear()
+        self.assertEqual(self.pipeline.run()["processed"], 0)
+        db.comics.create(db.Comic(slug="new", url="https://example.com/new/", image="https://example.com/0.jpg"))
+        self.assertEqual(self.pipeline.run()["processed"], 1)
+        self.assertEqual(self.fetched, ["https://example.com/0.jpg"])
+
+        self.covers["https://example.com/3.jpg"] = jpeg((300, 450))
+        result = self.pipeline.run(retry_failed=True)
+        self.assertEqual((result["processed"], result["failed"]), (1, 0))
+        self.assertEqual(db.comics.get("comic-3").image_width, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
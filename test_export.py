@@ -0,0 +1,131 @@
+import io
+import re
+import threading
+import time
+import unittest
+import zipfile
+
+from PIL import Image
+
+import clients
+import export
+from db import Chapter
+from testing import harness, needs_harness
+
+
+def image(size=(40, 60), format="JPEG", color=(200, 40, 40)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def chapters(count, pages):
+    return [Chapter(f"c-{n}", "c", f"C #{n}", f"/c-{n}/", images=[f"/c-{n}/{p}.jpg" for p in range(pages)])
+            for n in range(count)]
+
+
+class FetchPagesTestCase(unittest.TestCase):
+    def test_keeps_reading_order_and_bounds_fetching(self):
+        lock, state = threading.Lock(), {"outstanding": 0, "peak": 0}
+
+        def fetch(url):
+            with lock:
+                state["outstanding"] += 1
+                state["peak"] = max(state["peak"], state["outstanding"])
+            # later pages of a chapter come back first
+            time.sleep(0.001 * (8 - int(url.rsplit("/", 1)[1].split(".")[0])))
+            return url.encode()
+
+        urls = []
+        for page in export.fetch_pages(chapters(5, 8), lambda slug: [], fetch, concurrency=3, window=6):
+            with lock:
+                state["outstanding"] -= 1
+            urls.append(page.content.decode())
+
+        self.assertEqual(urls, [f"/c-{n}/{p}.jpg" for n in range(5) for p in range(8)])
+        self.assertLessEqual(state["peak"], 6)
+
+    def test_resolves_unread_chapters_and_skips_failures(self):
+        items = chapters(3, 2)
+        items[1].images = None
+        items[2].images = None
+
+        def resolve(slug):
+            if slug == "c-2":
+                raise Exception("upstream down")
+            return [f"/{slug}/new.jpg"]
+
+        def fetch(url):
+            if url == "/c-0/1.jpg":
+                raise Exception("gone")
+            return b"x"
+
+        pages = [(page.chapter_number, page.url, page.content)
+                 for page in export.fetch_pages(items, resolve, fetch, start=7)]
+        self.assertEqual(pages, [(7, "/c-0/0.jpg", b"x"), (7, "/c-0/1.jpg", None), (8, "/c-1/new.jpg", b"x")])
+
+
+class WriterTestCase(unittest.TestCase):
+    def pages(self, *contents):
+        chapter = Chapter("saga-001", "saga", "Saga #1", "/saga-001/")
+        return [export.Page(chapter, 1, number, f"/saga-001/{number}.jpg", content)
+                for number, content in enumerate(contents, 1)]
+
+    def test_cbz_stores_original_bytes(self):
+        jpeg, png = image(), image(format="PNG")
+        data = b"".join(export.cbz(self.pages(jpeg, None, png)))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(), ["001 Saga #1/001.jpg", "001 Saga #1/003.png"])
+            self.assertEqual({info.compress_type for info in archive.infolist()}, {zipfile.ZIP_STORED})
+            self.assertEqual(archive.read("001 Saga #1/001.jpg"), jpeg)
+            self.assertEqual(archive.read("001 Saga #1/003.png"), png)
+            self.assertIsNone(archive.testzip())
+
+    def test_pdf_embeds_jpeg_and_converts_others(self):
+        jpeg = image(size=(60, 40))
+        data = b"".join(export.pdf(self.pages(jpeg, image(format="PNG"), b"not an image")))
+
+        self.assertTrue(data.startswith(b"%PDF-1.4"))
+        self.assertIn(jpeg, data)
+        self.assertEqual(data.count(b"/Type /Page "), 2)
+        self.assertIn(b"/Count 2", data)
+
+        # every cross-reference entry points at its object
+        xref_at = int(re.search(rb"startxref\n(\d+)", data).group(1))
+        entries = re.findall(rb"(\d{10}) 00000 n", data[xref_at:])
+        for number, offset in enumerate(entries, 1):
+            self.assertTrue(data[int(offset):].startswith(b"%d 0 obj" % number))
+
+
+@needs_harness
+class ExportPdfRouteTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.main, cls.site, cls.server, cls.known = harness.start(comics=2, chapters=2, pages=3,
+                                                                  image_size=(40, 60))
+        cls.client = cls.main.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        clients._overrides.clear()
+        clients.reset()
+
+    def test_independent_of_read_cache_and_client_headers(self):
+        slug = self.known[0]["chapters"][0]
+        etag = self.client.get(f"/api/read/{slug}", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+        for headers in ({"Accept-Encoding": "gzip"}, {"Accept-Encoding": "gzip, br", "If-None-Match": etag}):
+            response = self.client.post(f"/api/export-pdf/{slug}", headers=headers)
+            self.assertEqual(response.status_code, 200, response.data[:200])
+            self.assertTrue(response.data.startswith(b"%PDF"))
+
+    def test_scrapes_chapters_without_images_and_404s_unknown_ones(self):
+        unread = self.known[0]["chapters"][1]
+        response = self.client.post(f"/api/export-pdf/{unread}", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200, response.data[:200])
+        self.assertEqual(self.client.post("/api/export-pdf/no-such-chapter").status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import unittest
+
+import testing  # noqa: F401  (puts bench/ on sys.path for legacy_extract)
+import extract
+import legacy_extract
+
+# Synthetic pages shaped like readallcomics' markup, as bench/standin.py serves it, not
+# recordings of the live site; the *-malformed.html variants add the broken markup
+# (unclosed and stray tags, blocks inside <p>) where lxml and html.parser build different trees.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class ExtractParityTestCase(unittest.TestCase):
+    """extract.py must return exactly what the html.parser scrapers returned"""
+
+    def test_home(self):
+        content = fixture("home.html")
+        comics = extract.home(content)
+        self.assertEqual([{k: v for k, v in comic.items() if k != 'comic_slug'} for comic in comics],
+                         legacy_extract.home(content))
+
+        slugs = [comic['slug'] for comic in comics]
+        self.assertIn('sam-max-surfin-the-highway-001', slugs)
+        self.assertIn('no-link-class-002', slugs)
+        self.assertNotIn('no-date-001', slugs)
+        self.assertEqual(comics[-2]['comic_slug'], 'sam-max-surfin-the-highway')
+
+    def test_category(self):
+        content = fixture("category.html")
+        details = extract.category(content)
+        self.assertEqual(details, legacy_extract.category(content))
+
+        self.assertEqual(details['title'], 'Comic 00007 & Friends')
+        self.assertTrue(details['description'].startswith('Comic 00007 collects the run &amp; the <i>annual</i>.'))
+        self.assertEqual(details['chapters'][0]['name'], 'Comic 00007#008')
+
+    def test_chapter(self):
+        content = fixture("chapter.html")
+        pages = extract.chapter(content)
+        self.assertEqual(pages, legacy_extract.chapter(content))
+        self.assertEqual(len(pages), 22)
+
+    def test_search(self):
+        content = fixture("search.txt")
+        results = extract.search(content)
+        self.assertEqual(results, legacy_extract.search(content))
+        self.assertTrue(results)
+
+    def test_malformed_pages(self):
+        for page in ("home", "category", "chapter"):
+            content = fixture(f"{page}-malformed.html")
+            result = getattr(extract, page)(content)
+            if page == "home":
+                result = [{k: v for k, v in comic.items() if k != 'comic_slug'} for comic in result]
+            self.assertEqual(result, getattr(legacy_extract, page)(content), page)
+
+        # pages inside <p><div class="separator"> and <p><table> are still pages
+        self.assertEqual(extract.chapter(fixture("chapter-malformed.html")), extract.chapter(fixture("chapter.html")))
+        details = extract.category(fixture("category-malformed.html"))
+        self.assertEqual(details['image'], 'https://readallcomics.com/images/comic-00007/cover.jpg')
+        self.assertEqual(len(details['chapters']), 8)
+
+    def test_page_count(self):
+        self.assertEqual(extract.page_count(fixture("home.html")), 5)
+
+    def test_empty_documents(self):
+        self.assertEqual(extract.home(b""), [])
+        self.assertEqual(extract.chapter(b"  "), [])
+        self.assertIsNone(extract.category(b"")["title"])
+
+
+if __name__ == '__main__':
+    unittest.main()
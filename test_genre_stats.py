@@ -0,0 +1,56 @@
+import json
+import unittest
+
+import genre_stats
+from testing import harness, needs_harness
+
+
+@needs_harness
+class GenreStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.database = harness.connect_mongo()
+        self.database.comics.insert_many([
+            {"slug": "a", "genres": ["Action", "Drama"], "image": "a.jpg"},
+            {"slug": "b", "genres": ["Action"], "image": None},
+            {"slug": "c", "genres": None, "image": "c.jpg"},
+        ])
+
+    def stats(self):
+        return {item["_id"]: (item["count"], item["covers"]) for item in self.database.genre_stats.find()}
+
+    def test_rebuild(self):
+        genre_stats.rebuild(self.database)
+        self.assertEqual(self.stats(), {"Action": (2, ["a.jpg"]), "Drama": (1, ["a.jpg"])})
+
+    def test_add_matches_rebuild(self):
+        genre_stats.rebuild(self.database)
+        self.database.comics.insert_one({"slug": "d", "genres": ["Drama", "Horror", "Drama"], "image": "d.jpg"})
+        genre_stats.add(self.database, ["Drama", "Horror", "Drama"], "d.jpg")
+        incremental = self.stats()
+        genre_stats.rebuild(self.database)
+        self.assertEqual(incremental, self.stats())
+
+    def test_add_before_first_build_does_not_replace_the_catalog(self):
+        genre_stats.add(self.database, ["Horror"], "h.jpg")
+        self.assertEqual(self.stats(), {})
+
+        self.database.comics.insert_one({"slug": "h", "genres": ["Horror"], "image": "h.jpg"})
+        catalog = genre_stats.GenreCatalog(self.database, ttl=3600)
+        self.assertEqual([(g["name"], g["count"]) for g in json.loads(catalog.get(stats=True)[0])],
+                         [("Action", 2), ("Drama", 1), ("Horror", 1)])
+
+    def test_catalog_builds_on_first_use_and_keeps_etag_until_invalidated(self):
+        catalog = genre_stats.GenreCatalog(self.database, ttl=3600)
+        body, etag = catalog.get(stats=True)
+        self.assertEqual([(g["name"], g["count"]) for g in json.loads(body)], [("Action", 2), ("Drama", 1)])
+        # what /api/genres always answered, a list of names
+        self.assertEqual(json.loads(catalog.get()[0]), ["Action", "Drama"])
+
+        genre_stats.add(self.database, ["Horror"], None)
+        self.assertEqual(catalog.get(stats=True), (body, etag))
+        catalog.invalidate()
+        self.assertNotEqual(catalog.get(stats=True)[1], etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+
+from flask import Flask, Response, jsonify, stream_with_context
+
+import limits
+from testing import harness, needs_harness
+
+
+@needs_harness
+class TokenBucketTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bucket = limits.TokenBucket(harness.connect_redis(), rate=2, burst=10)
+
+    def test_burst_then_refill(self):
+        self.assertEqual(self.bucket.take("alice", 6, now=100), 0)
+        self.assertEqual(self.bucket.take("alice", 4, now=100), 0)
+        self.assertAlmostEqual(self.bucket.take("alice", 3, now=100), 1.5)
+        # two tokens per second come back
+        self.assertEqual(self.bucket.take("alice", 3, now=101.5), 0)
+        self.assertEqual(self.bucket.take("bob", 10, now=100), 0)
+
+    def test_cost_above_burst_is_never_admitted_on_credit(self):
+        self.assertGreater(self.bucket.take("alice", 11, now=100), 0)
+        self.assertEqual(self.bucket.take("alice", 10, now=100), 0)
+
+
+@needs_harness
+class AdmissionControllerTestCase(unittest.TestCase):
+    def test_limits_cost_across_processes(self):
+        admission = limits.AdmissionController(harness.connect_redis(), max_cost=100)
+        self.assertTrue(admission.enter(60, process="web-1"))
+        self.assertTrue(admission.enter(30, process="web-2"))
+        self.assertFalse(admission.enter(30, process="web-2"))
+        admission.leave(60, process="web-1")
+        self.assertTrue(admission.enter(30, process="web-2"))
+
+
+@needs_harness
+class LimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.store = harness.connect_redis()
+        self.limiter = limits.Limiter(self.store, enabled=True, costs={"export": 30, "listing": 1, "health": 0},
+                                      api_keys={"abuser", "reader"})
+        self.limiter.buckets = limits.TokenBucket(self.store, rate=1, burst=60)
+        self.limiter.admission = limits.AdmissionController(self.store, max_cost=30)
+
+        app = Flask(__name__)
+        for name in ("export", "listing", "health"):
+            app.add_url_rule(f"/{name}", name, lambda: jsonify({}))
+        self.limiter.init_app(app)
+        self.client = app.test_client()
+
+    def test_quota_per_client(self):
+        headers = {"X-API-Key": "abuser"}
+        self.assertEqual(self.client.get("/export", headers=headers).status_code, 200)
+        self.assertEqual(self.client.get("/export", headers=headers).status_code, 200)
+        response = self.client.get("/export", headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 29)
+
+        self.assertEqual(self.client.get("/health", headers=headers).status_code, 200)
+        self.assertEqual(self.client.get("/listing", headers={"X-API-Key": "reader"}).status_code, 200)
+
+    def test_unknown_keys_share_their_address_bucket(self):
+        statuses = [self.client.get("/export", headers={"X-API-Key": f"made-up-{n}"}).status_code for n in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        other = self.client.get("/export", headers={"X-API-Key": "made-up-3"}, environ_base={"REMOTE_ADDR": "10.0.0.2"})
+        self.assertEqual(other.status_code, 200)
+
+    def test_sheds_expensive_requests_while_busy(self):
+        self.limiter.admission.enter(30, process="another-worker")
+        response = self.client.get("/export", headers={"X-API-Key": "reader"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        # cheap requests are not held back
+        self.assertEqual(self.client.get("/listing", headers={"X-API-Key": "reader"}).status_code, 200)
+
+        self.limiter.admission.leave(30, process="another-worker")
+        self.assertEqual(self.client.get("/export", headers={"X-API-Key": "reader"}).status_code, 200)
+        # and the finished request gave its share back
+        self.assertTrue(self.limiter.admission.enter(30, process="another-worker"))
+
+    def test_streamed_export_holds_its_share_until_sent(self):
+        app = Flask(__name__)
+        app.add_url_rule("/export", "export", lambda: Response(stream_with_context(iter([b"PK", b"..."]))))
+        self.limiter.init_app(app)
+
+        response = app.test_client().get("/export", headers={"X-API-Key": "reader"}, buffered=False)
+        self.assertEqual(next(response.response), b"PK")
+        self.assertEqual(self.inflight(), 15)
+        response.close()
+        self.assertEqual(self.inflight(), 0)
+
+    def test_invalid_request_is_refunded(self):
+        app = Flask(__name__)
+        app.add_url_rule("/export", "export", lambda: (jsonify({"error": "bad range"}), 400))
+        self.limiter.init_app(app)
+        client = app.test_client()
+
+        statuses = [client.get("/export", headers={"X-API-Key": "reader"}).status_code for _ in range(5)]
+        self.assertEqual(statuses, [400] * 5)
+        self.assertEqual(self.inflight(), 0)
+
+    def inflight(self) -> int:
+        return sum(int(value) for value in self.store.hvals(self.limiter.admission.key))
+
+    def test_range_export_leaves_room_for_others(self):
+        limiter = limits.Limiter(self.store, enabled=True)
+        limiter.admission = limits.AdmissionController(self.store, max_cost=100)
+        app = Flask(__name__)
+        for name in ("export_comic", "export_pdf", "read_chapter", "get_comic_details"):
+            app.add_url_rule(f"/{name}", name, lambda: jsonify({}))
+        limiter.init_app(app)
+        client = app.test_client()
+
+        # a range export streaming in another worker holds half the budget
+        limiter.admission.enter(50, process="another-worker")
+        for name in ("read_chapter", "get_comic_details", "export_comic"):
+            self.assertEqual(client.get(f"/{name}", headers={"X-API-Key": name}).status_code, 200, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
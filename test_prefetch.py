@@ -0,0 +1,83 @@
+import unittest
+
+from flask import Flask, Response, stream_with_context
+
+from db import Chapter
+from prefetch import Prefetcher
+from testing import FakeStore
+
+
+class FakeChapters:
+    def __init__(self, count):
+        self.items = {f"c-{n}": Chapter(f"c-{n}", "c", f"#{n}", f"/c-{n}/", index=n) for n in range(count)}
+
+    def get(self, slug):
+        return self.items.get(slug)
+
+    def next(self, chapter):
+        return self.items.get(f"c-{chapter.index + 1}")
+
+
+class PrefetcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.chapters = FakeChapters(4)
+        self.resolved = []
+        self.warmed = []
+
+    def resolve(self, slug):
+        self.resolved.append(slug)
+        self.chapters.items[slug].images = [f"/{slug}/{n}.jpg" for n in range(5)]
+        return self.chapters.items[slug].images
+
+    def prefetcher(self, **kwargs):
+        return Prefetcher(self.chapters, FakeStore(), self.resolve, self.warmed.append, enabled=True, **kwargs)
+
+    def test_resolves_next_chapter_and_warms_pages(self):
+        prefetcher = self.prefetcher(pages=2)
+        prefetcher.schedule("c-0")
+        prefetcher.join()
+        self.assertEqual(self.resolved, ["c-1"])
+        self.assertEqual(self.warmed, ["/c-1/0.jpg", "/c-1/1.jpg"])
+
+    def test_skips_known_and_last_chapters(self):
+        prefetcher = self.prefetcher()
+        self.chapters.items["c-1"].images = ["/c-1/0.jpg"]
+        prefetcher.schedule("c-0")
+        prefetcher.schedule("c-3")
+        prefetcher.join()
+        self.assertEqual(self.resolved, [])
+
+    def test_deduplicates_across_processes(self):
+        first, second = self.prefetcher(), self.prefetcher()
+        second.store = first.store
+        # the other process already claimed c-1, e.g. while its resolve is running
+        first.store.set("prefetch:c-1", 1)
+        second.schedule("c-0")
+        second.join()
+        self.assertEqual(self.resolved, [])
+        self.assertEqual(second.snapshot()["duplicate"], 1)
+
+    def test_streamed_response_counts_as_busy_until_sent(self):
+        prefetcher = self.prefetcher()
+        app = Flask(__name__)
+        app.add_url_rule("/export", "export", lambda: Response(stream_with_context(iter([b"PK", b"..."]))))
+        prefetcher.init_app(app)
+
+        response = app.test_client().get("/export", buffered=False)
+        self.assertEqual(next(response.response), b"PK")
+        self.assertEqual(prefetcher.active, 1)
+        response.close()
+        self.assertEqual(prefetcher.active, 0)
+
+    def test_budget(self):
+        prefetcher = self.prefetcher(budget=1)
+        prefetcher.schedule("c-0")
+        prefetcher.join()
+        prefetcher.schedule("c-1")
+        prefetcher.join()
+        self.assertEqual(self.resolved, ["c-1"])
+        self.assertEqual(prefetcher.snapshot()["over_budget"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import threading
+import unittest
+
+from flask import Flask, jsonify
+
+import profiling
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.saved = profiling.PROFILE_SECRET, profiling.PROFILE_DIR
+        profiling.PROFILE_SECRET, profiling.PROFILE_DIR = "secret", tempfile.mkdtemp()
+        self.entered, self.release = threading.Event(), threading.Event()
+
+        app = Flask(__name__)
+        profiling.init_app(app)
+
+        @app.route("/slow")
+        def slow():
+            self.entered.set()
+            self.release.wait(timeout=5)
+            return jsonify({})
+
+        app.add_url_rule("/quick", "quick", lambda: jsonify({}))
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(profiling.PROFILE_DIR)
+        profiling.PROFILE_SECRET, profiling.PROFILE_DIR = self.saved
+
+    def get(self, path: str):
+        return self.client.get(path, headers={"X-Profile": "secret"})
+
+    def test_one_profile_at_a_time(self):
+        slow = []
+        thread = threading.Thread(target=lambda: slow.append(self.get("/slow")))
+        thread.start()
+        self.entered.wait(timeout=5)
+
+        # served unprofiled while the other request holds the process's profiler
+        quick = self.get("/quick")
+        self.release.set()
+        thread.join()
+
+        self.assertEqual((quick.status_code, slow[0].status_code), (200, 200))
+        self.assertNotIn("X-Profile-Id", quick.headers)
+        self.assertIn("X-Profile-Id", slow[0].headers)
+        self.assertIn("X-Profile-Id", self.get("/quick").headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
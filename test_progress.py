@@ -0,0 +1,96 @@
+import os
+import unittest
+
+import clients
+import db
+from testing import harness, needs_harness
+
+
+@needs_harness
+class WriteBehindTestCase(unittest.TestCase):
+    def setUp(self):
+        self.saved = db.db, db.cache
+        db.db, db.cache = harness.connect_mongo(), harness.connect_redis()
+        db.progress.ensure_indexes()
+        db.bookmarks.ensure_indexes()
+        # flush explicitly instead of from the background thread
+        for manager in (db.progress, db.bookmarks):
+            manager.flusher.pid = os.getpid()
+
+    def tearDown(self):
+        db.db, db.cache = self.saved
+        for manager in (db.progress, db.bookmarks):
+            manager.flusher.pid = None
+
+    def test_page_turns_coalesce_into_one_write(self):
+        for page in range(50):
+            db.progress.set(db.Progress("reader", "saga", "saga-001", page))
+        db.progress.set(db.Progress("reader", "batman", "batman-003", 7))
+
+        self.assertEqual(db.db.reading_progress.count_documents({}), 0)
+        self.assertEqual(db.progress.get("reader", "saga").page, 49)
+        self.assertEqual(db.progress.flush(), 2)
+        self.assertEqual(db.progress.flush(), 0)
+        self.assertEqual(db.db.reading_progress.find_one({"comic_slug": "saga"})["page"], 49)
+
+    def test_reads_fall_back_to_mongo(self):
+        db.progress.set(db.Progress("reader", "saga", "saga-002", 3, updated_at=1))
+        db.progress.flush()
+        db.cache.flushdb()
+
+        db.progress.set(db.Progress("reader", "batman", "batman-001", 1, updated_at=2))
+        self.assertEqual([(p.comic_slug, p.page) for p in db.progress.history("reader")],
+                         [("batman", 1), ("saga", 3)])
+
+    def test_interrupted_flush_is_retried(self):
+        db.progress.set(db.Progress("reader", "saga", "saga-001", 5))
+        bulk_write = db.db.reading_progress.bulk_write
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("mongo went away")
+        db.db.reading_progress.bulk_write = fail
+        with self.assertRaises(RuntimeError):
+            db.progress.flush()
+        db.db.reading_progress.bulk_write = bulk_write
+
+        db.progress.set(db.Progress("reader", "saga", "saga-001", 6))
+        self.assertEqual(db.progress.flush(), 1)
+        self.assertEqual(db.db.reading_progress.find_one({"comic_slug": "saga"})["page"], 6)
+
+    def test_bookmarks(self):
+        db.bookmarks.add(db.Bookmark("reader", "saga-001", 4, "saga", "great splash page"))
+        db.bookmarks.add(db.Bookmark("reader", "saga-002", 1, "saga"))
+        db.bookmarks.flush()
+        db.bookmarks.remove("reader", "saga-001", 4)
+        self.assertEqual([b.chapter_slug for b in db.bookmarks.list("reader")], ["saga-002"])
+        db.bookmarks.flush()
+        self.assertEqual([b["chapter_slug"] for b in db.db.bookmarks.find()], ["saga-002"])
+
+
+@needs_harness
+class ProgressRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        main = harness.load_app(harness.Site(comics=1), harness.connect_mongo(), harness.connect_redis())
+        self.client = main.app.test_client()
+        db.progress.flusher.pid = os.getpid()
+
+    def tearDown(self):
+        db.progress.flusher.pid = None
+        clients._overrides.clear()
+        clients.reset()
+
+    def test_page_must_be_a_page_number(self):
+        for page in ("three", None, -1, [2]):
+            progress = self.client.put("/api/users/reader/progress",
+                                       json={"comic_slug": "saga", "chapter_slug": "saga-001", "page": page})
+            bookmark = self.client.post("/api/users/reader/bookmarks", json={"chapter_slug": "saga-001", "page": page})
+            self.assertEqual((progress.status_code, bookmark.status_code), (400, 400), page)
+            self.assertIn("page", progress.json["error"])
+
+        response = self.client.put("/api/users/reader/progress",
+                                   json={"comic_slug": "saga", "chapter_slug": "saga-001", "page": "3"})
+        self.assertEqual(response.json["page"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
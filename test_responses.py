@@ -0,0 +1,86 @@
+import gzip
+import json
+import unittest
+
+from flask import Flask, jsonify
+
+import responses
+from testing import harness, needs_harness
+
+
+@needs_harness
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = responses.ResponseCache(harness.connect_redis())
+        self.builds = []
+        self.data = {"comics": [{"slug": f"comic-{n}", "title": f"Comic {n}"} for n in range(50)]}
+
+        app = Flask(__name__)
+
+        @app.route("/comics")
+        def comics():
+            return self.cache.respond("comics", lambda: self.builds.append(1) or self.data)
+
+        @app.route("/small")
+        def small():
+            return self.cache.respond("small", lambda: {"page": 1})
+
+        @app.route("/missing")
+        def missing():
+            return self.cache.respond("missing", lambda: self.builds.append(1) or (jsonify({"error": "no"}), 404))
+
+        self.client = app.test_client()
+
+    def test_serializes_and_compresses_once(self):
+        plain = self.client.get("/comics")
+        compressed = self.client.get("/comics", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(len(self.builds), 1)
+
+        self.assertEqual(json.loads(plain.data), self.data)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(compressed.data)), self.data)
+        self.assertLess(len(compressed.data), len(plain.data))
+        self.assertEqual(compressed.headers["Vary"], "Accept-Encoding")
+        self.assertNotEqual(plain.headers["ETag"], compressed.headers["ETag"])
+
+    @unittest.skipIf(responses.brotli is None, "brotli is not installed")
+    def test_prefers_brotli(self):
+        response = self.client.get("/comics", headers={"Accept-Encoding": "gzip, deflate, br"})
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(json.loads(responses.brotli.decompress(response.data)), self.data)
+
+    def test_not_modified_until_invalidated(self):
+        etag = self.client.get("/comics", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+        response = self.client.get("/comics", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+        # the gzip tag doesn't stand for the uncompressed body
+        plain = self.client.get("/comics", headers={"If-None-Match": etag})
+        self.assertEqual(plain.status_code, 200)
+        self.assertNotEqual(plain.headers["ETag"], etag)
+
+        self.data = {"comics": []}
+        self.cache.invalidate("comics")
+        response = self.client.get("/comics", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {"comics": []})
+        self.assertEqual(len(self.builds), 2)
+
+    def test_small_bodies_and_errors(self):
+        response = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(self.client.get("/small", headers={"Accept-Encoding": "gzip"}).json, {"page": 1})
+        revalidated = self.client.get("/small", headers={"Accept-Encoding": "gzip",
+                                                         "If-None-Match": response.headers["ETag"]})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.headers["ETag"], response.headers["ETag"])
+
+        for _ in range(2):
+            self.assertEqual(self.client.get("/missing").status_code, 404)
+        self.assertEqual(len(self.builds), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
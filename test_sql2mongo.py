@@ -0,0 +1,46 @@
+import sqlite3
+import unittest
+
+import db
+import sql2mongo
+from testing import harness, needs_harness
+
+
+@needs_harness
+class MigrateChaptersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.executescript("""
+            CREATE TABLE genres (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE comics (id INTEGER PRIMARY KEY, slug TEXT, title TEXT, url TEXT,
+                                 description TEXT, publisher TEXT, image TEXT);
+            CREATE TABLE comic_genres (comic_id INTEGER, genre_id INTEGER);
+            CREATE TABLE chapters (id INTEGER PRIMARY KEY, comic_id INTEGER, slug TEXT, name TEXT, url TEXT);
+        """)
+        self.conn.executemany("INSERT INTO comics (id, slug) VALUES (?, ?)", [(1, "alpha"), (2, "beta")])
+        # scraped from category pages, newest first, comics interleaved
+        self.conn.executemany("INSERT INTO chapters VALUES (?, ?, ?, '', '')", [
+            (1, 1, "alpha-003"), (2, 1, "alpha-002"), (3, 2, "beta-002"), (4, 1, "alpha-001"), (5, 2, "beta-001"),
+        ])
+        self.saved = db.db, db.catalog_snapshot.enabled
+        db.db, db.catalog_snapshot.enabled = harness.connect_mongo(), False
+
+    def tearDown(self):
+        db.db, db.catalog_snapshot.enabled = self.saved
+        self.conn.close()
+
+    def test_reading_order_comes_from_index(self):
+        checkpoint = sql2mongo.Checkpoint()
+        checkpoint.set("chapters", 2)  # a resumed import numbers the rest the same way
+        sql2mongo.migrate(self.conn, db.db, batch_size=2, checkpoint=checkpoint)
+        sql2mongo.migrate(self.conn, db.db, batch_size=2)
+
+        self.assertEqual([chapter.slug for chapter in db.chapters.list("alpha")],
+                         ["alpha-001", "alpha-002", "alpha-003"])
+        self.assertEqual(db.chapters.next(db.chapters.get("alpha-001")).slug, "alpha-002")
+        self.assertEqual(db.chapters.next(db.chapters.get("beta-001")).slug, "beta-002")
+        self.assertIsNone(db.chapters.next(db.chapters.get("alpha-003")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import updates
+from testing import harness, needs_harness
+from upstream import Fetched
+
+
+def post(comic_slug: str, number: int) -> dict:
+    slug = f"{comic_slug}-{number:03d}"
+    return {
+        'url': f"https://example.com/{slug}/",
+        'slug': slug,
+        'comic_slug': comic_slug,
+        'image': f"https://example.com/images/{comic_slug}.jpg",
+        'name': f"{comic_slug} #{number:03d}",
+        'date': "July 1, 2025"
+    }
+
+
+class FakeUpstream:
+    def __init__(self, posts, per_page=3):
+        self.posts = posts
+        self.per_page = per_page
+        self.fetched = []
+
+    def fetch(self, url, parse, page_type="page", **kwargs):
+        page = int(url.rstrip("/").split("/")[-1])
+        self.fetched.append(page)
+        entries = self.posts[(page - 1) * self.per_page:page * self.per_page]
+        return Fetched(200, entries) if entries else Fetched(404)
+
+
+@needs_harness
+class UpdateDetectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.database = harness.connect_mongo()
+        self.database.chapters.insert_many([
+            {"slug": f"alpha-{n:03d}", "comic_slug": "alpha", "name": "", "url": "", "index": n - 1}
+            for n in range(1, 6)
+        ] + [{"slug": "beta-001", "comic_slug": "beta", "name": "", "url": ""}])
+        # newest first, like the upstream listing
+        self.upstream = FakeUpstream([post("beta", 2), post("alpha", 7), post("alpha", 6),
+                                      post("alpha", 5), post("alpha", 4), post("beta", 1)])
+        self.detector = updates.UpdateDetector(self.upstream, self.database, "https://example.com")
+        self.detector.ensure_indexes()
+
+    def test_poll_records_only_new_chapters(self):
+        self.assertEqual(self.detector.poll()["new_chapters"], 3)
+        # stops at the first page with nothing new
+        self.assertEqual(self.upstream.fetched, [1, 2])
+
+        alpha = {c["slug"]: c.get("index") for c in self.database.chapters.find({"comic_slug": "alpha"})}
+        self.assertEqual(alpha["alpha-006"], 5)
+        self.assertEqual(alpha["alpha-007"], 6)
+        self.assertNotIn("index", self.database.chapters.find_one({"slug": "beta-002"}))
+
+        feed = updates.feed(self.database)
+        self.assertEqual([u["chapter_slug"] for u in feed["updates"]], ["alpha-006", "alpha-007", "beta-002"])
+        self.assertEqual(feed["cursor"], 3)
+
+    def test_second_poll_is_a_noop(self):
+        self.detector.poll()
+        self.upstream.fetched = []
+        self.assertEqual(self.detector.poll()["new_chapters"], 0)
+        self.assertEqual(self.upstream.fetched, [1])
+        self.assertEqual(updates.feed(self.database, since=3), {"cursor": 3, "updates": [], "has_more": False})
+
+    def test_feed_filters_by_comic_and_pages(self):
+        self.detector.poll()
+        first = updates.feed(self.database, comics=["alpha"], limit=1)
+        self.assertEqual([u["chapter_slug"] for u in first["updates"]], ["alpha-006"])
+        self.assertTrue(first["has_more"])
+        rest = updates.feed(self.database, since=first["cursor"], comics=["alpha"], limit=1)
+        self.assertEqual([u["chapter_slug"] for u in rest["updates"]], ["alpha-007"])
+        self.assertFalse(rest["has_more"])
+
+
+if __name__ == '__main__':
+    unittest.main()
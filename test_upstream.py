@@ -0,0 +1,104 @@
+import unittest
+
+from testing import FakeStore
+from upstream import UpstreamCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, body=b"<html>v1</html>", etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.sent = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent.append(headers or {})
+        if self.etag and (headers or {}).get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.body, {"ETag": self.etag} if self.etag else {})
+
+
+class UpstreamCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def parse(self, content):
+        self.calls += 1
+        return {"body": content.decode()}
+
+    def test_not_modified_skips_parse(self):
+        session = FakeSession()
+        cache = UpstreamCache(session, FakeStore())
+
+        first = cache.fetch("http://upstream/a/", self.parse)
+        second = cache.fetch("http://upstream/a/", self.parse)
+
+        self.assertEqual(first.data, second.data)
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(session.sent[1]["If-None-Match"], '"v1"')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.stats.not_modified, 1)
+        self.assertEqual(cache.stats.bytes_saved, len(session.body))
+
+    def test_identical_body_skips_parse(self):
+        session = FakeSession(etag="")
+        cache = UpstreamCache(session, FakeStore())
+
+        cache.fetch("http://upstream/a/", self.parse)
+        fetched = cache.fetch("http://upstream/a/", self.parse)
+
+        self.assertTrue(fetched.cached)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.stats.same_hash, 1)
+
+    def test_changed_body_is_parsed_again(self):
+        session = FakeSession(etag="")
+        cache = UpstreamCache(session, FakeStore())
+
+        cache.fetch("http://upstream/a/", self.parse)
+        session.body = b"<html>v2</html>"
+        fetched = cache.fetch("http://upstream/a/", self.parse)
+
+        self.assertEqual(fetched.data, {"body": "<html>v2</html>"})
+        self.assertEqual(self.calls, 2)
+
+    def test_error_status_is_not_cached(self):
+        session = FakeSession()
+        session.get = lambda url, headers=None, **kwargs: FakeResponse(404, b"missing")
+        store = FakeStore()
+        cache = UpstreamCache(session, store)
+
+        fetched = cache.fetch("http://upstream/missing/", self.parse)
+
+        self.assertEqual(fetched.status_code, 404)
+        self.assertIsNone(fetched.data)
+        self.assertEqual(store.data, {})
+
+    def test_unavailable_store_fetches_and_parses(self):
+        class DownStore(FakeStore):
+            def hgetall(self, key):
+                raise ConnectionError("redis is down")
+
+            hset = expire = hgetall
+
+        session = FakeSession()
+        cache = UpstreamCache(session, DownStore())
+
+        first = cache.fetch("http://upstream/a/", self.parse)
+        second = cache.fetch("http://upstream/a/", self.parse)
+
+        self.assertEqual((first.status_code, first.data), (200, {"body": "<html>v1</html>"}))
+        self.assertEqual(second.data, first.data)
+        self.assertNotIn("If-None-Match", session.sent[1])
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Shared by the test modules: the bench harness and a Redis double.
+
+The harness (bench/harness.py) runs the app against mongomock, fakeredis and
+the upstream stand-in, all from bench/requirements.txt. Without them
+`harness` is None and the tests that need it are skipped.
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench"))
+
+try:
+    import harness
+except ImportError:  # mongomock and friends come from bench/requirements.txt
+    harness = None
+
+needs_harness = unittest.skipIf(harness is None, "needs bench/requirements.txt")
+
+
+class FakeStore:
+    """The Redis commands UpstreamCache and Prefetcher use, kept in a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+    def hgetall(self, key):
+        return {k.encode(): str(v).encode() for k, v in self.data.get(key, {}).items()}
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, key):
+        self.data.pop(key, None)
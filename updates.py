@@ -0,0 +1,162 @@
+"""
+Detects new chapters from the upstream home listing.
+
+The listing shows the latest chapters first. A poll walks it from page 1,
+looks the posted chapter slugs up with one query per page and stops at the
+first page with nothing new, so it costs a conditional request for page 1
+plus work proportional to the new chapters, not to the catalog. New chapters
+are attached to their comic and appended to the `updates` change log, which
+/api/updates pages through by sequence number. Cached /api/details
+responses of those comics are dropped.
+
+    python updates.py --interval 300
+"""
+import argparse
+import json
+import os
+import time
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+import extract
+
+UPSTREAM_URL = (os.getenv("UPSTREAM_URL") or "https://readallcomics.com").rstrip("/")
+
+
+class UpdateDetector:
+    def __init__(self, upstream, database, base_url: str = UPSTREAM_URL, max_pages: int = 10, responses=None):
+        self.upstream = upstream
+        self.database = database
+        self.base_url = base_url.rstrip("/")
+        self.max_pages = max_pages
+        self.responses = responses
+
+    def ensure_indexes(self):
+        self.database.chapters.create_index("slug")
+        self.database.chapters.create_index([("comic_slug", ASCENDING), ("index", DESCENDING)])
+        self.database.updates.create_index("seq")
+        self.database.updates.create_index("chapter_slug", unique=True)
+        self.database.updates.create_index([("comic_slug", ASCENDING), ("seq", ASCENDING)])
+
+    def poll(self) -> dict:
+        started = time.perf_counter()
+        found, seen = [], set()
+        pages = 0
+
+        for page in range(1, self.max_pages + 1):
+            # same URL as /api/home so both share the conditional-fetch cache entry
+            fetched = self.upstream.fetch(f"{self.base_url}/page/{page}/", extract.home, "home")
+            pages += 1
+            if fetched.status_code != 200:
+                break
+            entries = [entry for entry in fetched.data or [] if entry["comic_slug"] and entry["slug"] not in seen]
+            if not entries:
+                break
+            known = {chapter["slug"] for chapter in self.database.chapters.find(
+                {"slug": {"$in": [entry["slug"] for entry in entries]}}, {"slug": 1})}
+            new = [entry for entry in entries if entry["slug"] not in known]
+            if not new:
+                break
+            found.extend(new)
+            seen.update(entry["slug"] for entry in new)
+
+        # the listing is newest first, the change log oldest first
+        recorded = self.record(list(reversed(found))) if found else 0
+        return {
+            "pages": pages,
+            "new_chapters": recorded,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def next_indexes(self, comic_slugs: List[str]) -> dict:
+        """Next reading-order index per comic, for comics whose chapters carry one"""
+        last = self.database.chapters.aggregate([
+            {"$match": {"comic_slug": {"$in": comic_slugs}, "index": {"$exists": True}}},
+            {"$group": {"_id": "$comic_slug", "index": {"$max": "$index"}}},
+        ])
+        return {item["_id"]: item["index"] + 1 for item in last}
+
+    def record(self, entries: List[dict]) -> int:
+        counter = self.database.counters.find_one_and_update(
+            {"_id": "updates"}, {"$inc": {"seq": len(entries)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        first_seq = counter["seq"] - len(entries) + 1
+        detected_at = time.time()
+
+        # the log is written before the chapters: if we die in between, the next
+        # poll still sees the chapters as new and the log upserts are no-ops
+        self.database.updates.bulk_write([
+            UpdateOne({"chapter_slug": entry["slug"]}, {"$setOnInsert": {
+                "seq": first_seq + n,
+                "comic_slug": entry["comic_slug"],
+                "chapter_slug": entry["slug"],
+                "name": entry["name"],
+                "url": entry["url"],
+                "image": entry["image"],
+                "date": entry["date"],
+                "detected_at": detected_at,
+            }}, upsert=True)
+            for n, entry in enumerate(entries)
+        ], ordered=False)
+
+        comic_slugs = list(dict.fromkeys(entry["comic_slug"] for entry in entries))
+        indexes = self.next_indexes(comic_slugs)
+        chapters = []
+        for entry in entries:
+            chapter = {
+                "slug": entry["slug"],
+                "comic_slug": entry["comic_slug"],
+                "name": entry["name"],
+                "url": entry["url"],
+            }
+            if entry["comic_slug"] in indexes:
+                chapter["index"] = indexes[entry["comic_slug"]]
+                indexes[entry["comic_slug"]] += 1
+            chapters.append(UpdateOne({"slug": entry["slug"]}, {"$setOnInsert": chapter}, upsert=True))
+        self.database.chapters.bulk_write(chapters, ordered=False)
+        if self.responses:
+            self.responses.invalidate(*(f"details:{slug}" for slug in comic_slugs))
+        return len(entries)
+
+
+def feed(database, since: int = 0, comics: Optional[List[str]] = None, limit: int = 100) -> dict:
+    """Change log entries after the `since` cursor, optionally only for `comics`"""
+    query = {"seq": {"$gt": since}}
+    if comics:
+        query["comic_slug"] = {"$in": comics}
+    items = list(database.updates.find(query, {"_id": 0}).sort("seq", ASCENDING).limit(limit + 1))
+    return {
+        "cursor": items[min(len(items), limit) - 1]["seq"] if items else since,
+        "updates": items[:limit],
+        "has_more": len(items) > limit,
+    }
+
+
+if __name__ == "__main__":
+    import cloudscraper
+    import redis
+
+    import db
+    from responses import ResponseCache
+    from upstream import UpstreamCache
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=float, default=0, help="seconds between polls, 0 polls once")
+    parser.add_argument("--max-pages", type=int, default=10, help="listing pages to walk at most per poll")
+    args = parser.parse_args()
+
+    store = redis.Redis(
+        host=os.getenv("REDIS_HOST", ""),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=0
+    )
+    detector = UpdateDetector(UpstreamCache(cloudscraper.create_scraper(), store), db.db,
+                              max_pages=args.max_pages, responses=ResponseCache(store))
+    detector.ensure_indexes()
+    while True:
+        print(json.dumps(detector.poll()))
+        if not args.interval:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+import metrics
+from profiling import span
+
+CACHE_TTL = 7 * 24 * 3600  # entries for pages nobody asks for expire after a week
+
+
+@dataclass
+class Fetched:
+    status_code: int
+    data: Any = None
+    cached: bool = False
+
+
+@dataclass
+class CacheStats:
+    requests: int = 0
+    not_modified: int = 0
+    same_hash: int = 0
+    parsed: int = 0
+    bytes_transferred: int = 0
+    bytes_saved: int = 0
+    parse_seconds: float = 0.0
+    parse_seconds_saved: float = 0.0
+
+
+class UpstreamCache:
+    """
+    Conditional fetches for upstream pages.
+
+    For every URL the ETag/Last-Modified validators, a hash of the body and
+    the parsed result are kept in a Redis hash. Revalidated requests that come
+    back 304, or 200 with an identical body, return the stored result without
+    running the parser again. If Redis is unavailable pages are fetched
+    unconditionally and parsed, as if nothing had been cached.
+    """
+
+    def __init__(self, session, store, prefix: str = "upstream:", ttl: int = CACHE_TTL):
+        self.session = session
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def fetch(self, url: str, parse: Callable[[bytes], Any], page_type: str = "page",
+              method: str = "get", **kwargs) -> Fetched:
+        key = self.prefix + url
+        try:
+            entry = {k.decode(): v.decode() for k, v in self.store.hgetall(key).items()}
+        except Exception as e:
+            print(f"[upstream] cache lookup failed, fetching {url} unconditionally: {e}")
+            entry = {}
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        started = time.perf_counter()
+        with span("upstream"):
+            response = getattr(self.session, method)(url, headers=headers, **kwargs)
+        metrics.observe_upstream(page_type, response.status_code, time.perf_counter() - started)
+        content = response.content or b""
+        self._count(requests=1, bytes_transferred=len(content))
+
+        if response.status_code == 304 and "result" in entry:
+            self._count(
+                not_modified=1,
+                bytes_saved=int(entry.get("size", 0)),
+                parse_seconds_saved=float(entry.get("parse_time", 0)),
+            )
+            self._store(key)
+            return Fetched(200, json.loads(entry["result"]), cached=True)
+
+        if response.status_code != 200:
+            return Fetched(response.status_code)
+
+        digest = hashlib.sha1(content).hexdigest()
+        validators = {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+        }
+
+        if entry.get("hash") == digest and "result" in entry:
+            self._count(same_hash=1, parse_seconds_saved=float(entry.get("parse_time", 0)))
+            self._store(key, validators)
+            return Fetched(200, json.loads(entry["result"]), cached=True)
+
+        started = time.process_time()
+        with span("parse"):
+            data = parse(content)
+        parse_time = time.process_time() - started
+        self._count(parsed=1, parse_seconds=parse_time)
+
+        self._store(key, {
+            **validators,
+            "hash": digest,
+            "size": len(content),
+            "parse_time": parse_time,
+            "result": json.dumps(data),
+        })
+        return Fetched(200, data)
+
+    def invalidate(self, url: str):
+        self.store.delete(self.prefix + url)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return asdict(self.stats)
+
+    def _store(self, key: str, fields: Optional[dict] = None):
+        """Update the entry and renew its TTL, a failure only costs the next fetch a parse"""
+        try:
+            if fields:
+                self.store.hset(key, mapping=fields)
+            self.store.expire(key, self.ttl)
+        except Exception as e:
+            print(f"[upstream] could not cache {key}: {e}")
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)